@@ -1,6 +1,19 @@
-from .auth import router as auth_router
-from .code import router as code_router
-from .chat import router as chat_router
+import importlib
+
+# Routers are imported on first access, so a worker only loads the
+# subsystems (torch, Ollama client) behind the routers it mounts
+_ROUTER_MODULES = {
+    "auth_router": ".auth",
+    "code_router": ".code",
+    "chat_router": ".chat",
+}
+
+
+def __getattr__(name):
+    if name in _ROUTER_MODULES:
+        return importlib.import_module(_ROUTER_MODULES[name], __name__).router
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # Export all routers
-__all__ = ["auth_router", "code_router", "chat_router"] 
\ No newline at end of file
+__all__ = ["auth_router", "code_router", "chat_router"]
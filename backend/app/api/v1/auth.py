@@ -1,23 +1,67 @@
-from fastapi import APIRouter, File, UploadFile, Depends, status
+import uuid
+from typing import TYPE_CHECKING, Union
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session
 
-from ...core.database import get_db
+from ...core.config import settings
+from ...core.database import get_async_db, get_db, pool_stats
+from ...core.executor import auth_executor
 from ...services.auth_service import auth_service
+from ...services.face_recognition_service import face_recognition_service
+from .uploads import image_upload_openapi, read_image_upload
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
 
 router = APIRouter(prefix="/users", tags=["Authentication"])
 
-@router.post("/signup", status_code=status.HTTP_201_CREATED)
-async def signup_user(file: UploadFile = File(...), db: Session = Depends(get_db)):
+# Signup and login await an asyncio session when DB_ASYNC_ENABLED, otherwise the
+# whole pipeline runs on the auth executor with a sync session
+auth_db = get_async_db if settings.DB_ASYNC_ENABLED else get_db
+
+@router.post("/signup", status_code=status.HTTP_201_CREATED, openapi_extra=image_upload_openapi())
+async def signup_user(request: Request, db: Union[Session, "AsyncSession"] = Depends(auth_db)):
     """
     Signup user with face recognition, add vector to database, return user id
     """
-    image_bytes = await file.read()
-    return auth_service.signup_user(image_bytes, db)
+    image_bytes, _ = await read_image_upload(request)
+    if settings.DB_ASYNC_ENABLED:
+        return await auth_service.signup_user_async(image_bytes, db)
+    return await auth_executor.run(auth_service.signup_user, image_bytes, db)
 
-@router.post("/login")
-async def login_user(file: UploadFile = File(...), db: Session = Depends(get_db)):
+@router.post("/login", openapi_extra=image_upload_openapi())
+async def login_user(request: Request, db: Union[Session, "AsyncSession"] = Depends(auth_db)):
     """
     Login user with face recognition, return user id
     """
-    image_bytes = await file.read()
-    return auth_service.login_user(image_bytes, db) 
\ No newline at end of file
+    image_bytes, _ = await read_image_upload(request)
+    if settings.DB_ASYNC_ENABLED:
+        return await auth_service.login_user_async(image_bytes, db)
+    return await auth_executor.run(auth_service.login_user, image_bytes, db)
+
+@router.post("/login/verify", openapi_extra=image_upload_openapi(user_id="uuid"))
+async def verify_user(request: Request, db: Session = Depends(get_db)):
+    """
+    Login a claimed user id with 1:1 face verification, return user id
+    """
+    image_bytes, fields = await read_image_upload(request)
+    try:
+        user_id = uuid.UUID(fields.get("user_id", ""))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="user_id must be a valid UUID"
+        )
+    return await auth_executor.run(auth_service.verify_user, image_bytes, user_id, db)
+
+@router.get("/stats")
+async def get_auth_stats():
+    """
+    Get auth worker pool queue depth, database pool usage, embedding cache counters and FaceNet micro-batching histograms
+    """
+    return {
+        "executor": auth_executor.stats(),
+        "database_pools": pool_stats(),
+        "embedding_cache": face_recognition_service.cache_stats(),
+        "batching": face_recognition_service.batch_stats()
+    }
@@ -1,39 +1,132 @@
-from fastapi import APIRouter
-from pydantic import BaseModel
-from typing import List
+from fastapi import APIRouter, Request, status
+from pydantic import BaseModel, Field
+from typing import List, Optional
 
+from ...core.config import settings
+from ...middlewares.rate_limit import client_host
 from ...services.code_service import code_service
+from .streaming import ndjson_response
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
 class ChatGenerationRequest(BaseModel):
     messages: List[dict]
-    max_tokens: int = 500
+    max_tokens: int = Field(500, gt=0, le=settings.LLM_MAX_TOKENS)
     temperature: float = 0.7
 
 class ChatMessageRequest(BaseModel):
     message: str
-    max_tokens: int = 500
+    max_tokens: int = Field(500, gt=0, le=settings.LLM_MAX_TOKENS)
     temperature: float = 0.7
 
+class ChatSessionRequest(BaseModel):
+    system_prompt: Optional[str] = None
+
 @router.post("/generate")
-async def generate_chat(request: ChatGenerationRequest):
+async def generate_chat(request: ChatGenerationRequest, http_request: Request):
     """
     Generate chat response using Ollama CodeLlama model
     """
-    return code_service.generate_chat(
+    return await code_service.generate_chat(
+        messages=request.messages,
+        max_tokens=request.max_tokens,
+        temperature=request.temperature,
+        client=client_host(http_request.scope)
+    )
+
+@router.post("/generate/stream")
+async def stream_chat(request: ChatGenerationRequest, http_request: Request):
+    """
+    Generate chat response and stream tokens as NDJSON
+    """
+    stream = await code_service.stream_chat(
         messages=request.messages,
         max_tokens=request.max_tokens,
-        temperature=request.temperature
+        temperature=request.temperature,
+        client=client_host(http_request.scope)
     )
+    return ndjson_response(stream)
 
 @router.post("/message")
-async def send_message(request: ChatMessageRequest):
+async def send_message(request: ChatMessageRequest, http_request: Request):
     """
     Send a single message and get response using Ollama CodeLlama model
     """
-    return code_service.generate_chat(
+    return await code_service.generate_chat(
         messages=[{"role": "user", "content": request.message}],
         max_tokens=request.max_tokens,
-        temperature=request.temperature
-    ) 
\ No newline at end of file
+        temperature=request.temperature,
+        client=client_host(http_request.scope)
+    )
+
+@router.post("/message/stream")
+async def stream_message(request: ChatMessageRequest, http_request: Request):
+    """
+    Send a single message and stream the response as NDJSON
+    """
+    stream = await code_service.stream_chat(
+        messages=[{"role": "user", "content": request.message}],
+        max_tokens=request.max_tokens,
+        temperature=request.temperature,
+        client=client_host(http_request.scope)
+    )
+    return ndjson_response(stream)
+
+@router.post("/sessions", status_code=status.HTTP_201_CREATED)
+async def create_session(request: ChatSessionRequest, http_request: Request):
+    """
+    Start a server-side chat session, later messages only send the new text.
+    Sessions are bound to the creating client and need a single worker.
+    """
+    return code_service.create_chat_session(
+        system_prompt=request.system_prompt,
+        client=client_host(http_request.scope)
+    )
+
+@router.get("/sessions/stats")
+async def get_session_stats():
+    """
+    Get chat session counts and prompt tokens saved by reusing Ollama's context
+    """
+    return code_service.session_stats()
+
+@router.get("/sessions/{session_id}")
+async def get_session(session_id: str, http_request: Request):
+    """
+    Get the history and prompt evaluation counters of a chat session
+    """
+    return code_service.get_chat_session(session_id, client=client_host(http_request.scope))
+
+@router.delete("/sessions/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_session(session_id: str, http_request: Request):
+    """
+    End a chat session
+    """
+    code_service.delete_chat_session(session_id, client=client_host(http_request.scope))
+
+@router.post("/sessions/{session_id}/message")
+async def send_session_message(session_id: str, request: ChatMessageRequest, http_request: Request):
+    """
+    Send a message in a chat session, continuing the conversation server-side
+    """
+    return await code_service.session_message(
+        session_id=session_id,
+        message=request.message,
+        max_tokens=request.max_tokens,
+        temperature=request.temperature,
+        client=client_host(http_request.scope)
+    )
+
+@router.post("/sessions/{session_id}/message/stream")
+async def stream_session_message(session_id: str, request: ChatMessageRequest, http_request: Request):
+    """
+    Send a message in a chat session and stream the response as NDJSON
+    """
+    stream = await code_service.stream_session_message(
+        session_id=session_id,
+        message=request.message,
+        max_tokens=request.max_tokens,
+        temperature=request.temperature,
+        client=client_host(http_request.scope)
+    )
+    return ndjson_response(stream)
@@ -1,8 +1,11 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel, field_validator
-from typing import List, Optional
+from fastapi import APIRouter, Request
+from pydantic import BaseModel, Field, field_validator
+from typing import List
 
+from ...core.config import settings
+from ...middlewares.rate_limit import client_host
 from ...services.code_service import code_service
+from .streaming import ndjson_response
 
 router = APIRouter(prefix="/code", tags=["Code Generation"])
 
@@ -15,8 +18,9 @@ SUPPORTED_LANGUAGES = {
 class CodeGenerationRequest(BaseModel):
     prompt: str
     language: str
-    max_tokens: int = 512
+    max_tokens: int = Field(512, gt=0, le=settings.LLM_MAX_TOKENS)
     temperature: float = 0.3
+    use_cache: bool = True
 
     @field_validator('language')
     @classmethod
@@ -27,13 +31,14 @@ class CodeGenerationRequest(BaseModel):
 
 class ChatGenerationRequest(BaseModel):
     messages: List[dict]
-    max_tokens: int = 500
+    max_tokens: int = Field(500, gt=0, le=settings.LLM_MAX_TOKENS)
     temperature: float = 0.7
 
 class CodeTranslationRequest(BaseModel):
     source_code: str
     source_language: str
     target_language: str
+    use_cache: bool = True
 
     @field_validator('source_language', 'target_language')
     @classmethod
@@ -66,25 +71,79 @@ async def get_supported_languages():
         ]
     }
 
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """
+    Get response cache hit/miss counters
+    """
+    return code_service.cache_stats()
+
+@router.get("/coalescing/stats")
+async def get_coalescing_stats():
+    """
+    Get request coalescing counters
+    """
+    return code_service.coalescing_stats()
+
+@router.get("/quota/stats")
+async def get_quota_stats():
+    """
+    Get LLM token budget and concurrency counters
+    """
+    return code_service.quota_stats()
+
 @router.post("/generate")
-async def generate_code(request: CodeGenerationRequest):
+async def generate_code(request: CodeGenerationRequest, http_request: Request):
     """
     Generate code using Ollama CodeLlama model
     """
-    return code_service.generate_code(
+    return await code_service.generate_code(
         prompt=request.prompt,
         language=request.language,
         max_tokens=request.max_tokens,
-        temperature=request.temperature
+        temperature=request.temperature,
+        use_cache=request.use_cache,
+        client=client_host(http_request.scope)
     )
 
+@router.post("/generate/stream")
+async def stream_code(request: CodeGenerationRequest, http_request: Request):
+    """
+    Generate code and stream tokens as NDJSON, the final line carries the eval metadata
+    """
+    stream = await code_service.stream_code(
+        prompt=request.prompt,
+        language=request.language,
+        max_tokens=request.max_tokens,
+        temperature=request.temperature,
+        use_cache=request.use_cache,
+        client=client_host(http_request.scope)
+    )
+    return ndjson_response(stream)
+
 @router.post("/translate")
-async def translate_code(request: CodeTranslationRequest):
+async def translate_code(request: CodeTranslationRequest, http_request: Request):
     """
     Translate code from one programming language to another using Ollama
     """
-    return code_service.translate_code(
+    return await code_service.translate_code(
         source_code=request.source_code,
         source_language=request.source_language,
-        target_language=request.target_language
-    ) 
\ No newline at end of file
+        target_language=request.target_language,
+        use_cache=request.use_cache,
+        client=client_host(http_request.scope)
+    )
+
+@router.post("/translate/stream")
+async def stream_translation(request: CodeTranslationRequest, http_request: Request):
+    """
+    Translate code and stream tokens as NDJSON, the final line carries the eval metadata
+    """
+    stream = await code_service.stream_translation(
+        source_code=request.source_code,
+        source_language=request.source_language,
+        target_language=request.target_language,
+        use_cache=request.use_cache,
+        client=client_host(http_request.scope)
+    )
+    return ndjson_response(stream)
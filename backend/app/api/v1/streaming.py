@@ -0,0 +1,13 @@
+from fastapi.responses import StreamingResponse
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+def ndjson_response(stream) -> StreamingResponse:
+    """
+    Wrap an NDJSON byte stream, disabling proxy buffering so chunks reach the client as they arrive
+    """
+    return StreamingResponse(
+        stream,
+        media_type=NDJSON_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,244 @@
+"""
+Streaming image upload ingestion
+
+Parses multipart/form-data request bodies chunk by chunk instead of letting
+the framework buffer the whole upload. The image part is checked as it
+arrives: the byte limit is enforced on bytes actually received, the format
+is sniffed from the magic bytes and the dimensions from the image header,
+so oversized or non-image payloads are rejected without reading the rest
+of the body. Peak memory per request is bounded by MAX_FILE_SIZE_MB.
+"""
+
+import struct
+from typing import Dict, Optional, Tuple
+from fastapi import HTTPException, Request, status
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from ...core.config import settings
+from ...middlewares.validation import max_upload_body_bytes
+
+MAX_FIELD_BYTES = 4 * 1024
+
+# Named HTTP_413_REQUEST_ENTITY_TOO_LARGE or HTTP_413_CONTENT_TOO_LARGE depending on the Starlette version
+PAYLOAD_TOO_LARGE = 413
+
+INVALID_TYPE_DETAIL = "Invalid file type. Only JPEG, PNG, and WebP images are allowed."
+
+# JPEG start-of-frame markers carrying the image size
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def sniff_image_format(head: bytes) -> Optional[str]:
+    """Return jpeg, png or webp from the leading magic bytes, None otherwise"""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def image_dimensions(data, image_format: str) -> Optional[Tuple[int, int]]:
+    """
+    Read (width, height) from the image header, None while more bytes are needed
+    """
+    if image_format == "png":
+        if len(data) < 24:
+            return None
+        return struct.unpack(">II", bytes(data[16:24]))
+
+    if image_format == "webp":
+        if len(data) < 30:
+            return None
+        chunk = bytes(data[12:16])
+        if chunk == b"VP8 ":
+            width, height = struct.unpack("<HH", bytes(data[26:30]))
+            return width & 0x3FFF, height & 0x3FFF
+        if chunk == b"VP8L":
+            bits = int.from_bytes(bytes(data[21:25]), "little")
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b"VP8X":
+            return int.from_bytes(bytes(data[24:27]), "little") + 1, int.from_bytes(bytes(data[27:30]), "little") + 1
+        return 0, 0
+
+    # JPEG: walk the marker segments up to the first start-of-frame
+    offset = 2
+    while offset + 4 <= len(data):
+        if data[offset] != 0xFF:
+            return 0, 0
+        marker = data[offset + 1]
+        if marker == 0xFF:  # fill byte
+            offset += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD9:  # markers without a length
+            offset += 2
+            continue
+        if marker in _JPEG_SOF_MARKERS:
+            if offset + 9 > len(data):
+                return None
+            height, width = struct.unpack(">HH", bytes(data[offset + 5:offset + 9]))
+            return width, height
+        offset += 2 + struct.unpack(">H", bytes(data[offset + 2:offset + 4]))[0]
+    return None
+
+
+class _UploadReader:
+    """Multipart callbacks that keep form fields and validate the image part as it streams in"""
+
+    def __init__(self, file_field: str, max_bytes: int, max_pixels: int):
+        self.file_field = file_field
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self.fields: Dict[str, str] = {}
+        self.image = None
+        self.image_format = None
+        self.dimensions = None
+
+        self._header_field = bytearray()
+        self._header_value = bytearray()
+        self._headers = {}
+        self._name = None
+        self._is_file = False
+        self._buffer = None
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": lambda data, start, end: self._header_field.extend(data[start:end]),
+            "on_header_value": lambda data, start, end: self._header_value.extend(data[start:end]),
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        }
+
+    def _on_part_begin(self):
+        self._headers = {}
+        self._name = None
+        self._is_file = False
+        self._buffer = bytearray()
+
+    def _on_header_end(self):
+        self._headers[bytes(self._header_field).lower()] = bytes(self._header_value)
+        self._header_field.clear()
+        self._header_value.clear()
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        self._name = options.get(b"name", b"").decode("latin-1")
+        # Only the first part under the file field is kept, repeats are dropped
+        self._is_file = self._name == self.file_field and self.image is None and b"filename" in options
+
+    def _on_part_data(self, data, start, end):
+        if self._is_file:
+            self._buffer.extend(data[start:end])
+            self._check_image()
+        elif self._keeps_field():
+            self._buffer.extend(data[start:end])
+            if len(self._buffer) > MAX_FIELD_BYTES:
+                raise HTTPException(
+                    status_code=PAYLOAD_TOO_LARGE,
+                    detail=f"Form field {self._name} is too large."
+                )
+
+    def _on_part_end(self):
+        if self._is_file:
+            if self.image_format is None or self.dimensions is None:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=INVALID_TYPE_DETAIL)
+            self.image = bytes(self._buffer)
+        elif self._keeps_field():
+            self.fields[self._name] = self._buffer.decode("utf-8", errors="replace")
+        self._buffer = None
+
+    def _keeps_field(self) -> bool:
+        return self._name is not None and self._name != self.file_field and self._name not in self.fields
+
+    def _check_image(self):
+        """Reject as soon as the received bytes show the upload is too large or not an image"""
+        received = len(self._buffer)
+        if received > self.max_bytes:
+            raise HTTPException(
+                status_code=PAYLOAD_TOO_LARGE,
+                detail=f"File too large. Maximum size is {settings.MAX_FILE_SIZE_MB}MB."
+            )
+
+        if self.image_format is None:
+            if received < 12:
+                return
+            self.image_format = sniff_image_format(bytes(self._buffer[:12]))
+            if self.image_format is None:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=INVALID_TYPE_DETAIL)
+
+        if self.dimensions is None:
+            self.dimensions = image_dimensions(self._buffer, self.image_format)
+            if self.dimensions is None:
+                return
+            width, height = self.dimensions
+            if width <= 0 or height <= 0:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=INVALID_TYPE_DETAIL)
+            if width * height > self.max_pixels:
+                raise HTTPException(
+                    status_code=PAYLOAD_TOO_LARGE,
+                    detail=f"Image too large. Maximum is {self.max_pixels} pixels."
+                )
+
+
+async def read_image_upload(request: Request, file_field: str = "file") -> Tuple[bytes, Dict[str, str]]:
+    """
+    Stream a multipart/form-data body, return the validated image bytes and the other form fields
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Uploads must be sent as multipart/form-data."
+        )
+
+    max_bytes = settings.MAX_FILE_SIZE_MB * 1024 * 1024
+    max_body = max_upload_body_bytes()
+
+    # Cheap early reject when the client declares a body that cannot fit
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_body:
+        raise HTTPException(
+            status_code=PAYLOAD_TOO_LARGE,
+            detail=f"File too large. Maximum size is {settings.MAX_FILE_SIZE_MB}MB."
+        )
+
+    reader = _UploadReader(file_field, max_bytes, settings.MAX_IMAGE_PIXELS)
+    parser = MultipartParser(boundary, reader.callbacks())
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > max_body:
+            raise HTTPException(
+                status_code=PAYLOAD_TOO_LARGE,
+                detail=f"File too large. Maximum size is {settings.MAX_FILE_SIZE_MB}MB."
+            )
+        parser.write(chunk)
+    parser.finalize()
+
+    if reader.image is None:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Missing image upload in form field {file_field}."
+        )
+    return reader.image, reader.fields
+
+
+def image_upload_openapi(**fields) -> dict:
+    """OpenAPI request body for endpoints that read their upload with read_image_upload"""
+    properties = {"file": {"type": "string", "format": "binary"}}
+    properties.update({name: {"type": "string", "format": fmt} for name, fmt in fields.items()})
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {"type": "object", "properties": properties, "required": list(properties)}
+                }
+            }
+        }
+    }
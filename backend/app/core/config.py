@@ -20,10 +20,25 @@ class Settings:
     DATABASE_URL: str = os.getenv("DATABASE_URL")
     if not DATABASE_URL:
         raise ValueError("DATABASE_URL environment variable must be set")
-    
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_ASYNC_ENABLED: bool = os.getenv("DB_ASYNC_ENABLED", "false").lower() == "true"  # asyncpg sessions for signup and login
+    ASYNC_DATABASE_URL: str = os.getenv("ASYNC_DATABASE_URL", "")  # defaults to DATABASE_URL with the asyncpg driver
+    DB_ASYNC_POOL_SIZE: int = int(os.getenv("DB_ASYNC_POOL_SIZE", "10"))
+    DB_ASYNC_MAX_OVERFLOW: int = int(os.getenv("DB_ASYNC_MAX_OVERFLOW", "10"))
+
     # API Settings
     API_V1_STR: str = "/api/v1"
     PROJECT_NAME: str = "GARLIC-Q"
+    WORKER_ROLE: str = os.getenv("WORKER_ROLE", "all").lower()  # all, auth or llm
+    FACE_MODEL_PRELOAD: bool = os.getenv("FACE_MODEL_PRELOAD", "true").lower() == "true"  # warm models in the background at startup
+    FACE_MODEL_RETRY_SECONDS: float = float(os.getenv("FACE_MODEL_RETRY_SECONDS", "30"))  # first retry after a failed load, doubles per failure
+    FACE_MODEL_RETRY_MAX_SECONDS: float = float(os.getenv("FACE_MODEL_RETRY_MAX_SECONDS", "600"))
+
+    def role_enabled(self, subsystem: str) -> bool:
+        """Whether this worker serves the auth or llm subsystem"""
+        return self.WORKER_ROLE in ("all", subsystem)
     
     # CORS Settings - Only Render domains
     BACKEND_CORS_ORIGINS: list = [
@@ -36,12 +51,95 @@ class Settings:
     
     # Ollama Settings
     OLLAMA_BASE_URL: str = os.getenv("OLLAMA_BASE_URL")
+    OLLAMA_MAX_CONNECTIONS: int = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "10"))
+    OLLAMA_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("OLLAMA_MAX_KEEPALIVE_CONNECTIONS", "5"))
+    OLLAMA_KEEPALIVE_EXPIRY: float = float(os.getenv("OLLAMA_KEEPALIVE_EXPIRY", "30"))
+    OLLAMA_CONNECT_TIMEOUT: float = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+    OLLAMA_READ_TIMEOUT: float = float(os.getenv("OLLAMA_READ_TIMEOUT", "120"))
+    OLLAMA_TOTAL_TIMEOUT: float = float(os.getenv("OLLAMA_TOTAL_TIMEOUT", "300"))
+    OLLAMA_HEALTH_INTERVAL_SECONDS: float = float(os.getenv("OLLAMA_HEALTH_INTERVAL_SECONDS", "10"))
+    OLLAMA_HEALTH_TIMEOUT_SECONDS: float = float(os.getenv("OLLAMA_HEALTH_TIMEOUT_SECONDS", "3"))
+
+    # LLM Response Cache Settings
+    LLM_CACHE_ENABLED: bool = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_MAX_ENTRIES: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+    LLM_CACHE_MAX_MB: int = int(os.getenv("LLM_CACHE_MAX_MB", "64"))
+    LLM_CACHE_TTL_SECONDS: float = float(os.getenv("LLM_CACHE_TTL_SECONDS", "3600"))
+    LLM_CACHE_MAX_TEMPERATURE: float = float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", "0.3"))
+    LLM_CACHE_DISK_PATH: str = os.getenv("LLM_CACHE_DISK_PATH", "")
+    LLM_CACHE_DISK_MAX_ENTRIES: int = int(os.getenv("LLM_CACHE_DISK_MAX_ENTRIES", "10000"))
+
+    # LLM Request Coalescing Settings
+    LLM_COALESCE_ENABLED: bool = os.getenv("LLM_COALESCE_ENABLED", "true").lower() == "true"
+    LLM_COALESCE_NORMALIZE_WHITESPACE: bool = os.getenv("LLM_COALESCE_NORMALIZE_WHITESPACE", "true").lower() == "true"
+    LLM_COALESCE_CASE_INSENSITIVE: bool = os.getenv("LLM_COALESCE_CASE_INSENSITIVE", "false").lower() == "true"
+    LLM_COALESCE_IGNORE_SAMPLING: bool = os.getenv("LLM_COALESCE_IGNORE_SAMPLING", "false").lower() == "true"
     
+    # LLM Quota Settings
+    LLM_QUOTA_ENABLED: bool = os.getenv("LLM_QUOTA_ENABLED", "true").lower() == "true"
+    LLM_QUOTA_TOKENS_PER_WINDOW: int = int(os.getenv("LLM_QUOTA_TOKENS_PER_WINDOW", "20000"))
+    LLM_QUOTA_WINDOW_SECONDS: float = float(os.getenv("LLM_QUOTA_WINDOW_SECONDS", "600"))
+    LLM_QUOTA_MAX_CLIENTS: int = int(os.getenv("LLM_QUOTA_MAX_CLIENTS", "100000"))
+    LLM_MAX_TOKENS: int = int(os.getenv("LLM_MAX_TOKENS", "4096"))  # upper bound for max_tokens in a request
+    LLM_MAX_CONCURRENT_GENERATIONS: int = int(os.getenv("LLM_MAX_CONCURRENT_GENERATIONS", "4"))  # per worker
+    LLM_GENERATION_QUEUE_TIMEOUT_SECONDS: float = float(os.getenv("LLM_GENERATION_QUEUE_TIMEOUT_SECONDS", "30"))
+
+    # LLM Chat Session Settings
+    LLM_CHAT_SESSIONS_ENABLED: bool = os.getenv("LLM_CHAT_SESSIONS_ENABLED", "true").lower() == "true"  # single worker only
+    WEB_CONCURRENCY: int = int(os.getenv("WEB_CONCURRENCY", "1"))  # worker count, set it rather than uvicorn --workers
+    LLM_CHAT_SESSION_TTL_SECONDS: float = float(os.getenv("LLM_CHAT_SESSION_TTL_SECONDS", "1800"))
+    LLM_CHAT_SESSION_MAX_SESSIONS: int = int(os.getenv("LLM_CHAT_SESSION_MAX_SESSIONS", "1000"))  # per worker
+    LLM_CHAT_SESSION_MAX_MB: int = int(os.getenv("LLM_CHAT_SESSION_MAX_MB", "64"))
+    LLM_CHAT_SESSION_KEEP_ALIVE: str = os.getenv("LLM_CHAT_SESSION_KEEP_ALIVE", "30m")  # Ollama keep_alive for session turns
+
     # Security Settings
     RATE_LIMIT_PER_MINUTE: int = int(os.getenv("RATE_LIMIT_PER_MINUTE", "60"))
+    RATE_LIMIT_BURST: int = int(os.getenv("RATE_LIMIT_BURST", "0"))  # 0 = RATE_LIMIT_PER_MINUTE, memory and sqlite backends only
+    RATE_LIMIT_MAX_KEYS: int = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+    RATE_LIMIT_BACKEND: str = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()  # memory, sqlite or redis
+    RATE_LIMIT_SQLITE_PATH: str = os.getenv("RATE_LIMIT_SQLITE_PATH", "/tmp/garlicq-rate-limit.db")
+    RATE_LIMIT_REDIS_URL: str = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+    RATE_LIMIT_KEY_PREFIX: str = os.getenv("RATE_LIMIT_KEY_PREFIX", "garlicq:rl:")
     MAX_FILE_SIZE_MB: int = int(os.getenv("MAX_FILE_SIZE_MB", "10"))
+    MAX_IMAGE_PIXELS: int = int(os.getenv("MAX_IMAGE_PIXELS", "40000000"))  # width x height read from the upload header
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
     ENABLE_DEBUG: bool = os.getenv("ENABLE_DEBUG", "false").lower() == "true"
 
+    # Face Matching Settings
+    FACE_INDEX_TYPE: str = os.getenv("FACE_INDEX_TYPE", "hnsw").lower()  # hnsw, ivfflat or none
+    FACE_INDEX_HNSW_M: int = int(os.getenv("FACE_INDEX_HNSW_M", "16"))
+    FACE_INDEX_HNSW_EF_CONSTRUCTION: int = int(os.getenv("FACE_INDEX_HNSW_EF_CONSTRUCTION", "64"))
+    FACE_INDEX_EF_SEARCH: int = int(os.getenv("FACE_INDEX_EF_SEARCH", "40"))
+    FACE_INDEX_IVFFLAT_LISTS: int = int(os.getenv("FACE_INDEX_IVFFLAT_LISTS", "100"))
+    FACE_INDEX_IVFFLAT_PROBES: int = int(os.getenv("FACE_INDEX_IVFFLAT_PROBES", "10"))
+    FACE_EXACT_SEARCH_MAX_ROWS: int = int(os.getenv("FACE_EXACT_SEARCH_MAX_ROWS", "1000"))
+    FACE_SEARCH_TOP_K: int = int(os.getenv("FACE_SEARCH_TOP_K", "1"))
+    FACE_MATCH_BACKEND: str = os.getenv("FACE_MATCH_BACKEND", "pgvector").lower()  # pgvector or memory
+    FACE_MEMORY_INDEX_RESYNC_SECONDS: int = int(os.getenv("FACE_MEMORY_INDEX_RESYNC_SECONDS", "300"))
+
+    # Face Inference Settings
+    AUTH_WORKER_THREADS: int = int(os.getenv("AUTH_WORKER_THREADS", "4"))
+    AUTH_MAX_QUEUE: int = int(os.getenv("AUTH_MAX_QUEUE", "32"))
+    AUTH_RETRY_AFTER_SECONDS: int = int(os.getenv("AUTH_RETRY_AFTER_SECONDS", "2"))
+    FACE_TORCH_THREADS: int = int(os.getenv("FACE_TORCH_THREADS", "0"))  # 0 = cpu count / auth worker threads
+    FACE_INFERENCE_BACKEND: str = os.getenv("FACE_INFERENCE_BACKEND", "eager").lower()  # eager, torchscript, compile, int8 or onnx
+    FACE_ONNX_PATH: str = os.getenv("FACE_ONNX_PATH", "")  # defaults to $TORCH_HOME/facenet_vggface2.onnx
+    # Both change embeddings against enrolled users, check with benchmarks.face_preprocessing before enabling
+    FACE_DECODE_MAX_SIDE: int = int(os.getenv("FACE_DECODE_MAX_SIDE", "0"))  # JPEG draft decode target, 0 = full resolution
+    FACE_DETECT_MAX_SIDE: int = int(os.getenv("FACE_DETECT_MAX_SIDE", "0"))  # MTCNN proxy image size, 0 = no downscale
+    FACE_EMBEDDING_CACHE_ENABLED: bool = os.getenv("FACE_EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    FACE_EMBEDDING_CACHE_MAX_ENTRIES: int = int(os.getenv("FACE_EMBEDDING_CACHE_MAX_ENTRIES", "1024"))
+    FACE_EMBEDDING_CACHE_TTL_SECONDS: float = float(os.getenv("FACE_EMBEDDING_CACHE_TTL_SECONDS", "300"))
+    FACE_BATCH_ENABLED: bool = os.getenv("FACE_BATCH_ENABLED", "false").lower() == "true"
+    FACE_BATCH_MAX_SIZE: int = int(os.getenv("FACE_BATCH_MAX_SIZE", "16"))  # capped at AUTH_WORKER_THREADS, the most callers that can wait at once
+    FACE_BATCH_WINDOW_MS: float = float(os.getenv("FACE_BATCH_WINDOW_MS", "10"))
+    FACE_INFERENCE_MODE: str = os.getenv("FACE_INFERENCE_MODE", "local").lower()  # local or remote
+    FACE_INFERENCE_ADDRESS: str = os.getenv("FACE_INFERENCE_ADDRESS", "/tmp/garlicq-face-inference.sock")
+    FACE_INFERENCE_AUTHKEY: str = os.getenv("FACE_INFERENCE_AUTHKEY", "")  # required for the pool, e.g. python -c "import secrets; print(secrets.token_hex(32))"
+    FACE_INFERENCE_PROCESSES: int = int(os.getenv("FACE_INFERENCE_PROCESSES", "2"))
+    FACE_INFERENCE_TORCH_THREADS: int = int(os.getenv("FACE_INFERENCE_TORCH_THREADS", "1"))
+    FACE_INFERENCE_TIMEOUT_SECONDS: float = float(os.getenv("FACE_INFERENCE_TIMEOUT_SECONDS", "30"))
+
 # Validate environment on import
 validate_environment()
 
@@ -1,20 +1,112 @@
-from sqlalchemy import create_engine
+import time
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
 from .config import settings
+from .metrics import GaugeFunction, db_pool_checkout_wait_seconds, registry
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waits, including connecting under overflow"""
+
+    pool_label = "sync"
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_pool_checkout_wait_seconds.observe(time.perf_counter() - started, self.pool_label)
+
+class TimedAsyncAdaptedQueuePool(TimedQueuePool, AsyncAdaptedQueuePool):
+    """Timed pool for the asyncio engine, waits are recorded under pool="async" """
+
+    pool_label = "async"
 
 # Create engine with connection pooling
 engine = create_engine(
     settings.DATABASE_URL,
+    poolclass=TimedQueuePool,
     pool_pre_ping=True,
-    pool_size=10,
-    max_overflow=20
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT
 )
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def async_database_url(url: str) -> str:
+    """
+    Derive the asyncpg URL from the sync one. asyncpg takes ssl instead of
+    libpq's sslmode, so the query parameter is renamed.
+    """
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "postgresql":
+        parsed = parsed.set(drivername="postgresql+asyncpg")
+        sslmode = parsed.query.get("sslmode")
+        if sslmode:
+            parsed = parsed.difference_update_query(["sslmode"]).update_query_dict({"ssl": sslmode})
+    return parsed.render_as_string(hide_password=False)
+
+# Optional asyncio engine with its own pool, used by the async auth paths
+async_engine = None
+AsyncSessionLocal = None
+if settings.DB_ASYNC_ENABLED:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async_engine = create_async_engine(
+        settings.ASYNC_DATABASE_URL or async_database_url(settings.DATABASE_URL),
+        poolclass=TimedAsyncAdaptedQueuePool,
+        pool_pre_ping=True,
+        pool_size=settings.DB_ASYNC_POOL_SIZE,
+        max_overflow=settings.DB_ASYNC_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT
+    )
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    if async_engine.dialect.driver == "asyncpg":
+        # asyncpg needs a codec for the vector type, registered once per new connection
+        @event.listens_for(async_engine.sync_engine, "connect")
+        def _register_vector(dbapi_connection, connection_record):
+            from pgvector.asyncpg import register_vector
+            dbapi_connection.run_async(register_vector)
+
+def _pools() -> dict:
+    pools = {"sync": engine.pool}
+    if async_engine is not None:
+        pools["async"] = async_engine.pool
+    return pools
+
+def pool_stats() -> dict:
+    """Size, usage and checkout wait of each connection pool"""
+    stats = {}
+    for label, pool in _pools().items():
+        wait = db_pool_checkout_wait_seconds.labels(label).snapshot()
+        stats[label] = {
+            "pool_size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "checked_out": pool.checkedout(),
+            "idle": pool.checkedin(),
+            "overflow": max(0, pool.overflow()),
+            "checkouts": wait["count"],
+            "avg_wait_ms": round(wait["sum"] / wait["count"] * 1000, 3) if wait["count"] else 0.0,
+            "wait_buckets_seconds": wait["buckets"],
+        }
+    return stats
+
+registry.register(GaugeFunction(
+    "db_pool_connections", "Database pool connections by pool and state",
+    lambda: {
+        (label, state): value
+        for label, pool in _pools().items()
+        for state, value in (("checked_out", pool.checkedout()), ("idle", pool.checkedin()))
+    },
+    ("pool", "state")
+))
+
 # Create base class for models
 Base = declarative_base()
 
@@ -27,4 +119,13 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    """
+    Create a new asyncio database session for each request, requires DB_ASYNC_ENABLED
+    """
+    if AsyncSessionLocal is None:
+        raise RuntimeError("Async database sessions are disabled, set DB_ASYNC_ENABLED=true")
+    async with AsyncSessionLocal() as db:
+        yield db
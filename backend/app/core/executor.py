@@ -0,0 +1,86 @@
+"""
+Bounded Thread Pool
+
+Runs blocking work (image decoding, face inference, synchronous database
+calls) off the asyncio event loop with a hard cap on queued work, so
+overload is answered with 503 instead of an ever-growing backlog.
+"""
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, status
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class BoundedExecutor:
+    def __init__(self, max_workers: int, max_queue: int, retry_after_seconds: int = 2,
+                 name: str = "worker"):
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.retry_after_seconds = retry_after_seconds
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._pending = 0  # running + queued, decremented when the thread finishes
+        self.completed = 0
+        self.rejected = 0
+
+    async def run(self, fn, *args):
+        """Run fn(*args) in the pool, raise 503 with Retry-After when the queue is full"""
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                full = True
+            else:
+                self._pending += 1
+                full = False
+
+        if full:
+            logger.warning(f"Executor queue full ({self.max_queue} waiting), rejecting request")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please try again shortly.",
+                headers={"Retry-After": str(self.retry_after_seconds)}
+            )
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call, fn, args)
+
+    def _call(self, fn, args):
+        # Counted down in the worker thread, so a cancelled request still occupies
+        # its slot until the blocking work has actually finished
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self.completed += 1
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        """Pool size and queue depth"""
+        with self._lock:
+            pending = self._pending
+            return {
+                "workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "running": min(pending, self.max_workers),
+                "queued": max(0, pending - self.max_workers),
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+
+
+# Global instance for the face authentication pipeline
+auth_executor = BoundedExecutor(
+    max_workers=settings.AUTH_WORKER_THREADS,
+    max_queue=settings.AUTH_MAX_QUEUE,
+    retry_after_seconds=settings.AUTH_RETRY_AFTER_SECONDS,
+    name="auth"
+)
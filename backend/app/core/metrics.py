@@ -0,0 +1,252 @@
+"""
+Lightweight in-process metrics
+
+Histograms with fixed cumulative buckets and counters, cheap enough to
+record on hot paths without pulling in a metrics client library: an
+observation is a bisect and one uncontended lock. Metrics registered in
+`registry` are rendered in the Prometheus text format for /metrics.
+"""
+
+import bisect
+import threading
+import time
+from typing import Callable, Dict, Sequence, Tuple
+
+# Default latency buckets in milliseconds
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Latency buckets in seconds for exported metrics, as Prometheus expects
+LATENCY_BUCKETS_SECONDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Token throughput buckets in tokens per second
+TOKEN_RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS_MS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        """Record one observation"""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self) -> dict:
+        """Cumulative bucket counts keyed by upper bound, plus count and sum"""
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+
+        cumulative = {}
+        running = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            running += bucket_count
+            cumulative[str(bound)] = running
+        cumulative["+Inf"] = running + counts[-1]
+        return {"buckets": cumulative, "count": count, "sum": total}
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], le: str = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if le is not None:
+        pairs.append(f'le="{le}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counters keyed by label values"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {value:g}"
+
+
+class HistogramFamily:
+    """Histograms keyed by label values, children are created on first use"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS_SECONDS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._children: Dict[Tuple[str, ...], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *labels: str) -> Histogram:
+        child = self._children.get(labels)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(labels, Histogram(self.buckets))
+        return child
+
+    def observe(self, value: float, *labels: str):
+        self.labels(*labels).observe(value)
+
+    def samples(self):
+        for labels, child in list(self._children.items()):
+            snapshot = child.snapshot()
+            for bound, count in snapshot["buckets"].items():
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, labels, le=bound)} {count}"
+            label_text = _format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum{label_text} {snapshot['sum']:g}"
+            yield f"{self.name}_count{label_text} {snapshot['count']}"
+
+
+class GaugeFunction:
+    """Gauge read from a callback at scrape time, the callback returns a number or {label values: number}"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, callback: Callable, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.labelnames = tuple(labelnames)
+
+    def samples(self):
+        try:
+            values = self.callback()
+        except Exception:
+            return
+        if not isinstance(values, dict):
+            values = {(): values}
+        for labels, value in values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {value:g}"
+
+
+class MetricsRegistry:
+    """Named metrics rendered together in the Prometheus text exposition format"""
+
+    content_type = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        # Re-registering under the same name replaces the metric, e.g. a gauge bound to a new engine
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+# Global registry
+registry = MetricsRegistry()
+
+http_requests_total = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route template, method and status", ("route", "method", "status")
+))
+http_request_duration_seconds = registry.register(HistogramFamily(
+    "http_request_duration_seconds", "HTTP request latency until the response is sent", ("route", "method")
+))
+rate_limit_rejections_total = registry.register(Counter(
+    "rate_limit_rejections_total", "Requests rejected by a limiter", ("limiter",)
+))
+auth_stage_seconds = registry.register(HistogramFamily(
+    "auth_stage_seconds", "Face authentication pipeline stage latency", ("stage",)
+))
+ollama_time_to_first_token_seconds = registry.register(HistogramFamily(
+    "ollama_time_to_first_token_seconds",
+    "Time until the first generated token, measured for streams and taken from Ollama's durations otherwise",
+    ("model", "stream")
+))
+ollama_generation_seconds = registry.register(HistogramFamily(
+    "ollama_generation_seconds", "Total generation time seen by the client", ("model", "stream")
+))
+ollama_prompt_eval_tokens_per_second = registry.register(HistogramFamily(
+    "ollama_prompt_eval_tokens_per_second", "Prompt evaluation throughput reported by Ollama", ("model",),
+    buckets=TOKEN_RATE_BUCKETS
+))
+ollama_eval_tokens_per_second = registry.register(HistogramFamily(
+    "ollama_eval_tokens_per_second", "Generation throughput reported by Ollama", ("model",),
+    buckets=TOKEN_RATE_BUCKETS
+))
+ollama_errors_total = registry.register(Counter(
+    "ollama_errors_total", "Generations that ended in an error", ("model", "stream")
+))
+db_pool_checkout_wait_seconds = registry.register(HistogramFamily(
+    "db_pool_checkout_wait_seconds", "Time to check a connection out of the database pool", ("pool",)
+))
+
+
+def record_auth_stage(timings, stage: str, started: float):
+    """
+    Observe the elapsed time for an auth pipeline stage, and store it in
+    milliseconds in timings when given
+    """
+    elapsed = time.perf_counter() - started
+    auth_stage_seconds.labels(stage).observe(elapsed)
+    if timings is not None:
+        timings[stage] = round(elapsed * 1000, 3)
+
+
+def _nanos_rate(count, duration_ns) -> float:
+    if not count or not duration_ns:
+        return 0.0
+    return count / (duration_ns / 1e9)
+
+
+def observe_ollama_generation(event: dict):
+    """
+    Record one finished generation reported by AsyncOllamaClient, see its observer argument
+    """
+    model = event.get("model") or "unknown"
+    stream = "true" if event.get("stream") else "false"
+    result = event.get("result") or {}
+    if "error" in result:
+        ollama_errors_total.inc(model, stream)
+        return
+
+    ollama_generation_seconds.labels(model, stream).observe(event["elapsed"])
+
+    ttft = event.get("ttft")
+    if ttft is None and result.get("total_duration") and result.get("eval_duration") is not None:
+        # Server side: everything before the first token is load plus prompt evaluation
+        ttft = (result["total_duration"] - result["eval_duration"]) / 1e9
+    if ttft is not None:
+        ollama_time_to_first_token_seconds.labels(model, stream).observe(ttft)
+
+    prompt_rate = _nanos_rate(result.get("prompt_eval_count"), result.get("prompt_eval_duration"))
+    if prompt_rate:
+        ollama_prompt_eval_tokens_per_second.labels(model).observe(prompt_rate)
+    eval_rate = _nanos_rate(result.get("eval_count"), result.get("eval_duration"))
+    if eval_rate:
+        ollama_eval_tokens_per_second.labels(model).observe(eval_rate)
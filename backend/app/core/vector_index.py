@@ -0,0 +1,169 @@
+"""
+pgvector Index Management
+
+This module creates and maintains the approximate nearest neighbour (ANN)
+index on users.face_embedding and applies the search-time parameters, so
+face login can be answered with a single indexed ORDER BY ... LIMIT query.
+"""
+
+import logging
+import time
+from typing import TYPE_CHECKING
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from .config import settings
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAMES = {
+    "hnsw": "ix_users_face_embedding_hnsw",
+    "ivfflat": "ix_users_face_embedding_ivfflat",
+}
+
+# pg_advisory_xact_lock key serialising index maintenance across workers
+INDEX_LOCK_KEY = 0x6761726C6963  # "garlic"
+
+# Cached row estimate used to decide between exact and indexed search
+_ROW_ESTIMATE_TTL_SECONDS = 60.0
+_row_estimate = {"rows": -1.0, "checked_at": 0.0}
+
+
+def _index_options() -> dict:
+    """Return the storage parameters for the configured index type"""
+    if settings.FACE_INDEX_TYPE == "hnsw":
+        return {
+            "m": settings.FACE_INDEX_HNSW_M,
+            "ef_construction": settings.FACE_INDEX_HNSW_EF_CONSTRUCTION,
+        }
+    if settings.FACE_INDEX_TYPE == "ivfflat":
+        return {"lists": settings.FACE_INDEX_IVFFLAT_LISTS}
+    return {}
+
+
+def ensure_vector_extension(engine) -> None:
+    """Create the pgvector extension, must run before the tables are created"""
+    with engine.begin() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+
+
+def ensure_face_embedding_index(engine) -> None:
+    """
+    Create the configured ANN index on users.face_embedding and drop the
+    other index type. An existing index whose parameters differ from the
+    settings is rebuilt. IVFFlat centroids are computed from the rows present
+    at build time, so it should be (re)built once the table holds real data.
+
+    Every worker runs this at startup. A transaction-level advisory lock lets
+    one of them do the work while the others wait and then find the index up
+    to date.
+    """
+    index_type = settings.FACE_INDEX_TYPE
+    if index_type not in INDEX_NAMES and index_type != "none":
+        raise ValueError(f"Unsupported FACE_INDEX_TYPE: {index_type}")
+
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": INDEX_LOCK_KEY})
+
+        for other_type, other_name in INDEX_NAMES.items():
+            if other_type != index_type:
+                conn.execute(text(f"DROP INDEX IF EXISTS {other_name}"))
+
+        if index_type == "none":
+            logger.info("Face embedding ANN index disabled, using exact search")
+            return
+
+        index_name = INDEX_NAMES[index_type]
+        options = _index_options()
+        expected = sorted(f"{key}={value}" for key, value in options.items())
+
+        current = conn.execute(
+            text("SELECT reloptions FROM pg_class WHERE relname = :name AND relkind = 'i'"),
+            {"name": index_name}
+        ).first()
+
+        if current is not None and sorted(current[0] or []) == expected:
+            logger.info(f"Face embedding index {index_name} is up to date")
+            return
+
+        if current is not None:
+            logger.info(f"Rebuilding {index_name}, parameters changed to {expected}")
+            conn.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+
+        with_clause = ", ".join(f"{key} = {int(value)}" for key, value in options.items())
+        conn.execute(text(
+            f"CREATE INDEX IF NOT EXISTS {index_name} ON users "
+            f"USING {index_type} (face_embedding vector_cosine_ops) WITH ({with_clause})"
+        ))
+        conn.execute(text("ANALYZE users"))
+        logger.info(f"Face embedding index {index_name} created with {expected}")
+
+
+def install_search_settings(engine) -> None:
+    """
+    Apply ef_search / probes on every new pooled connection, so the login
+    query does not need an extra SET round trip per request
+    """
+    @event.listens_for(engine, "connect")
+    def _set_search_parameters(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(f"SET hnsw.ef_search = {int(settings.FACE_INDEX_EF_SEARCH)}")
+            cursor.execute(f"SET ivfflat.probes = {int(settings.FACE_INDEX_IVFFLAT_PROBES)}")
+        finally:
+            cursor.close()
+        dbapi_connection.commit()
+
+
+_ROW_ESTIMATE_SQL = "SELECT reltuples FROM pg_class WHERE relname = 'users' AND relkind = 'r'"
+
+
+def _row_estimate_due() -> bool:
+    if settings.FACE_INDEX_TYPE not in INDEX_NAMES:
+        return False
+    return time.monotonic() - _row_estimate["checked_at"] > _ROW_ESTIMATE_TTL_SECONDS
+
+
+def _store_row_estimate(rows) -> None:
+    _row_estimate["rows"] = float(rows) if rows is not None else -1.0
+    _row_estimate["checked_at"] = time.monotonic()
+
+
+def _exact_for_row_estimate() -> bool:
+    if settings.FACE_INDEX_TYPE not in INDEX_NAMES:
+        return True
+    # reltuples is -1 until the table has been vacuumed or analyzed
+    rows = _row_estimate["rows"]
+    return rows < 0 or rows <= settings.FACE_EXACT_SEARCH_MAX_ROWS
+
+
+def use_exact_search(db: Session) -> bool:
+    """
+    Decide whether the login query should bypass the ANN index. Small tables
+    are searched exactly, the row estimate is refreshed at most once a minute.
+    """
+    if _row_estimate_due():
+        _store_row_estimate(db.execute(text(_ROW_ESTIMATE_SQL)).scalar())
+    return _exact_for_row_estimate()
+
+
+async def use_exact_search_async(db: "AsyncSession") -> bool:
+    """use_exact_search for an asyncio session"""
+    if _row_estimate_due():
+        _store_row_estimate((await db.execute(text(_ROW_ESTIMATE_SQL))).scalar())
+    return _exact_for_row_estimate()
+
+
+def face_distance(column, query_embedding: list, exact: bool = False):
+    """
+    Build the cosine distance expression for ORDER BY. Adding 0 to the
+    expression keeps the planner from matching it against the ANN index,
+    which forces an exact sequential scan without an extra SET statement.
+    """
+    distance = column.cosine_distance(query_embedding)
+    if exact:
+        distance = distance + 0
+    return distance
@@ -1,11 +1,28 @@
+import asyncio
 import logging
-from fastapi import FastAPI
+from fastapi import FastAPI, status
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 
 from .core.config import settings
-from .core.database import Base, engine
-from .api.v1 import auth_router, code_router, chat_router
-from .middlewares import rate_limit_middleware, SecurityHeadersMiddleware, validation_middleware
+from .core.database import Base, async_engine, engine, SessionLocal
+from .core.vector_index import ensure_vector_extension, ensure_face_embedding_index, install_search_settings
+from .core.metrics import registry as metrics_registry
+from .middlewares import MetricsMiddleware, RateLimitMiddleware, rate_limit_backend, SecurityHeadersMiddleware, ValidationMiddleware
+
+# Only import the subsystems this worker serves, an llm worker never loads torch
+# and an auth worker never builds the Ollama client
+AUTH_ENABLED = settings.role_enabled("auth")
+LLM_ENABLED = settings.role_enabled("llm")
+
+if AUTH_ENABLED:
+    from .core.executor import auth_executor
+    from .api.v1 import auth_router
+    from .services.embedding_index import embedding_index
+    from .services.face_recognition_service import face_recognition_service
+if LLM_ENABLED:
+    from .api.v1 import code_router, chat_router
+    from .services.code_service import code_service
 
 # Configure logging
 logging.basicConfig(
@@ -24,50 +41,147 @@ app = FastAPI(
     description="GARLIC-Q - AI-Hub"
 )
 
-# Add security middleware
-app.add_middleware(SecurityHeadersMiddleware)
-
-# Add CORS middleware
+# Middleware, the last added runs first: request metrics see every response,
+# security headers wrap every response including rejections, then validation and rate limiting short-circuit
+# before CORS and the app. All of them are plain ASGI so streaming responses
+# and background tasks pass through untouched.
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.BACKEND_CORS_ORIGINS,
     allow_credentials=True,
-    allow_methods=["GET", "POST"],
+    allow_methods=["GET", "POST", "DELETE"],
     allow_headers=["Content-Type", "Authorization"],
 )
+app.add_middleware(RateLimitMiddleware, backend=rate_limit_backend)
+app.add_middleware(ValidationMiddleware)
+app.add_middleware(SecurityHeadersMiddleware)
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+background_tasks = []
+
+# Subsystem readiness, reported by /ready
+readiness = {"database": False}
+
+def sync_embedding_index():
+    """Reload the in-memory face embedding index from the database"""
+    db = SessionLocal()
+    try:
+        embedding_index.sync_from_db(db)
+    finally:
+        db.close()
+
+async def embedding_index_resync_loop():
+    """Load the in-memory index, then periodically resync it to pick up changes from other workers"""
+    while True:
+        try:
+            await asyncio.to_thread(sync_embedding_index)
+        except Exception as e:
+            logger.error(f"Embedding index resync failed: {e}")
+        await asyncio.sleep(settings.FACE_MEMORY_INDEX_RESYNC_SECONDS)
+
+async def warm_face_models():
+    """Load the face models off the event loop so the worker serves requests meanwhile"""
+    try:
+        await asyncio.to_thread(face_recognition_service.ensure_loaded)
+    except Exception as e:
+        logger.error(f"Face model warm-up failed: {e}")
+
+# Apply pgvector search parameters to every pooled connection
+install_search_settings(engine)
+if async_engine is not None:
+    install_search_settings(async_engine.sync_engine)
 
 # Initialize database tables on startup
 @app.on_event("startup")
 async def startup_event():
+    logger.info(f"Starting worker with role {settings.WORKER_ROLE}")
     try:
-        # Create all tables
-        Base.metadata.create_all(bind=engine)
-        logger.info("Database tables created successfully!")
+        if LLM_ENABLED:
+            # Probe Ollama in the background instead of on every request
+            code_service.start_health_monitor()
+
+        if AUTH_ENABLED:
+            # Create all tables
+            ensure_vector_extension(engine)
+            Base.metadata.create_all(bind=engine)
+            logger.info("Database tables created successfully!")
+
+            # Create or update the face embedding ANN index
+            ensure_face_embedding_index(engine)
+            readiness["database"] = True
+
+            # Load models and the in-memory matching index in the background,
+            # requests load the models on first use if they arrive earlier
+            if settings.FACE_MODEL_PRELOAD:
+                background_tasks.append(asyncio.create_task(warm_face_models()))
+            if settings.FACE_MATCH_BACKEND == "memory":
+                background_tasks.append(asyncio.create_task(embedding_index_resync_loop()))
     except Exception as e:
         logger.error(f"Error during startup: {e}")
         raise
 
-# Health check endpoint for Render monitoring
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task in background_tasks:
+        task.cancel()
+    await rate_limit_backend.close()
+    if LLM_ENABLED:
+        await code_service.close()
+    if AUTH_ENABLED:
+        auth_executor.shutdown()
+    if async_engine is not None:
+        await async_engine.dispose()
+
+# Liveness check endpoint for Render monitoring, answers as soon as the process is up
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "service": settings.PROJECT_NAME}
+    health = {
+        "status": "healthy",
+        "service": settings.PROJECT_NAME,
+        "role": settings.WORKER_ROLE
+    }
+    if LLM_ENABLED:
+        health["ollama"] = code_service.health_monitor.snapshot()
+    return health
+
+# Readiness check, 503 until the subsystems for this worker's role can serve traffic
+@app.get("/ready")
+async def readiness_check():
+    checks = {}
+    if AUTH_ENABLED:
+        checks["database"] = "ready" if readiness["database"] else "pending"
+        face_models = face_recognition_service.status
+        if face_models == "not_loaded" and not settings.FACE_MODEL_PRELOAD:
+            face_models = "lazy"  # loaded by the first request
+        checks["face_models"] = face_models
+        if settings.FACE_MATCH_BACKEND == "memory":
+            checks["embedding_index"] = "ready" if embedding_index.loaded else "pending"
+    if LLM_ENABLED:
+        # Reported but not required, Ollama being down is answered per request
+        checks["ollama"] = "ready" if code_service.health_monitor.is_available() else "unavailable"
+
+    required = {name: value for name, value in checks.items() if name != "ollama"}
+    ready = all(value in ("ready", "lazy") for value in required.values())
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"ready": ready, "role": settings.WORKER_ROLE, "checks": checks}
+    )
+
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        """Prometheus text format metrics for this worker"""
+        return Response(content=metrics_registry.render(), media_type=metrics_registry.content_type)
 
 # Root endpoint to avoid 404 on GET /
 @app.get("/")
 async def root():
     return {"status": "ok", "docs": "/docs", "api": settings.API_V1_STR}
 
-# Apply rate limiting middleware
-@app.middleware("http")
-async def apply_rate_limit(request, call_next):
-    return await rate_limit_middleware(request, call_next)
-
-# Apply validation middleware
-@app.middleware("http")
-async def apply_validation(request, call_next):
-    return await validation_middleware(request, call_next)
-
-# Include API routers
-app.include_router(auth_router, prefix=settings.API_V1_STR)
-app.include_router(code_router, prefix=settings.API_V1_STR)
-app.include_router(chat_router, prefix=settings.API_V1_STR) 
\ No newline at end of file
+# Include API routers for this worker's role
+if AUTH_ENABLED:
+    app.include_router(auth_router, prefix=settings.API_V1_STR)
+if LLM_ENABLED:
+    app.include_router(code_router, prefix=settings.API_V1_STR)
+    app.include_router(chat_router, prefix=settings.API_V1_STR) 
\ No newline at end of file
@@ -5,16 +5,20 @@ This package contains all security-related middleware components:
 - Rate limiting
 - Security headers
 - Input validation
+- Request metrics
 """
 
-from .rate_limit import rate_limit_middleware, RateLimiter
+from .rate_limit import RateLimitMiddleware, rate_limit_backend, RateLimiter
 from .security import SecurityHeadersMiddleware
-from .validation import validation_middleware, InputValidationMiddleware
+from .validation import ValidationMiddleware, InputValidationMiddleware
+from .metrics import MetricsMiddleware
 
 __all__ = [
-    "rate_limit_middleware",
+    "RateLimitMiddleware",
+    "rate_limit_backend",
     "RateLimiter", 
     "SecurityHeadersMiddleware",
-    "validation_middleware",
-    "InputValidationMiddleware"
+    "ValidationMiddleware",
+    "InputValidationMiddleware",
+    "MetricsMiddleware"
 ]
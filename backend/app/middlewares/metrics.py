@@ -0,0 +1,40 @@
+"""
+Request Metrics Middleware
+
+Counts requests by route template, method and status and records their
+latency for /metrics. Plain ASGI, the response is observed through the
+send channel without wrapping the body.
+"""
+
+import time
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..core.metrics import http_request_duration_seconds, http_requests_total
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Label by route template, not the raw path, to keep cardinality bounded
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            http_requests_total.inc(route_path, method, str(status_code))
+            http_request_duration_seconds.labels(route_path, method).observe(time.perf_counter() - started)
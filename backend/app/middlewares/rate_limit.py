@@ -3,49 +3,361 @@ Rate Limiting Middleware
 
 This module provides rate limiting functionality to prevent DDoS attacks
 and abuse of the API endpoints.
+
+The limit state lives in a pluggable backend selected by RATE_LIMIT_BACKEND:
+
+- memory: token buckets in this process (per worker, reset on restart)
+- sqlite: token buckets in a SQLite file shared by the workers on one host
+- redis: sliding-window counters in Redis shared by every replica, limited
+  to RATE_LIMIT_PER_MINUTE per window (RATE_LIMIT_BURST does not apply)
+
+Each check costs at most one round trip to a shared backend.
 """
 
+import abc
+import asyncio
+import json
+import logging
+import math
+import sqlite3
 import time
-from collections import defaultdict
-from fastapi import HTTPException, Request
-from typing import Dict, Tuple
+from collections import OrderedDict
+from starlette.types import ASGIApp, Receive, Scope, Send
+from typing import Optional, Tuple
+
+from ..core.config import settings
+from ..core.metrics import rate_limit_rejections_total
+
+logger = logging.getLogger(__name__)
 
 class RateLimiter:
-    def __init__(self, requests_per_minute: int = 60):
+    """
+    Token bucket per client, O(1) per check.
+
+    Each bucket holds up to `burst` tokens and refills at
+    requests_per_minute / 60 tokens per second. Buckets live in an
+    OrderedDict kept in least-recently-used order: the table never holds
+    more than max_keys clients, and buckets idle long enough to have
+    refilled completely are dropped, since a missing bucket means full.
+    """
+
+    def __init__(self, requests_per_minute: int = 60, burst: Optional[int] = None,
+                 max_keys: int = 100000):
         self.requests_per_minute = requests_per_minute
-        self.requests: Dict[str, list] = defaultdict(list)
-    
-    def is_allowed(self, client_ip: str) -> bool:
+        self.burst = float(burst or requests_per_minute)
+        self.rate = requests_per_minute / 60.0
+        self.max_keys = max(1, max_keys)
+        # Time for an empty bucket to refill, after which forgetting it changes nothing
+        self.idle_seconds = self.burst / self.rate if self.rate > 0 else math.inf
+        self.buckets: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (tokens, last_refill)
+        self.evictions = 0
+
+    def is_allowed(self, client_ip: str, now: Optional[float] = None) -> bool:
         """Check if request is allowed based on rate limit"""
-        now = time.time()
-        minute_ago = now - 60
-        
-        # Clean old requests
-        self.requests[client_ip] = [
-            req_time for req_time in self.requests[client_ip] 
-            if req_time > minute_ago
-        ]
-        
-        # Check if limit exceeded
-        if len(self.requests[client_ip]) >= self.requests_per_minute:
-            return False
-        
-        # Add current request
-        self.requests[client_ip].append(now)
-        return True
+        if now is None:
+            now = time.monotonic()
 
-# Global rate limiter instance
-rate_limiter = RateLimiter(requests_per_minute=60)
-
-async def rate_limit_middleware(request: Request, call_next):
-    """Rate limiting middleware"""
-    client_ip = request.client.host
-    
-    if not rate_limiter.is_allowed(client_ip):
-        raise HTTPException(
-            status_code=429,
-            detail="Too many requests. Please try again later."
+        bucket = self.buckets.get(client_ip)
+        if bucket is None:
+            tokens = self.burst
+        else:
+            tokens, last = bucket
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            self.buckets.move_to_end(client_ip)
+
+        allowed = tokens >= 1.0
+        if allowed:
+            tokens -= 1.0
+        self.buckets[client_ip] = (tokens, now)
+
+        self._evict(now)
+        return allowed
+
+    def retry_after(self, client_ip: str, now: Optional[float] = None) -> int:
+        """Seconds until the client's next token"""
+        if self.rate <= 0:
+            return 60
+        bucket = self.buckets.get(client_ip)
+        if bucket is None:
+            return 1
+        if now is None:
+            now = time.monotonic()
+        tokens, last = bucket
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        return max(1, math.ceil((1.0 - tokens) / self.rate))
+
+    def _evict(self, now: float):
+        """Drop least recently used buckets over the size bound, then a few idle ones"""
+        buckets = self.buckets
+        while len(buckets) > self.max_keys:
+            buckets.popitem(last=False)
+            self.evictions += 1
+
+        # Amortised idle sweep, at most two per call keeps the check O(1)
+        for _ in range(2):
+            if not buckets:
+                break
+            key = next(iter(buckets))
+            if now - buckets[key][1] < self.idle_seconds:
+                break
+            del buckets[key]
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        return {
+            "requests_per_minute": self.requests_per_minute,
+            "burst": self.burst,
+            "keys": len(self.buckets),
+            "max_keys": self.max_keys,
+            "evictions": self.evictions,
+        }
+
+class RateLimitBackend(abc.ABC):
+    """
+    Interface for rate limit stores, hit() records one request and decides it.
+    `now` is injectable so the backends can be driven with simulated time.
+    """
+
+    name = "base"
+
+    @abc.abstractmethod
+    async def hit(self, key: str, now: Optional[float] = None) -> Tuple[bool, int]:
+        """Return (allowed, retry_after_seconds) for one request from key"""
+
+    async def close(self):
+        pass
+
+    async def stats(self) -> dict:
+        return {"backend": self.name}
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """Token buckets in this worker's memory"""
+
+    name = "memory"
+
+    def __init__(self, limiter: RateLimiter):
+        self.limiter = limiter
+
+    async def hit(self, key: str, now: Optional[float] = None) -> Tuple[bool, int]:
+        if self.limiter.is_allowed(key, now):
+            return True, 0
+        return False, self.limiter.retry_after(key, now)
+
+    async def stats(self) -> dict:
+        return {"backend": self.name, **self.limiter.stats()}
+
+class SQLiteRateLimitBackend(RateLimitBackend):
+    """
+    Token buckets in a SQLite file shared by the workers on one host.
+
+    A single UPSERT ... RETURNING statement refills, decides and stores each
+    bucket, so the check is atomic across processes. WAL mode keeps readers
+    and the writer from blocking each other.
+    """
+
+    name = "sqlite"
+
+    # Refill, take a token when one is available and report the decision, in one statement
+    HIT_SQL = """
+        INSERT INTO rate_limits (key, tokens, updated_at, allowed) VALUES (?1, ?2 - 1, ?3, 1)
+        ON CONFLICT(key) DO UPDATE SET
+            allowed = MIN(?2, tokens + (?3 - updated_at) * ?4) >= 1,
+            tokens = MIN(?2, tokens + (?3 - updated_at) * ?4)
+                     - (MIN(?2, tokens + (?3 - updated_at) * ?4) >= 1),
+            updated_at = ?3
+        RETURNING allowed, tokens
+    """
+
+    def __init__(self, path: str, requests_per_minute: int, burst: Optional[int] = None,
+                 max_keys: int = 100000):
+        self.path = path
+        self.burst = float(burst or requests_per_minute)
+        self.rate = requests_per_minute / 60.0
+        self.max_keys = max_keys
+        self.idle_seconds = self.burst / self.rate if self.rate > 0 else 86400.0
+        self._writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=1.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=OFF")  # limiter state is disposable
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits ("
+            "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, allowed INTEGER NOT NULL)"
         )
-    
-    response = await call_next(request)
-    return response
+        self._lock = asyncio.Lock()
+        logger.info(f"SQLite rate limit store at {path}")
+
+    def _hit(self, key: str, now: Optional[float] = None) -> Tuple[bool, int]:
+        if now is None:
+            now = time.time()
+        allowed, tokens = self._conn.execute(self.HIT_SQL, (key, self.burst, now, self.rate)).fetchone()
+
+        # Trim idle buckets (a missing bucket means full) and the oldest beyond max_keys now and then
+        self._writes += 1
+        if self._writes % 1000 == 0:
+            self._conn.execute("DELETE FROM rate_limits WHERE updated_at < ?", (now - self.idle_seconds,))
+            self._conn.execute(
+                "DELETE FROM rate_limits WHERE key IN ("
+                "SELECT key FROM rate_limits ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_keys,)
+            )
+
+        if allowed:
+            return True, 0
+        if self.rate <= 0:
+            return False, 60
+        return False, max(1, math.ceil((1.0 - tokens) / self.rate))
+
+    async def hit(self, key: str, now: Optional[float] = None) -> Tuple[bool, int]:
+        # One connection per worker, serialised here and run off the event loop
+        # since another process may briefly hold the write lock
+        async with self._lock:
+            return await asyncio.to_thread(self._hit, key, now)
+
+    async def close(self):
+        self._conn.close()
+
+    def _count_keys(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM rate_limits").fetchone()[0]
+
+    async def stats(self) -> dict:
+        async with self._lock:
+            keys = await asyncio.to_thread(self._count_keys)
+        return {"backend": self.name, "path": self.path, "keys": keys, "max_keys": self.max_keys}
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """
+    Sliding-window counters in Redis, shared by every worker and replica.
+
+    Each request increments the counter for the current minute and reads the
+    previous minute's counter in one pipelined MULTI/EXEC round trip. The
+    estimate weights the previous window by how much of it still overlaps
+    the last 60 seconds. Rejected requests are counted too, so a client that
+    keeps retrying stays limited.
+
+    The window holds requests_per_minute requests, RATE_LIMIT_BURST is not
+    applied: a client can spend its whole minute at once, but never more.
+
+    Any client with the redis.asyncio pipeline API can be passed in, e.g. a
+    fakeredis instance as a local stand-in.
+    """
+
+    name = "redis"
+    WINDOW_SECONDS = 60
+
+    def __init__(self, url: str = None, requests_per_minute: int = 60, prefix: str = "garlicq:rl:",
+                 client=None):
+        if client is None:
+            import redis.asyncio as redis
+
+            client = redis.from_url(url)
+        self.client = client
+        self.url = url
+        self.limit = requests_per_minute
+        self.prefix = prefix
+
+    async def hit(self, key: str, now: Optional[float] = None) -> Tuple[bool, int]:
+        if now is None:
+            now = time.time()
+        window = int(now // self.WINDOW_SECONDS)
+        elapsed = (now % self.WINDOW_SECONDS) / self.WINDOW_SECONDS
+        current_key = f"{self.prefix}{key}:{window}"
+
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.incr(current_key)
+            pipe.expire(current_key, self.WINDOW_SECONDS * 2)
+            pipe.get(f"{self.prefix}{key}:{window - 1}")
+            count, _, previous = await pipe.execute()
+
+        estimate = int(previous or 0) * (1.0 - elapsed) + int(count)
+        if estimate <= self.limit:
+            return True, 0
+        return False, max(1, math.ceil(self.WINDOW_SECONDS * (1.0 - elapsed)))
+
+    async def close(self):
+        await self.client.aclose()
+
+    async def stats(self) -> dict:
+        return {"backend": self.name, "url": self.url, "requests_per_minute": self.limit}
+
+# Global rate limiter instance
+rate_limiter = RateLimiter(
+    requests_per_minute=settings.RATE_LIMIT_PER_MINUTE,
+    burst=settings.RATE_LIMIT_BURST or None,
+    max_keys=settings.RATE_LIMIT_MAX_KEYS
+)
+
+def create_rate_limit_backend(backend: str = None) -> RateLimitBackend:
+    """Build the backend selected by RATE_LIMIT_BACKEND, falling back to memory if it cannot start"""
+    backend = (backend or settings.RATE_LIMIT_BACKEND).lower()
+    try:
+        if backend == "sqlite":
+            return SQLiteRateLimitBackend(
+                settings.RATE_LIMIT_SQLITE_PATH,
+                requests_per_minute=settings.RATE_LIMIT_PER_MINUTE,
+                burst=settings.RATE_LIMIT_BURST or None,
+                max_keys=settings.RATE_LIMIT_MAX_KEYS
+            )
+        if backend == "redis":
+            if settings.RATE_LIMIT_BURST:
+                logger.warning("RATE_LIMIT_BURST is not supported by the redis rate limit backend, ignoring it")
+            return RedisRateLimitBackend(
+                settings.RATE_LIMIT_REDIS_URL,
+                requests_per_minute=settings.RATE_LIMIT_PER_MINUTE,
+                prefix=settings.RATE_LIMIT_KEY_PREFIX
+            )
+        if backend != "memory":
+            logger.warning(f"Unknown rate limit backend {backend}, using memory")
+    except Exception as e:
+        logger.error(f"Failed to start {backend} rate limit backend, using memory: {e}")
+    return MemoryRateLimitBackend(rate_limiter)
+
+# Global backend used by the middleware
+rate_limit_backend = create_rate_limit_backend()
+
+_REJECTED_BODY = json.dumps({"detail": "Too many requests. Please try again later."}).encode()
+_REJECTED_HEADERS = [
+    (b"content-type", b"application/json"),
+    (b"content-length", str(len(_REJECTED_BODY)).encode()),
+]
+
+def client_host(scope: Scope) -> str:
+    """Client address of a request, "unknown" when the server does not report one"""
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+class RateLimitMiddleware:
+    """
+    Rate limiting middleware, plain ASGI.
+
+    Rejected requests are answered with 429 and Retry-After from here,
+    before routing or the request body is touched.
+    """
+
+    def __init__(self, app: ASGIApp, backend: RateLimitBackend = None):
+        self.app = app
+        self.backend = backend or rate_limit_backend
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        client_ip = client_host(scope)
+        try:
+            allowed, retry_after = await self.backend.hit(client_ip)
+        except Exception as e:
+            # A shared store being unreachable should not take the API down with it
+            logger.error(f"Rate limit check failed, allowing request: {e}")
+            allowed, retry_after = True, 0
+
+        if allowed:
+            await self.app(scope, receive, send)
+            return
+
+        rate_limit_rejections_total.inc("requests")
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": _REJECTED_HEADERS + [(b"retry-after", str(retry_after).encode())],
+        })
+        await send({"type": "http.response.body", "body": _REJECTED_BODY})
@@ -7,8 +7,19 @@ malicious input and file upload attacks.
 
 import re
 from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
 from typing import Optional
 
+from ..core.config import settings
+
+# Allowance for boundaries, part headers and small form fields on top of the image
+FORM_OVERHEAD_BYTES = 64 * 1024
+
+def max_upload_body_bytes() -> int:
+    """Largest multipart body accepted for an upload, the image limit plus form overhead"""
+    return settings.MAX_FILE_SIZE_MB * 1024 * 1024 + FORM_OVERHEAD_BYTES
+
 class InputValidationMiddleware:
     @staticmethod
     def validate_file_size(content_length: Optional[int], max_size_mb: int = 10) -> bool:
@@ -21,14 +32,12 @@ class InputValidationMiddleware:
     
     @staticmethod
     def validate_content_type(content_type: str) -> bool:
-        """Validate content type for file uploads"""
-        allowed_types = [
-            'image/jpeg',
-            'image/jpg', 
-            'image/png',
-            'image/webp'
-        ]
-        return content_type in allowed_types
+        """
+        Validate content type for file uploads, images arrive as multipart/form-data
+        parts and their type is checked from the bytes while the body streams in
+        """
+        media_type = content_type.split(";", 1)[0].strip().lower()
+        return media_type == 'multipart/form-data'
     
     @staticmethod
     def sanitize_input(text: str) -> str:
@@ -43,29 +52,41 @@ class InputValidationMiddleware:
         # Check file size for uploads
         if request.method == "POST" and "/users/" in request.url.path:
             content_length = request.headers.get("content-length")
-            if content_length and not InputValidationMiddleware.validate_file_size(int(content_length)):
+            # Same body limit as the streaming upload reader, the image part itself is checked there
+            if content_length and int(content_length) > max_upload_body_bytes():
                 raise HTTPException(
                     status_code=413,
-                    detail="File too large. Maximum size is 10MB."
+                    detail=f"File too large. Maximum size is {settings.MAX_FILE_SIZE_MB}MB."
                 )
             
             content_type = request.headers.get("content-type", "")
             if not InputValidationMiddleware.validate_content_type(content_type):
                 raise HTTPException(
                     status_code=400,
-                    detail="Invalid file type. Only JPEG, PNG, and WebP images are allowed."
+                    detail="Invalid request type. Uploads must be sent as multipart/form-data."
                 )
 
-async def validation_middleware(request: Request, call_next):
-    """Input validation middleware"""
-    try:
-        InputValidationMiddleware.validate_request(request)
-        response = await call_next(request)
-        return response
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(
-            status_code=400,
-            detail="Invalid request format."
-        )
+class ValidationMiddleware:
+    """
+    Input validation middleware, plain ASGI.
+
+    Only upload routes are inspected, every other request passes through
+    without building a Request object.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] == "http" and scope["method"] == "POST" and "/users/" in scope["path"]:
+            # Rejections are answered directly, an exception raised here would bypass
+            # the app's exception handlers and reach the client as a 500
+            try:
+                InputValidationMiddleware.validate_request(Request(scope))
+            except HTTPException as e:
+                await JSONResponse(status_code=e.status_code, content={"detail": e.detail})(scope, receive, send)
+                return
+            except Exception:
+                await JSONResponse(status_code=400, content={"detail": "Invalid request format."})(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
@@ -21,7 +21,7 @@ async def generate_chat(request: ChatGenerationRequest):
     """
     Generate chat response using Ollama CodeLlama model
     """
-    return code_service.generate_chat(
+    return await code_service.generate_chat(
         messages=request.messages,
         max_tokens=request.max_tokens,
         temperature=request.temperature
@@ -32,7 +32,7 @@ async def send_message(request: ChatMessageRequest):
     """
     Send a single message and get response using Ollama CodeLlama model
     """
-    return code_service.generate_chat(
+    return await code_service.generate_chat(
         messages=[{"role": "user", "content": request.message}],
         max_tokens=request.max_tokens,
         temperature=request.temperature
@@ -1,113 +1,301 @@
 import logging
 import os
+import time
+import uuid
+from typing import TYPE_CHECKING
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
-import numpy as np
 
 from ..core.config import settings
+from ..core.executor import auth_executor
+from ..core.metrics import record_auth_stage
+from ..core.vector_index import face_distance, use_exact_search, use_exact_search_async
 from ..models.user import User
+from .embedding_index import embedding_index
 from .face_recognition_service import face_recognition_service
 
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
 logger = logging.getLogger(__name__)
 
 class AuthService:
     def __init__(self):
         self.face_service = face_recognition_service
+        self.embedding_index = embedding_index
 
     def signup_user(self, image_bytes: bytes, db: Session):
         """
         Signup user with face recognition, add vector to database, return user id
         """
         try:
-            embedding = self.face_service.get_face_embedding(image_bytes)
+            timings = {}
+            embedding = self.face_service.get_face_embedding(image_bytes, timings)
 
-            if embedding is None:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Face detection failed"
-                )
-            
-            # Create new user with embedding and default threshold
-            new_user = User(
-                face_embedding=embedding.tolist(),
-                recognition_threshold=0.6  # Default threshold
-            )
+            new_user = self._new_user(embedding)
+            db_started = time.perf_counter()
             db.add(new_user)
             db.commit()
             db.refresh(new_user)
-
-            logger.info(f"User created successfully with ID: {new_user.id}")
-            return {"message": "User created successfully", "user_id": new_user.id}
+            record_auth_stage(timings, "db", db_started)
+            return self._signup_result(new_user, embedding, timings)
         
         except HTTPException:
             raise
         except Exception as e:
             db.rollback()
-            logger.error(f"Error creating user: {e}")
+            raise self._signup_error(e)
+
+    async def signup_user_async(self, image_bytes: bytes, db: "AsyncSession"):
+        """
+        signup_user on an asyncio session, the embedding is computed on the auth
+        executor and the insert is awaited without holding a worker thread
+        """
+        try:
+            timings = {}
+            embedding = await auth_executor.run(self.face_service.get_face_embedding, image_bytes, timings)
+            new_user = self._new_user(embedding)
+            db_started = time.perf_counter()
+            db.add(new_user)
+            # The id is generated client side and the session keeps attributes
+            # after commit, so no refresh round trip is needed
+            await db.commit()
+            record_auth_stage(timings, "db", db_started)
+            return self._signup_result(new_user, embedding, timings)
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            await db.rollback()
+            raise self._signup_error(e)
+
+    def _new_user(self, embedding) -> User:
+        """Build the user row for a signup embedding, raise 400 when no face was found"""
+        if embedding is None:
             raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"An error occurred while creating user: {str(e)}"
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Face detection failed"
             )
 
+        # Create new user with embedding and default threshold
+        return User(
+            face_embedding=embedding.tolist(),
+            recognition_threshold=0.6  # Default threshold
+        )
+
+    def _signup_result(self, new_user: User, embedding, timings: dict) -> dict:
+        if settings.FACE_MATCH_BACKEND == "memory" and self.embedding_index.loaded:
+            self.embedding_index.add(new_user.id, embedding, new_user.recognition_threshold)
+
+        logger.info(f"User created successfully with ID: {new_user.id}")
+        return {"message": "User created successfully", "user_id": new_user.id, "timings_ms": timings}
+
+    def _signup_error(self, e: Exception) -> HTTPException:
+        logger.error(f"Error creating user: {e}")
+        return HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"An error occurred while creating user: {str(e)}"
+        )
+
+    def _find_candidates(self, login_embedding, db: Session, timings: dict = None):
+        """
+        Return the closest (user_id, similarity, threshold) tuples, best first
+        """
+        top_k = max(1, settings.FACE_SEARCH_TOP_K)
+
+        # In-process matrix search, falls back to pgvector until the first sync
+        # and whenever it finds no match
+        if settings.FACE_MATCH_BACKEND == "memory" and self.embedding_index.loaded:
+            candidates = self.embedding_index.search(login_embedding, k=top_k)
+            if self._has_match(candidates):
+                return candidates
+
+        db_started = time.perf_counter()
+        rows = db.execute(self._candidates_query(login_embedding, top_k, use_exact_search(db))).all()
+        record_auth_stage(timings, "db", db_started)
+        return [(row.id, 1.0 - float(row.distance), float(row.recognition_threshold)) for row in rows]
+
+    async def _find_candidates_async(self, login_embedding, db: "AsyncSession", timings: dict = None):
+        """_find_candidates on an asyncio session"""
+        top_k = max(1, settings.FACE_SEARCH_TOP_K)
+
+        if settings.FACE_MATCH_BACKEND == "memory" and self.embedding_index.loaded:
+            candidates = self.embedding_index.search(login_embedding, k=top_k)
+            if self._has_match(candidates):
+                return candidates
+
+        db_started = time.perf_counter()
+        exact = await use_exact_search_async(db)
+        rows = (await db.execute(self._candidates_query(login_embedding, top_k, exact))).all()
+        record_auth_stage(timings, "db", db_started)
+        return [(row.id, 1.0 - float(row.distance), float(row.recognition_threshold)) for row in rows]
+
+    @staticmethod
+    def _has_match(candidates: list) -> bool:
+        """
+        Whether a memory index result can be trusted. Users who signed up on
+        another worker are missing from this worker's index until its next
+        sync, so a miss is checked against the database before it is refused.
+        """
+        return any(similarity > threshold for _, similarity, threshold in candidates)
+
+    def _candidates_query(self, login_embedding, top_k: int, exact: bool):
+        """Nearest neighbours by cosine distance, answered by the pgvector index"""
+        distance = face_distance(User.face_embedding, login_embedding.tolist(), exact=exact)
+        return (
+            select(User.id, User.recognition_threshold, distance.label("distance"))
+            .order_by(distance)
+            .limit(top_k)
+        )
+
     def login_user(self, image_bytes: bytes, db: Session):
         """
         Login user with face recognition, return user id
         """
         try:
-            login_embedding = self.face_service.get_face_embedding(image_bytes)
+            timings = {}
+            login_embedding = self.face_service.get_face_embedding(image_bytes, timings)
+
+            self._require_face(login_embedding)
+            
+            match_started = time.perf_counter()
+            candidates = self._find_candidates(login_embedding, db, timings)
+            record_auth_stage(timings, "match", match_started)
+            return self._login_result(candidates, timings)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise self._login_error(e)
+
+    async def login_user_async(self, image_bytes: bytes, db: "AsyncSession"):
+        """
+        login_user on an asyncio session, the embedding is computed on the auth
+        executor and the candidate query is awaited without holding a worker thread
+        """
+        try:
+            timings = {}
+            login_embedding = await auth_executor.run(self.face_service.get_face_embedding, image_bytes, timings)
+            self._require_face(login_embedding)
+
+            match_started = time.perf_counter()
+            candidates = await self._find_candidates_async(login_embedding, db, timings)
+            record_auth_stage(timings, "match", match_started)
+            return self._login_result(candidates, timings)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise self._login_error(e)
+
+    def _require_face(self, login_embedding):
+        if login_embedding is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Face detection failed or face not found"
+            )
+
+    def _login_result(self, candidates: list, timings: dict) -> dict:
+        """Accept the best candidate above its own threshold, raise 404 or 401 otherwise"""
+        match_time_ms = timings["match"]
+        if not candidates:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="No users found in database"
+            )
+
+        # Candidates are ordered by similarity, accept the first one above its own threshold
+        _, best_similarity, best_match_threshold = candidates[0]
+        for user_id, similarity, threshold in candidates:
+            if similarity > threshold:
+                logger.info(f"Login successful for user {user_id} with similarity {similarity} (threshold: {threshold}, match: {match_time_ms:.2f} ms)")
+                return {
+                    "message": "Login successful", 
+                    "user_id": user_id, 
+                    "similarity": float(similarity),
+                    "threshold": float(threshold),
+                    "match_time_ms": match_time_ms,
+                    "timings_ms": timings
+                }
+
+        logger.warning(f"Login failed, best match similarity ({best_similarity:.2f}) lower than user threshold ({best_match_threshold}, match: {match_time_ms:.2f} ms)")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=f"Login failed, best match similarity ({best_similarity:.2f}) lower than user threshold ({best_match_threshold})"
+        )
+
+    def _login_error(self, e: Exception) -> HTTPException:
+        logger.error(f"Error during login: {e}")
+        return HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"An error occurred while logging in: {str(e)}"
+        )
+
+    def verify_user(self, image_bytes: bytes, user_id: uuid.UUID, db: Session):
+        """
+        Verify a claimed user id with face recognition (1:1), return user id
+        """
+        try:
+            timings = {}
+            login_embedding = self.face_service.get_face_embedding(image_bytes, timings)
 
             if login_embedding is None:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Face detection failed or face not found"
                 )
-            
-            # Pull all users face embeddings from database
-            users = db.query(User).all()
-            if not users:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="No users found in database"
-                )
-            
-            best_match_id = None
-            best_similarity = 0.0
-
-            for user in users:
-                # Convert database list to numpy array for cosine similarity
-                user_embedding = np.array(user.face_embedding)
-                # Cosine similarity between login embedding and user embedding
-                similarity = self.face_service.cosine_similarity(login_embedding, user_embedding)
-
-                # Update best match if similarity is higher than best similarity
-                if similarity > best_similarity:
-                    best_similarity = similarity
-                    best_match_id = user.id
-                    best_match_threshold = user.recognition_threshold
-
-            # If best similarity is above user's threshold, login successful
-            if best_similarity > best_match_threshold:
-                logger.info(f"Login successful for user {best_match_id} with similarity {best_similarity} (threshold: {best_match_threshold})")
+
+            # Fetch only the claimed user's embedding by primary key
+            match_started = time.perf_counter()
+            user = (
+                db.query(User.face_embedding, User.recognition_threshold)
+                .filter(User.id == user_id)
+                .first()
+            )
+            record_auth_stage(timings, "db", match_started)
+            if user is None:
+                # Same answer as a face mismatch, so user ids cannot be probed
+                record_auth_stage(timings, "match", match_started)
+                logger.warning(f"Verification failed for unknown user {user_id}")
+                raise self._verify_error(timings)
+
+            is_match, similarity = self.face_service.verify_face_match(
+                login_embedding, user.face_embedding, threshold=user.recognition_threshold
+            )
+            record_auth_stage(timings, "match", match_started)
+            match_time_ms = timings["match"]
+
+            if is_match:
+                logger.info(f"Verification successful for user {user_id} with similarity {similarity} (threshold: {user.recognition_threshold}, match: {match_time_ms:.2f} ms)")
                 return {
-                    "message": "Login successful", 
-                    "user_id": best_match_id, 
-                    "similarity": float(best_similarity),
-                    "threshold": float(best_match_threshold)
+                    "message": "Login successful",
+                    "user_id": user_id,
+                    "similarity": float(similarity),
+                    "threshold": float(user.recognition_threshold),
+                    "match_time_ms": match_time_ms,
+                    "timings_ms": timings
                 }
-            else:
-                logger.warning(f"Login failed, best match similarity ({best_similarity:.2f}) lower than user threshold ({best_match_threshold})")
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail=f"Login failed, best match similarity ({best_similarity:.2f}) lower than user threshold ({best_match_threshold})"
-                )
+
+            logger.warning(f"Verification failed for user {user_id}, similarity ({similarity:.2f}) lower than user threshold ({user.recognition_threshold}, match: {match_time_ms:.2f} ms)")
+            raise self._verify_error(timings)
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"Error during login: {e}")
+            logger.error(f"Error during verification: {e}")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"An error occurred while logging in: {str(e)}"
+                detail=f"An error occurred while verifying user: {str(e)}"
             )
 
+    def _verify_error(self, timings: dict) -> HTTPException:
+        """401 for a failed verification, identical for an unknown user and a face mismatch"""
+        return HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail={
+                "message": "Login failed, face does not match the claimed user",
+                "match_time_ms": timings["match"],
+                "timings_ms": timings
+            }
+        )
+
 # Global instance
 auth_service = AuthService() 
\ No newline at end of file
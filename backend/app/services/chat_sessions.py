@@ -0,0 +1,186 @@
+import asyncio
+import threading
+import time
+import uuid
+from array import array
+from collections import OrderedDict
+from typing import Optional
+
+# Bookkeeping per session on top of the history text and the context array
+SESSION_OVERHEAD_BYTES = 512
+
+class ChatSession:
+    """
+    One server-side conversation: the message history and the context token
+    array Ollama returned for the last turn, so the next turn only sends the
+    new message. Turns of a session run one at a time under its lock. Only
+    the client that created the session can read, continue or end it.
+    """
+
+    def __init__(self, system_prompt: Optional[str] = None, owner: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.system_prompt = system_prompt
+        self.messages = []
+        self.context = array("i")  # 4 bytes per token instead of a list of ints
+        self.lock = asyncio.Lock()
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.turns = 0
+        self.prompt_eval_tokens = 0
+        self.prompt_tokens_saved = 0
+        self.size = self._estimate_size()
+
+    def _estimate_size(self) -> int:
+        text = len(self.system_prompt or "") + sum(len(message["content"]) for message in self.messages)
+        return SESSION_OVERHEAD_BYTES + text + self.context.itemsize * len(self.context)
+
+    def snapshot(self) -> dict:
+        """History and counters, without the context array"""
+        return {
+            "session_id": self.id,
+            "system_prompt": self.system_prompt,
+            "messages": list(self.messages),
+            "turns": self.turns,
+            "context_tokens": len(self.context),
+            "prompt_eval_tokens": self.prompt_eval_tokens,
+            "prompt_tokens_saved": self.prompt_tokens_saved,
+            "created_at": self.created_at,
+            "last_used": self.last_used,
+        }
+
+class ChatSessionStore:
+    """
+    LRU + TTL store for chat sessions, bounded by session count and by the
+    estimated size of histories and context arrays. Sessions live in this
+    worker's memory only, so a follow-up turn routed to another worker would
+    not find its session: the store is only used with a single worker.
+    """
+
+    def __init__(self, max_sessions: int = 1000, max_bytes: int = 64 * 1024 * 1024,
+                 ttl_seconds: float = 1800.0):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._sessions = OrderedDict()  # id -> ChatSession, least recently used first
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.created = 0
+        self.expired = 0
+        self.evictions = 0
+        self.turns = 0
+        self.prompt_eval_tokens = 0
+        self.prompt_tokens_saved = 0
+
+    def create(self, system_prompt: Optional[str] = None, owner: Optional[str] = None) -> ChatSession:
+        """Start a new session owned by the given client"""
+        session = ChatSession(system_prompt, owner)
+        with self._lock:
+            self._purge_expired()
+            self._sessions[session.id] = session
+            self._bytes += session.size
+            self.created += 1
+            self._enforce_limits()
+        return session
+
+    def get(self, session_id: str, owner: Optional[str] = None) -> Optional[ChatSession]:
+        """Return a live session of owner or None, an expired one is dropped"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or session.owner != owner:
+                return None
+            if time.time() - session.last_used > self.ttl_seconds:
+                self._remove(session_id)
+                self.expired += 1
+                return None
+            session.last_used = time.time()
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def delete(self, session_id: str, owner: Optional[str] = None) -> bool:
+        """Remove a session of owner, False when it did not exist"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or session.owner != owner:
+                return False
+            return self._remove(session_id) is not None
+
+    def record_turn(self, session: ChatSession, message: str, response: str, result: dict) -> int:
+        """
+        Append a finished turn and keep the context array Ollama returned.
+        Returns the prompt tokens Ollama did not have to evaluate: the prompt
+        of this turn spans the whole conversation, len(context) - eval_count
+        tokens, of which only prompt_eval_count were evaluated.
+        """
+        context = result.get("context") or []
+        prompt_eval = result.get("prompt_eval_count") or 0
+        saved = 0
+        if context:
+            saved = max(0, len(context) - (result.get("eval_count") or 0) - prompt_eval)
+
+        with self._lock:
+            # Without a context array the next turn falls back to resending the history
+            session.context = array("i", context)
+            session.messages.append({"role": "user", "content": message})
+            session.messages.append({"role": "assistant", "content": response})
+            session.turns += 1
+            session.prompt_eval_tokens += prompt_eval
+            session.prompt_tokens_saved += saved
+            session.last_used = time.time()
+
+            self.turns += 1
+            self.prompt_eval_tokens += prompt_eval
+            self.prompt_tokens_saved += saved
+
+            # A session deleted or evicted during the turn is not brought back
+            if session.id in self._sessions:
+                self._bytes -= session.size
+                session.size = session._estimate_size()
+                self._bytes += session.size
+                self._sessions.move_to_end(session.id)
+                self._enforce_limits()
+            else:
+                session.size = session._estimate_size()
+        return saved
+
+    def _purge_expired(self):
+        cutoff = time.time() - self.ttl_seconds
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if session.last_used > cutoff:
+                break
+            self._remove(session.id)
+            self.expired += 1
+
+    def _enforce_limits(self):
+        # The most recently used session is kept even when it alone exceeds the byte limit
+        while len(self._sessions) > 1 and (len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes):
+            _, evicted = self._sessions.popitem(last=False)
+            self._bytes -= evicted.size
+            self.evictions += 1
+
+    def _remove(self, session_id: str) -> Optional[ChatSession]:
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self._bytes -= session.size
+        return session
+
+    def stats(self) -> dict:
+        """Session counts, size and prompt evaluation savings"""
+        with self._lock:
+            evaluated = self.prompt_eval_tokens + self.prompt_tokens_saved
+            return {
+                "sessions": len(self._sessions),
+                "bytes": self._bytes,
+                "max_sessions": self.max_sessions,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "created": self.created,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "turns": self.turns,
+                "prompt_eval_tokens": self.prompt_eval_tokens,
+                "prompt_tokens_saved": self.prompt_tokens_saved,
+                "saved_ratio": self.prompt_tokens_saved / evaluated if evaluated else 0.0,
+            }
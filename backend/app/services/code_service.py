@@ -1,71 +1,425 @@
+import json
 import logging
 from fastapi import HTTPException, status
 
+from ..core.config import settings
+from ..core.metrics import observe_ollama_generation
+from .chat_sessions import ChatSessionStore
+from .ollama_health import OllamaHealthMonitor
+from .response_cache import ResponseCache
+from .single_flight import SingleFlight
+from .token_quota import ConcurrencyBudget, TokenQuota
+
 logger = logging.getLogger(__name__)
 
+MODEL_NAME = "codellama:7b"
+
+# Ollama's final chunk also carries the prompt context array, which is not useful to clients
+STREAM_DONE_FIELDS = (
+    "total_duration", "load_duration", "prompt_eval_count",
+    "prompt_eval_duration", "eval_count", "eval_duration", "done_reason"
+)
+
+# Added to the final chunk of a chat session turn
+SESSION_TURN_FIELDS = ("turn", "context_tokens", "prompt_tokens_saved")
+
 class CodeService:
     def __init__(self):
         self.ollama_client = None
+        self.health_monitor = OllamaHealthMonitor(
+            interval_seconds=settings.OLLAMA_HEALTH_INTERVAL_SECONDS,
+            timeout_seconds=settings.OLLAMA_HEALTH_TIMEOUT_SECONDS
+        )
+        self.cache = None
+        if settings.LLM_CACHE_ENABLED:
+            self.cache = ResponseCache(
+                max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+                max_bytes=settings.LLM_CACHE_MAX_MB * 1024 * 1024,
+                ttl_seconds=settings.LLM_CACHE_TTL_SECONDS,
+                disk_path=settings.LLM_CACHE_DISK_PATH or None,
+                disk_max_entries=settings.LLM_CACHE_DISK_MAX_ENTRIES
+            )
+        self.coalescer = SingleFlight() if settings.LLM_COALESCE_ENABLED else None
+        self.quota = None
+        if settings.LLM_QUOTA_ENABLED:
+            self.quota = TokenQuota(
+                tokens_per_window=settings.LLM_QUOTA_TOKENS_PER_WINDOW,
+                window_seconds=settings.LLM_QUOTA_WINDOW_SECONDS,
+                max_clients=settings.LLM_QUOTA_MAX_CLIENTS
+            )
+        self.generation_budget = ConcurrencyBudget(
+            max_concurrent=settings.LLM_MAX_CONCURRENT_GENERATIONS,
+            queue_timeout_seconds=settings.LLM_GENERATION_QUEUE_TIMEOUT_SECONDS
+        )
+        self.sessions = None
+        if settings.LLM_CHAT_SESSIONS_ENABLED and settings.WEB_CONCURRENCY > 1:
+            # Sessions are kept in one worker's memory, turns landing on another worker would 404
+            logger.warning(f"Chat sessions disabled, they need a single worker (WEB_CONCURRENCY={settings.WEB_CONCURRENCY})")
+        elif settings.LLM_CHAT_SESSIONS_ENABLED:
+            self.sessions = ChatSessionStore(
+                max_sessions=settings.LLM_CHAT_SESSION_MAX_SESSIONS,
+                max_bytes=settings.LLM_CHAT_SESSION_MAX_MB * 1024 * 1024,
+                ttl_seconds=settings.LLM_CHAT_SESSION_TTL_SECONDS
+            )
         self._initialize_ollama_client()
 
     def _initialize_ollama_client(self):
         """Initialize Ollama client"""
         try:
-            from models.ollama_client import OllamaClient
-            self.ollama_client = OllamaClient()
+            from models.ollama_client import AsyncOllamaClient
+            self.ollama_client = AsyncOllamaClient(
+                max_connections=settings.OLLAMA_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OLLAMA_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.OLLAMA_KEEPALIVE_EXPIRY,
+                connect_timeout=settings.OLLAMA_CONNECT_TIMEOUT,
+                read_timeout=settings.OLLAMA_READ_TIMEOUT,
+                total_timeout=settings.OLLAMA_TOTAL_TIMEOUT,
+                observer=observe_ollama_generation
+            )
         except Exception as e:
             logger.error(f"Failed to initialize Ollama client: {e}")
             self.ollama_client = None
 
+    def start_health_monitor(self):
+        """Start the background Ollama health probe"""
+        if self.ollama_client is not None:
+            self.health_monitor.start(self.ollama_client)
+
+    async def close(self):
+        """Stop the health probe and close the Ollama connection pool"""
+        await self.health_monitor.stop()
+        if self.ollama_client is not None:
+            await self.ollama_client.aclose()
+
     def _check_ollama_server(self):
-        """Check if Ollama server is running"""
+        """Check the cached Ollama server state"""
         if self.ollama_client is None:
             raise HTTPException(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                 detail="Ollama client not initialized"
             )
-        
-        if not self.ollama_client.check_server():
+
+        if not self.health_monitor.is_available():
             raise HTTPException(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                 detail="Ollama server is not running"
             )
 
-    def generate_code(self, prompt: str, language: str = "python", max_tokens: int = 512, temperature: float = 0.3):
+    def _record_result(self, result: dict):
         """
-        Generate code using Ollama CodeLlama model
+        Update the health state from a generation result. HTTP errors mean the
+        server is up, connection errors mark it down. A timeout says neither,
+        a slow generation is left to the health probe.
         """
+        if result.get("timeout"):
+            return
+        if "error" in result and "status_code" not in result:
+            self.health_monitor.mark_failure(result["error"])
+        else:
+            self.health_monitor.mark_success()
+
+    @staticmethod
+    def _validate_prompt(prompt: str):
+        """Reject empty prompts"""
+        if not prompt.strip():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Prompt is required"
+            )
+
+    @staticmethod
+    def _validate_messages(messages: list):
+        """Reject empty message lists"""
+        if not messages:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Messages are required"
+            )
+
+    @staticmethod
+    def _translation_prompt(source_code: str, source_language: str, target_language: str) -> str:
+        """Validate a translation request and build its prompt"""
+        if not source_code.strip():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Source code is required"
+            )
+
+        if not source_language or not target_language:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Source and target languages are required"
+            )
+
+        return f"""Translate the following {source_language} code to {target_language}:
+
+{source_code}
+
+Please provide only the translated code without any explanations or comments."""
+
+    def _cache_key(self, prompt: str, language: str, max_tokens: int, temperature: float):
+        """
+        Cache key for a code completion, None when caching does not apply.
+        Only low temperature generations are deterministic enough to reuse.
+        """
+        if self.cache is None or self.ollama_client is None:
+            return None
+        if temperature > settings.LLM_CACHE_MAX_TEMPERATURE:
+            return None
+
+        from models.ollama_client import _code_system_prompt
+        return self.cache.make_key(
+            model=self.ollama_client.model_name,
+            system_prompt=_code_system_prompt(language),
+            prompt=prompt,
+            language=language,
+            max_tokens=max_tokens,
+            temperature=temperature
+        )
+
+    @staticmethod
+    def _cache_value(result: dict) -> dict:
+        """Keep the generated text and eval metadata of a result"""
+        value = {"response": result.get("response", "")}
+        for field in STREAM_DONE_FIELDS:
+            if field in result:
+                value[field] = result[field]
+        return value
+
+    @staticmethod
+    def _coalesce_key(kind: str, prompt: str, **fields) -> str:
+        """
+        Key deciding which concurrent requests share one generation. Whitespace,
+        case and sampling options are folded in according to the settings.
+        """
+        if settings.LLM_COALESCE_NORMALIZE_WHITESPACE:
+            prompt = " ".join(prompt.split())
+        if settings.LLM_COALESCE_CASE_INSENSITIVE:
+            prompt = prompt.lower()
+        if settings.LLM_COALESCE_IGNORE_SAMPLING:
+            fields.pop("max_tokens", None)
+            fields.pop("temperature", None)
+        return ResponseCache.make_key(kind=kind, prompt=prompt, **fields)
+
+    @staticmethod
+    def _chat_prompt(messages: list) -> str:
+        """Flatten chat messages for the coalescing key"""
+        return "\n".join(f"{message.get('role', 'user')}: {message.get('content', '')}" for message in messages)
+
+    async def _coalesce(self, key: str, factory):
+        """Run factory() or attach to an identical in-flight generation"""
+        if self.coalescer is None:
+            return await factory()
+        return await self.coalescer.do(key, factory)
+
+    def _coalesce_stream(self, key: str, factory):
+        """Stream factory() or attach to an identical in-flight stream"""
+        if self.coalescer is None:
+            return factory()
+        return self.coalescer.stream(key, factory)
+
+    def coalescing_stats(self) -> dict:
+        """Request coalescing counters"""
+        if self.coalescer is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.coalescer.stats()}
+
+    def _reserve(self, client: str, max_tokens: int):
+        """Reserve max_tokens from the client's budget, None when quotas do not apply"""
+        if self.quota is None or client is None:
+            return None
+        return self.quota.reserve(client, max_tokens)
+
+    @staticmethod
+    def _reserved_tokens(reservation, max_tokens: int) -> int:
+        """Tokens Ollama may generate, a reservation capped to the budget caps the request too"""
+        if reservation is None:
+            return max_tokens
+        return min(max_tokens, reservation.tokens)
+
+    def _settle(self, reservation, used_tokens: int):
+        """Reconcile a reservation with the tokens actually generated"""
+        if reservation is not None:
+            self.quota.settle(reservation, used_tokens)
+
+    async def _generate(self, factory):
+        """Run one generation on the model server inside the concurrency budget"""
+        async with self.generation_budget.slot():
+            return await factory()
+
+    async def _generate_stream(self, factory):
+        """Stream one generation, holding a concurrency slot until the stream ends"""
+        async with self.generation_budget.slot():
+            source = factory()
+            try:
+                async for chunk in source:
+                    yield chunk
+            finally:
+                await source.aclose()
+
+    def quota_stats(self) -> dict:
+        """Token budget and concurrency counters"""
+        return {
+            "quota": {"enabled": False} if self.quota is None else {"enabled": True, **self.quota.stats()},
+            "concurrency": self.generation_budget.stats(),
+        }
+
+    async def _run_code_completion(self, prompt: str, language: str, max_tokens: int,
+                                   temperature: float, use_cache: bool, error_label: str,
+                                   client: str = None):
+        """
+        Run a code completion through the response cache, returns (result, cached).
+        With use_cache=False the cache is not read but the fresh result is stored.
+        """
+        key = self._cache_key(prompt, language, max_tokens, temperature)
+        if key is not None and use_cache:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                return cached, True
+
+        self._check_ollama_server()
+        reservation = self._reserve(client, max_tokens)
+        max_tokens = self._reserved_tokens(reservation, max_tokens)
+        used_tokens = 0
         try:
-            self._check_ollama_server()
-            
-            if not prompt.strip():
+            result = await self._coalesce(
+                self._coalesce_key("code", prompt, language=language, max_tokens=max_tokens, temperature=temperature),
+                lambda: self._generate(lambda: self.ollama_client.code_completion(
+                    code_prompt=prompt,
+                    language=language,
+                    max_tokens=max_tokens,
+                    temperature=temperature
+                ))
+            )
+            self._record_result(result)
+
+            if "error" in result:
                 raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Prompt is required"
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail=f"{error_label} failed: {result['error']}"
                 )
-            
-            # Generate code completion
-            result = self.ollama_client.code_completion(
+            used_tokens = result.get("eval_count", max_tokens)
+        finally:
+            self._settle(reservation, used_tokens)
+
+        if key is not None:
+            await self.cache.set(key, self._cache_value(result))
+        return result, False
+
+    async def _stream_code_completion(self, prompt: str, language: str, max_tokens: int,
+                                      temperature: float, use_cache: bool, error_label: str,
+                                      extra: dict, client: str = None):
+        """Streaming counterpart of _run_code_completion, a cache hit is sent as one final chunk"""
+        key = self._cache_key(prompt, language, max_tokens, temperature)
+        if key is not None and use_cache:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                async def replay():
+                    yield self._format_chunk({**cached, "done": True}, {**extra, "cached": True})
+                return replay()
+
+        self._check_ollama_server()
+        reservation = self._reserve(client, max_tokens)
+        max_tokens = self._reserved_tokens(reservation, max_tokens)
+        chunks = self._coalesce_stream(
+            self._coalesce_key("code-stream", prompt, language=language, max_tokens=max_tokens, temperature=temperature),
+            lambda: self._generate_stream(lambda: self.ollama_client.code_completion_stream(
                 code_prompt=prompt,
                 language=language,
                 max_tokens=max_tokens,
                 temperature=temperature
+            ))
+        )
+        return await self._open_stream(chunks, error_label, {**extra, "cached": False}, cache_key=key,
+                                       reservation=reservation)
+
+    async def _open_stream(self, chunks, error_label: str, extra: dict, cache_key: str = None,
+                           reservation=None):
+        """
+        Wait for the first chunk so connection and HTTP errors still surface
+        as a regular error response, then return an NDJSON byte stream.
+        With a cache_key the assembled response is cached once the stream completes,
+        a token reservation is settled against the final eval_count.
+        """
+        try:
+            first = await chunks.__anext__()
+        except StopAsyncIteration:
+            first = {"error": "Empty response from Ollama", "done": True}
+        except BaseException:
+            self._settle(reservation, 0)
+            raise
+        self._record_result(first)
+
+        if "error" in first:
+            self._settle(reservation, 0)
+            await chunks.aclose()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"{error_label} failed: {first['error']}"
             )
-            
-            if "error" in result:
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail=f"Code generation failed: {result['error']}"
-                )
-            
-            logger.info(f"Code generated successfully for language: {language}")
+
+        async def ndjson():
+            pieces = []
+            used_tokens = None
+            try:
+                chunk = first
+                while True:
+                    yield self._format_chunk(chunk, extra)
+                    if "error" in chunk:
+                        break
+                    pieces.append(chunk.get("response", ""))
+                    if chunk.get("done"):
+                        used_tokens = chunk.get("eval_count")
+                        if cache_key is not None:
+                            await self.cache.set(cache_key, self._cache_value({**chunk, "response": "".join(pieces)}))
+                        break
+                    try:
+                        chunk = await chunks.__anext__()
+                    except StopAsyncIteration:
+                        break
+            finally:
+                # Without a final eval_count each streamed chunk counts as one token
+                self._settle(reservation, used_tokens if used_tokens is not None else len(pieces))
+                await chunks.aclose()
+
+        return ndjson()
+
+    @staticmethod
+    def _format_chunk(chunk: dict, extra: dict) -> bytes:
+        """Encode one Ollama chunk as an NDJSON line"""
+        if "error" in chunk:
+            event = {"error": chunk["error"], "done": True}
+        elif chunk.get("done"):
+            event = {"response": chunk.get("response", ""), "done": True, "model": MODEL_NAME, **extra}
+            for field in STREAM_DONE_FIELDS + SESSION_TURN_FIELDS:
+                if field in chunk:
+                    event[field] = chunk[field]
+        else:
+            event = {"response": chunk.get("response", ""), "done": False}
+        return (json.dumps(event) + "\n").encode("utf-8")
+
+    async def generate_code(self, prompt: str, language: str = "python", max_tokens: int = 512,
+                            temperature: float = 0.3, use_cache: bool = True, client: str = None):
+        """
+        Generate code using Ollama CodeLlama model
+        """
+        try:
+            self._validate_prompt(prompt)
+
+            # Generate code completion
+            result, cached = await self._run_code_completion(
+                prompt, language, max_tokens, temperature, use_cache, "Code generation", client=client
+            )
+
+            logger.info(f"Code generated successfully for language: {language} (cached: {cached})")
             return {
                 "response": result.get("response", ""),
                 "language": language,
                 "tokens_generated": len(result.get("response", "").split()),
-                "model": "codellama:7b"
+                "model": MODEL_NAME,
+                "cached": cached
             }
-            
+
         except HTTPException:
             raise
         except Exception as e:
@@ -75,39 +429,57 @@ class CodeService:
                 detail=f"An error occurred during code generation: {str(e)}"
             )
 
-    def generate_chat(self, messages: list, max_tokens: int = 500, temperature: float = 0.7):
+    async def stream_code(self, prompt: str, language: str = "python", max_tokens: int = 512,
+                          temperature: float = 0.3, use_cache: bool = True, client: str = None):
+        """
+        Stream generated code as NDJSON chunks
+        """
+        self._validate_prompt(prompt)
+        return await self._stream_code_completion(
+            prompt, language, max_tokens, temperature, use_cache, "Code generation", {"language": language},
+            client=client
+        )
+
+    async def generate_chat(self, messages: list, max_tokens: int = 500, temperature: float = 0.7,
+                            client: str = None):
         """
         Generate chat response using Ollama CodeLlama model
         """
         try:
             self._check_ollama_server()
-            
-            if not messages:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Messages are required"
-                )
-            
+            self._validate_messages(messages)
+
             # Generate chat response
-            result = self.ollama_client.chat_completion(
-                messages=messages,
-                max_tokens=max_tokens,
-                temperature=temperature
-            )
-            
-            if "error" in result:
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail=f"Chat generation failed: {result['error']}"
+            reservation = self._reserve(client, max_tokens)
+            max_tokens = self._reserved_tokens(reservation, max_tokens)
+            used_tokens = 0
+            try:
+                result = await self._coalesce(
+                    self._coalesce_key("chat", self._chat_prompt(messages), max_tokens=max_tokens, temperature=temperature),
+                    lambda: self._generate(lambda: self.ollama_client.chat_completion(
+                        messages=messages,
+                        max_tokens=max_tokens,
+                        temperature=temperature
+                    ))
                 )
-            
+                self._record_result(result)
+
+                if "error" in result:
+                    raise HTTPException(
+                        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                        detail=f"Chat generation failed: {result['error']}"
+                    )
+                used_tokens = result.get("eval_count", max_tokens)
+            finally:
+                self._settle(reservation, used_tokens)
+
             logger.info("Chat response generated successfully")
             return {
                 "response": result.get("response", ""),
                 "tokens_generated": len(result.get("response", "").split()),
-                "model": "codellama:7b"
+                "model": MODEL_NAME
             }
-            
+
         except HTTPException:
             raise
         except Exception as e:
@@ -117,54 +489,49 @@ class CodeService:
                 detail=f"An error occurred during chat generation: {str(e)}"
             )
 
-    def translate_code(self, source_code: str, source_language: str, target_language: str):
+    async def stream_chat(self, messages: list, max_tokens: int = 500, temperature: float = 0.7,
+                          client: str = None):
         """
-        Translate code from one programming language to another using Ollama
+        Stream a chat response as NDJSON chunks
         """
-        try:
-            self._check_ollama_server()
-            
-            if not source_code.strip():
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Source code is required"
-                )
-            
-            if not source_language or not target_language:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Source and target languages are required"
-                )
-            
-            # Create translation prompt
-            prompt = f"""Translate the following {source_language} code to {target_language}:
+        self._check_ollama_server()
+        self._validate_messages(messages)
 
-{source_code}
+        reservation = self._reserve(client, max_tokens)
+        max_tokens = self._reserved_tokens(reservation, max_tokens)
 
-Please provide only the translated code without any explanations or comments."""
+        chunks = self._coalesce_stream(
+            self._coalesce_key("chat-stream", self._chat_prompt(messages), max_tokens=max_tokens, temperature=temperature),
+            lambda: self._generate_stream(lambda: self.ollama_client.chat_completion_stream(
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature
+            ))
+        )
+        return await self._open_stream(chunks, "Chat generation", {}, reservation=reservation)
+
+    async def translate_code(self, source_code: str, source_language: str, target_language: str,
+                             use_cache: bool = True, client: str = None):
+        """
+        Translate code from one programming language to another using Ollama
+        """
+        try:
+            prompt = self._translation_prompt(source_code, source_language, target_language)
 
             # Generate translated code
-            result = self.ollama_client.code_completion(
-                code_prompt=prompt,
-                language=target_language,
-                max_tokens=1024,
-                temperature=0.2
+            result, cached = await self._run_code_completion(
+                prompt, target_language, 1024, 0.2, use_cache, "Code translation", client=client
             )
-            
-            if "error" in result:
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail=f"Code translation failed: {result['error']}"
-                )
-            
-            logger.info(f"Code translated from {source_language} to {target_language}")
+
+            logger.info(f"Code translated from {source_language} to {target_language} (cached: {cached})")
             return {
                 "translated_code": result.get("response", ""),
                 "source_language": source_language,
                 "target_language": target_language,
-                "model": "codellama:7b"
+                "model": MODEL_NAME,
+                "cached": cached
             }
-            
+
         except HTTPException:
             raise
         except Exception as e:
@@ -174,5 +541,183 @@ Please provide only the translated code without any explanations or comments."""
                 detail=f"An error occurred during code translation: {str(e)}"
             )
 
+    async def stream_translation(self, source_code: str, source_language: str, target_language: str,
+                                 use_cache: bool = True, client: str = None):
+        """
+        Stream translated code as NDJSON chunks
+        """
+        prompt = self._translation_prompt(source_code, source_language, target_language)
+        return await self._stream_code_completion(
+            prompt, target_language, 1024, 0.2, use_cache, "Code translation",
+            {"source_language": source_language, "target_language": target_language},
+            client=client
+        )
+
+    def _get_session(self, session_id: str, client: str = None):
+        """Return a live chat session of client, 404 when disabled, expired or owned by another client"""
+        session = self.sessions.get(session_id, client) if self.sessions is not None else None
+        if session is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Chat session not found or expired" if self.sessions is not None else "Chat sessions are disabled"
+            )
+        return session
+
+    @staticmethod
+    def _session_request(session, message: str):
+        """
+        Prompt, system prompt and context for the next turn. With the context
+        array of the previous turn only the new message is sent, otherwise the
+        history is flattened into the prompt as for stateless chat.
+        """
+        from models.ollama_client import _messages_to_prompt
+        turn = {"role": "user", "content": message}
+        if len(session.context):
+            prompt, _ = _messages_to_prompt([turn])
+            return prompt, None, session.context.tolist()
+        prompt, _ = _messages_to_prompt(session.messages + [turn])
+        return prompt, session.system_prompt, None
+
+    def _session_generation(self, session, message: str, max_tokens: int, temperature: float, stream: bool):
+        prompt, system_prompt, context = self._session_request(session, message)
+        generate = self.ollama_client.generate_text_stream if stream else self.ollama_client.generate_text
+        return generate(
+            prompt=prompt,
+            system_prompt=system_prompt,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            context=context,
+            keep_alive=settings.LLM_CHAT_SESSION_KEEP_ALIVE
+        )
+
+    def create_chat_session(self, system_prompt: str = None, client: str = None) -> dict:
+        """
+        Start a server-side chat session
+        """
+        if self.sessions is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Chat sessions are disabled"
+            )
+        session = self.sessions.create(system_prompt or None, owner=client)
+        return {"session_id": session.id, "expires_in": settings.LLM_CHAT_SESSION_TTL_SECONDS}
+
+    def get_chat_session(self, session_id: str, client: str = None) -> dict:
+        """
+        Return the history and prompt evaluation counters of a chat session
+        """
+        return self._get_session(session_id, client).snapshot()
+
+    def delete_chat_session(self, session_id: str, client: str = None):
+        """
+        End a chat session
+        """
+        if self.sessions is None or not self.sessions.delete(session_id, client):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Chat session not found or expired"
+            )
+
+    async def session_message(self, session_id: str, message: str, max_tokens: int = 500,
+                              temperature: float = 0.7, client: str = None):
+        """
+        Send one message in a chat session, only the new message is evaluated
+        when Ollama's context from the previous turn is available
+        """
+        try:
+            session = self._get_session(session_id, client)
+            self._check_ollama_server()
+            self._validate_prompt(message)
+
+            # Turns of one session are sequential, each continues the previous context
+            async with session.lock:
+                reservation = self._reserve(client, max_tokens)
+                max_tokens = self._reserved_tokens(reservation, max_tokens)
+                used_tokens = 0
+                try:
+                    result = await self._generate(
+                        lambda: self._session_generation(session, message, max_tokens, temperature, stream=False)
+                    )
+                    self._record_result(result)
+
+                    if "error" in result:
+                        raise HTTPException(
+                            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            detail=f"Chat generation failed: {result['error']}"
+                        )
+                    used_tokens = result.get("eval_count", max_tokens)
+                finally:
+                    self._settle(reservation, used_tokens)
+
+                saved = self.sessions.record_turn(session, message, result.get("response", ""), result)
+
+            logger.info(f"Chat session {session.id} turn {session.turns}, {saved} prompt tokens not re-evaluated")
+            return {
+                "response": result.get("response", ""),
+                "session_id": session.id,
+                "turn": session.turns,
+                "tokens_generated": len(result.get("response", "").split()),
+                "prompt_eval_count": result.get("prompt_eval_count"),
+                "context_tokens": len(session.context),
+                "prompt_tokens_saved": saved,
+                "model": MODEL_NAME
+            }
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Error in chat session: {e}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"An error occurred during chat generation: {str(e)}"
+            )
+
+    async def stream_session_message(self, session_id: str, message: str, max_tokens: int = 500,
+                                     temperature: float = 0.7, client: str = None):
+        """
+        Send one message in a chat session and stream the response as NDJSON chunks
+        """
+        session = self._get_session(session_id, client)
+        self._check_ollama_server()
+        self._validate_prompt(message)
+
+        reservation = self._reserve(client, max_tokens)
+        max_tokens = self._reserved_tokens(reservation, max_tokens)
+
+        chunks = self._session_stream(session, message, max_tokens, temperature)
+        return await self._open_stream(chunks, "Chat generation", {"session_id": session.id},
+                                       reservation=reservation)
+
+    async def _session_stream(self, session, message: str, max_tokens: int, temperature: float):
+        """Stream one session turn under the session lock, the turn is recorded when the stream completes"""
+        async with session.lock:
+            source = self._generate_stream(
+                lambda: self._session_generation(session, message, max_tokens, temperature, stream=True)
+            )
+            pieces = []
+            try:
+                async for chunk in source:
+                    if "error" not in chunk:
+                        pieces.append(chunk.get("response", ""))
+                        if chunk.get("done"):
+                            saved = self.sessions.record_turn(session, message, "".join(pieces), chunk)
+                            chunk = {**chunk, "turn": session.turns, "context_tokens": len(session.context),
+                                     "prompt_tokens_saved": saved}
+                    yield chunk
+            finally:
+                await source.aclose()
+
+    def session_stats(self) -> dict:
+        """Chat session counters and prompt evaluation savings"""
+        if self.sessions is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.sessions.stats()}
+
+    def cache_stats(self) -> dict:
+        """Response cache counters"""
+        if self.cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.cache.stats()}
+
 # Global instance
-code_service = CodeService() 
\ No newline at end of file
+code_service = CodeService()
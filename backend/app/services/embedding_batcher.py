@@ -0,0 +1,96 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from ..core.metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+class EmbeddingBatcher:
+    """
+    Dynamic micro-batching in front of the FaceNet model.
+
+    Callers submit one preprocessed face tensor and block until its embedding
+    is ready. A worker thread collects concurrent submissions for up to
+    window_ms or max_batch_size, runs one batched forward pass and hands each
+    caller its own row. A batch fills only if max_batch_size callers can
+    block at once, so it should not exceed the number of submitting threads.
+    """
+
+    def __init__(self, embed_fn, max_batch_size: int = 16, window_ms: float = 10.0):
+        self.embed_fn = embed_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.window_seconds = max(0.0, window_ms) / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait_ms = Histogram()
+        self.forward_ms = Histogram()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="facenet-batcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, face_tensor):
+        """Embed one (3, 160, 160) face tensor, blocks until its batch has run"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((face_tensor, future, time.perf_counter()))
+        return future.result()
+
+    def _collect(self):
+        """Block for the first item, then gather more until the window closes or the batch is full"""
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.window_seconds
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        import torch
+
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            for _, _, enqueued_at in batch:
+                self.queue_wait_ms.observe((started - enqueued_at) * 1000)
+            self.batch_sizes.observe(len(batch))
+
+            try:
+                embeddings = self.embed_fn(torch.stack([item[0] for item in batch]))
+            except Exception as e:
+                logger.error(f"Batched FaceNet forward pass failed: {e}")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            self.forward_ms.observe((time.perf_counter() - started) * 1000)
+            for row, (_, future, _) in enumerate(batch):
+                future.set_result(embeddings[row])
+
+    def stats(self) -> dict:
+        """Batch size, queue wait and forward pass histograms"""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "window_ms": self.window_seconds * 1000,
+            "queue_depth": self._queue.qsize(),
+            "batch_size": self.batch_sizes.snapshot(),
+            "queue_wait_ms": self.queue_wait_ms.snapshot(),
+            "forward_ms": self.forward_ms.snapshot(),
+        }
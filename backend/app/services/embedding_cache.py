@@ -0,0 +1,104 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+# Stored for uploads where no face was detected
+NO_FACE = object()
+
+
+class EmbeddingCache:
+    """
+    LRU + TTL cache of face embeddings keyed by a hash of the uploaded bytes.
+
+    Retried signups and logins with byte-identical images skip decoding,
+    detection and inference. "No face detected" outcomes are cached too, so
+    the same unusable upload is not reprocessed. The model version is part
+    of the key, so switching backend or preprocessing never serves stale
+    embeddings.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 300.0, model_version: str = ""):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.model_version = model_version.encode("utf-8")
+        self._entries = OrderedDict()  # key -> (expires_at, embedding or NO_FACE)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.no_face_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def key_for(self, image_bytes: bytes) -> bytes:
+        """BLAKE2b digest of the upload, keyed with the model version"""
+        digest = hashlib.blake2b(image_bytes, digest_size=16, key=self.model_version[:64])
+        return digest.digest()
+
+    def get(self, key: bytes) -> Tuple[bool, Optional[object]]:
+        """Return (found, embedding), embedding is None for a cached "no face" result"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    if value is NO_FACE:
+                        self.no_face_hits += 1
+                        return True, None
+                    self.hits += 1
+                    return True, value
+                del self._entries[key]
+                self.expirations += 1
+
+            self.misses += 1
+            return False, None
+
+    def set(self, key: bytes, embedding):
+        """Store an embedding, or None to remember that no face was found"""
+        if embedding is None:
+            value = NO_FACE
+        else:
+            # Own copy (batched rows are views of the whole batch), read-only since it is shared
+            value = embedding.copy()
+            value.setflags(write=False)
+
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def evict(self, key: bytes):
+        """Remove one entry"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def evict_image(self, image_bytes: bytes):
+        """Remove the entry for an upload"""
+        self.evict(self.key_for(image_bytes))
+
+    def clear(self):
+        """Remove all entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.no_face_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "no_face_hits": self.no_face_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.no_face_hits) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
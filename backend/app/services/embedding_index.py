@@ -0,0 +1,157 @@
+import logging
+import threading
+import time
+import numpy as np
+from sqlalchemy.orm import Session
+
+from ..models.user import User
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_DIM = 512
+
+class EmbeddingIndex:
+    """
+    In-process 1:N face matching index.
+
+    Keeps every user's face embedding L2-normalized in one contiguous float32
+    matrix with parallel id and threshold arrays, so a lookup is a single
+    matrix-vector product followed by a top-k selection.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM, initial_capacity: int = 1024):
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._matrix = np.zeros((initial_capacity, dim), dtype=np.float32)
+        self._ids = np.empty(initial_capacity, dtype=object)
+        self._thresholds = np.zeros(initial_capacity, dtype=np.float32)
+        self._size = 0
+        self._syncing = False
+        self._added_during_sync = []
+        self.loaded = False
+        self.last_sync = None
+
+    def __len__(self):
+        return self._size
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        """Return a float32 unit vector, zero vectors stay zero"""
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return vector
+        return vector / norm
+
+    def _grow(self, required: int):
+        """Double capacity until required rows fit, existing snapshots stay valid"""
+        capacity = self._matrix.shape[0]
+        if required <= capacity:
+            return
+        while capacity < required:
+            capacity *= 2
+
+        matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        ids = np.empty(capacity, dtype=object)
+        thresholds = np.zeros(capacity, dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        ids[:self._size] = self._ids[:self._size]
+        thresholds[:self._size] = self._thresholds[:self._size]
+        self._matrix, self._ids, self._thresholds = matrix, ids, thresholds
+
+    def add(self, user_id, embedding, threshold: float):
+        """Append one user to the index without rebuilding it"""
+        vector = self._normalize(embedding)
+        with self._lock:
+            self._grow(self._size + 1)
+            self._matrix[self._size] = vector
+            self._ids[self._size] = user_id
+            self._thresholds[self._size] = threshold
+            self._size += 1
+            if self._syncing:
+                self._added_during_sync.append((user_id, vector, threshold))
+
+    def load(self, rows):
+        """
+        Replace the index contents with (id, embedding, threshold) rows.
+        Users added while the rows were being read are carried over.
+        """
+        rows = list(rows)
+        capacity = max(1024, len(rows))
+        matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        ids = np.empty(capacity, dtype=object)
+        thresholds = np.zeros(capacity, dtype=np.float32)
+
+        for position, (user_id, embedding, threshold) in enumerate(rows):
+            matrix[position] = np.asarray(embedding, dtype=np.float32)
+            ids[position] = user_id
+            thresholds[position] = threshold
+
+        # Normalize all rows in one pass
+        size = len(rows)
+        norms = np.linalg.norm(matrix[:size], axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix[:size] /= norms
+
+        with self._lock:
+            self._matrix, self._ids, self._thresholds = matrix, ids, thresholds
+            self._size = size
+
+            known_ids = set(ids[:size])
+            for user_id, vector, threshold in self._added_during_sync:
+                if user_id not in known_ids:
+                    self._grow(self._size + 1)
+                    self._matrix[self._size] = vector
+                    self._ids[self._size] = user_id
+                    self._thresholds[self._size] = threshold
+                    self._size += 1
+            self._added_during_sync = []
+            self._syncing = False
+            self.loaded = True
+            self.last_sync = time.time()
+
+    def sync_from_db(self, db: Session):
+        """Reload the index from the users table"""
+        with self._lock:
+            self._syncing = True
+            self._added_during_sync = []
+
+        try:
+            started = time.perf_counter()
+            rows = db.query(User.id, User.face_embedding, User.recognition_threshold).yield_per(1000)
+            self.load(rows)
+            logger.info(f"Embedding index synced with {self._size} users in {(time.perf_counter() - started) * 1000:.1f} ms")
+        except Exception:
+            with self._lock:
+                self._syncing = False
+                self._added_during_sync = []
+            raise
+
+    def search(self, query_embedding, k: int = 1):
+        """
+        Return up to k (user_id, similarity, threshold) tuples ordered by
+        cosine similarity, highest first
+        """
+        with self._lock:
+            size = self._size
+            matrix = self._matrix
+            ids = self._ids
+            thresholds = self._thresholds
+
+        if size == 0:
+            return []
+
+        query = self._normalize(query_embedding)
+        scores = matrix[:size] @ query
+
+        k = min(max(1, k), size)
+        if k == 1:
+            top = np.array([int(np.argmax(scores))])
+        else:
+            top = np.argpartition(scores, -k)[-k:]
+            top = top[np.argsort(scores[top])[::-1]]
+
+        return [(ids[i], float(scores[i]), float(thresholds[i])) for i in top]
+
+# Global instance
+embedding_index = EmbeddingIndex()
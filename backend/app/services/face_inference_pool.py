@@ -0,0 +1,195 @@
+"""
+Face Inference Worker Pool
+
+Runs MTCNN + FaceNet in a dedicated pool of processes shared by all API
+workers on the host, so model memory is paid once per inference process
+rather than once per uvicorn worker, and inference does not compete with
+request handling for the GIL.
+
+Start the pool next to the API:
+
+    python -m app.services.face_inference_pool
+
+and set FACE_INFERENCE_MODE=remote for the API workers. The parent binds a
+Unix socket and forks FACE_INFERENCE_PROCESSES children that accept
+connections on it. A request carries only the name and shape of a shared
+memory block holding the decoded RGB image, the reply is the embedding.
+
+Connections are authenticated with FACE_INFERENCE_AUTHKEY, which must be
+set to the same secret for the pool and the API workers. Messages are
+pickled, so the pool refuses to start without a key.
+"""
+
+import logging
+import multiprocessing
+import os
+import signal
+from multiprocessing import resource_tracker
+from multiprocessing.connection import Client, Listener, wait
+from multiprocessing.shared_memory import SharedMemory
+from typing import Optional
+import numpy as np
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+MIN_AUTHKEY_LENGTH = 16
+
+
+def inference_authkey() -> bytes:
+    """
+    The shared connection secret, raises when it is unset or short, since
+    anyone who can connect with a known key can run code in the pool
+    """
+    key = settings.FACE_INFERENCE_AUTHKEY
+    if len(key) < MIN_AUTHKEY_LENGTH:
+        raise ValueError(
+            f"FACE_INFERENCE_AUTHKEY must be set to a secret of at least {MIN_AUTHKEY_LENGTH} characters "
+            "for the face inference pool"
+        )
+    return key.encode()
+
+
+class RemoteFaceInference:
+    """Client used by API workers to send decoded images to the inference pool"""
+
+    def __init__(self, address: str, authkey: bytes, timeout_seconds: float = 30.0):
+        self.address = address
+        self.authkey = authkey
+        self.timeout_seconds = timeout_seconds
+
+    def embed(self, image_array: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Embed an (H, W, 3) uint8 image, None when no face is found
+        """
+        image_array = np.ascontiguousarray(image_array, dtype=np.uint8)
+        shm = SharedMemory(create=True, size=max(1, image_array.nbytes))
+        try:
+            view = np.ndarray(image_array.shape, dtype=np.uint8, buffer=shm.buf)
+            view[:] = image_array
+            del view
+
+            # One short-lived connection per request, so no API worker pins an inference process
+            with Client(self.address, authkey=self.authkey) as conn:
+                conn.send(("embed", shm.name, image_array.shape))
+                if not conn.poll(self.timeout_seconds):
+                    raise TimeoutError(f"Face inference timed out after {self.timeout_seconds}s")
+                status, payload = conn.recv()
+        finally:
+            shm.close()
+            shm.unlink()
+
+        if status == "error":
+            raise RuntimeError(f"Face inference worker failed: {payload}")
+        return payload
+
+
+def _handle(service, conn):
+    """Serve one request on an accepted connection"""
+    try:
+        command, shm_name, shape = conn.recv()
+    except EOFError:
+        return
+    if command != "embed":
+        conn.send(("error", f"Unknown command: {command}"))
+        return
+
+    if not service.ensure_loaded():
+        # Retried with backoff by ensure_loaded, until then the API worker answers 503
+        conn.send(("error", "Face models failed to load in the inference worker"))
+        return
+
+    shm = SharedMemory(name=shm_name)
+    # The API worker owns and unlinks the block, keep this process's tracker out of it
+    resource_tracker.unregister(shm._name, "shared_memory")
+    try:
+        image_array = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        embedding = service.embed_image_array(image_array)
+        del image_array
+        conn.send(("ok", embedding))
+    except Exception as e:
+        logger.error(f"Face inference request failed: {e}")
+        conn.send(("error", str(e)))
+    finally:
+        shm.close()
+
+
+def _worker_loop(listener: Listener, torch_threads: int):
+    """Load the models once, then accept and serve requests until terminated"""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    import torch
+    from .face_recognition_service import FaceRecognitionService, face_recognition_service
+
+    service = face_recognition_service
+    if service.remote is not None:
+        service = FaceRecognitionService(mode="local")
+    torch.set_num_threads(max(1, torch_threads))
+    if service.ensure_loaded():
+        logger.info(f"Face inference worker {os.getpid()} ready with {torch_threads} torch threads")
+    else:
+        logger.error(f"Face inference worker {os.getpid()} could not load the face models, answering with errors")
+
+    while True:
+        try:
+            conn = listener.accept()
+        except Exception as e:
+            logger.error(f"Face inference accept failed: {e}")
+            continue
+        with conn:
+            _handle(service, conn)
+
+
+def serve(address: str = None, processes: int = None, torch_threads: int = None):
+    """Bind the socket, fork the inference processes and restart any that exit"""
+    address = address or settings.FACE_INFERENCE_ADDRESS
+    processes = processes or settings.FACE_INFERENCE_PROCESSES
+    torch_threads = torch_threads or settings.FACE_INFERENCE_TORCH_THREADS
+
+    authkey = inference_authkey()
+
+    if os.path.exists(address):
+        os.unlink(address)
+    listener = Listener(address, family="AF_UNIX", backlog=128, authkey=authkey)
+    context = multiprocessing.get_context("fork")
+
+    def spawn():
+        process = context.Process(target=_worker_loop, args=(listener, torch_threads), daemon=True)
+        process.start()
+        return process
+
+    workers = [spawn() for _ in range(processes)]
+    logger.info(f"Face inference pool listening on {address} with {processes} processes")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    try:
+        while not stopping:
+            wait([worker.sentinel for worker in workers], timeout=1.0)
+            for index, worker in enumerate(workers):
+                if not worker.is_alive() and not stopping:
+                    logger.warning(f"Face inference worker {worker.pid} exited with {worker.exitcode}, restarting")
+                    workers[index] = spawn()
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.join(timeout=5)
+        listener.close()
+        logger.info("Face inference pool stopped")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    serve()
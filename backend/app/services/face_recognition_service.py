@@ -1,23 +1,128 @@
 import logging
+import os
+import threading
+import time
 import numpy as np
 from PIL import Image
 import io
-import torch
-from facenet_pytorch import InceptionResnetV1, MTCNN
 from fastapi import HTTPException, status
 
 from ..core.config import settings
+from ..core.metrics import record_auth_stage
+from .embedding_batcher import EmbeddingBatcher
+from .embedding_cache import EmbeddingCache
+from .face_inference_pool import RemoteFaceInference, inference_authkey
 
 logger = logging.getLogger(__name__)
 
+FACE_SIZE = 160
+
+
 class FaceRecognitionService:
-    def __init__(self):
+    def __init__(self, mode: str = None):
         self.mtcnn = None
         self.facenet_model = None
-        self._load_models()
+        self.facenet_forward = None
+        self.backend = None
+        self.batcher = None
+        self.remote = None
+        self.cache = None
+        self.status = "not_loaded"  # not_loaded, loading, ready or failed
+        self._load_lock = threading.Lock()
+        self._load_failures = 0
+        self._retry_at = 0.0  # monotonic time before which a failed load is not retried
+
+        # Remote mode hands decoded images to the shared inference pool and loads no models
+        if (mode or settings.FACE_INFERENCE_MODE) == "remote":
+            self.remote = RemoteFaceInference(
+                settings.FACE_INFERENCE_ADDRESS,
+                inference_authkey(),
+                timeout_seconds=settings.FACE_INFERENCE_TIMEOUT_SECONDS
+            )
+            logger.info(f"Using face inference pool at {settings.FACE_INFERENCE_ADDRESS}")
+            self.status = "ready"
+        elif settings.FACE_BATCH_ENABLED:
+            # Only the auth executor threads submit, each waits for its own result, so a
+            # larger batch could never fill and every batch would wait out the window
+            self.batcher = EmbeddingBatcher(
+                self.embed_faces,
+                max_batch_size=min(settings.FACE_BATCH_MAX_SIZE, settings.AUTH_WORKER_THREADS),
+                window_ms=settings.FACE_BATCH_WINDOW_MS
+            )
+
+        if settings.FACE_EMBEDDING_CACHE_ENABLED:
+            self.cache = EmbeddingCache(
+                max_entries=settings.FACE_EMBEDDING_CACHE_MAX_ENTRIES,
+                ttl_seconds=settings.FACE_EMBEDDING_CACHE_TTL_SECONDS,
+                model_version=self.model_version()
+            )
+
+    def model_version(self) -> str:
+        """Identifies the model and preprocessing that produce embeddings"""
+        backend = "remote" if self.remote is not None else settings.FACE_INFERENCE_BACKEND
+        return f"facenet-vggface2/{backend}/{settings.FACE_DECODE_MAX_SIDE}/{settings.FACE_DETECT_MAX_SIDE}"
     
+    def _configure_torch_threads(self):
+        """
+        Split CPU cores between the auth worker threads, so concurrent
+        forward passes do not oversubscribe the machine
+        """
+        threads = settings.FACE_TORCH_THREADS
+        if threads <= 0:
+            threads = max(1, (os.cpu_count() or 1) // max(1, settings.AUTH_WORKER_THREADS))
+        import torch
+
+        torch.set_num_threads(threads)
+        logger.info(f"Torch intra-op threads set to {threads}")
+
+    def ensure_loaded(self) -> bool:
+        """
+        Load the models on first use, or from the startup warm-up, concurrent
+        callers wait for the same load. Returns True when the models are ready.
+        After a failed load, callers fail fast until the backoff delay has
+        passed, then one of them retries.
+        """
+        if self.status == "ready":
+            return True
+        if self.status == "failed" and time.monotonic() < self._retry_at:
+            return False
+        with self._load_lock:
+            if self.status == "ready":
+                return True
+            if self.status == "failed" and time.monotonic() < self._retry_at:
+                return False
+
+            self.status = "loading"
+            started = time.perf_counter()
+            try:
+                self._load_models()
+            except Exception as e:
+                # e.g. facenet_pytorch or torch not installed
+                logger.error(f"Error loading face models: {e}")
+                self.facenet_model = None
+
+            if self.facenet_model is not None:
+                self.status = "ready"
+                self._load_failures = 0
+            else:
+                self.status = "failed"
+                self._load_failures += 1
+                delay = min(settings.FACE_MODEL_RETRY_MAX_SECONDS,
+                            settings.FACE_MODEL_RETRY_SECONDS * 2 ** (self._load_failures - 1))
+                self._retry_at = time.monotonic() + delay
+                logger.warning(f"Face model load failed {self._load_failures} times, next retry in {delay:.0f}s")
+            logger.info(f"Face models {self.status} after {time.perf_counter() - started:.1f}s")
+        return self.status == "ready"
+
     def _load_models(self):
         """Load MTCNN and FaceNet models"""
+        # torch and facenet_pytorch are imported here so workers that never run
+        # face inference do not pay for them at import time
+        from facenet_pytorch import InceptionResnetV1, MTCNN
+        from .facenet_backends import build_facenet_backend
+
+        self._configure_torch_threads()
+
         try:
             logger.info("Loading MTCNN model...")
             self.mtcnn = MTCNN()
@@ -44,60 +149,188 @@ class FaceRecognitionService:
             if self.facenet_model is None:
                 logger.error("All FaceNet model loading attempts failed")
                 self.facenet_model = None
+            else:
+                self.facenet_forward, self.backend = build_facenet_backend(
+                    self.facenet_model,
+                    settings.FACE_INFERENCE_BACKEND,
+                    onnx_path=settings.FACE_ONNX_PATH or None
+                )
         except Exception as e:
             logger.error(f"Error loading FaceNet model: {e}")
             self.facenet_model = None
 
-    def get_face_embedding(self, image_bytes: bytes):
+    def get_face_embedding(self, image_bytes: bytes, timings: dict = None):
         """
-        Detect face from image bytes and create embedding vector
+        Detect face from image bytes and create embedding vector,
+        per-stage milliseconds are written to timings when given
         """
+        key = None
+        if self.cache is not None:
+            started = time.perf_counter()
+            key = self.cache.key_for(image_bytes)
+            found, embedding = self.cache.get(key)
+            record_auth_stage(timings, "cache", started)
+            if found:
+                return embedding
+
         try:
-            # Check if facenet model is loaded
-            if self.facenet_model is None:
-                logger.error("Error: facenet_model is not loaded")
-                return None
+            image = self.decode_image(image_bytes, timings)
 
-            # Convert bytes to PIL Image
-            image = Image.open(io.BytesIO(image_bytes)).convert('RGB')
-            
-            # Detect face using MTCNN
-            if self.mtcnn is not None:
-                boxes, _ = self.mtcnn.detect(image)
-                
-                if boxes is None or len(boxes) == 0:
-                    logger.warning("No face detected in image")
-                    return None
-                
-                # Get the first detected face
-                box = boxes[0]
-                x1, y1, x2, y2 = box
-                face = image.crop((x1, y1, x2, y2))
+            if self.remote is not None:
+                started = time.perf_counter()
+                try:
+                    embedding = self.remote.embed(np.asarray(image))
+                except Exception as e:
+                    logger.error(f"Face inference pool failed: {e}")
+                    raise self._models_unavailable()
+                record_auth_stage(timings, "inference", started)
+            elif not self.ensure_loaded():
+                logger.error("Error: facenet_model is not loaded")
+                raise self._models_unavailable()
             else:
-                # Fallback: use the entire image if MTCNN is not available
-                face = image
+                embedding = self.embed_image(image, timings)
 
-            # Resize face to 160x160 (FaceNet input size)
-            face = face.resize((160, 160))
-            
-            # Convert to tensor
-            face_tensor = torch.from_numpy(np.array(face)).permute(2, 0, 1).float()
-            face_tensor = face_tensor.unsqueeze(0)  # Add batch dimension
-            
-            # Normalize
-            face_tensor = face_tensor / 255.0
-            
-            # Get embedding
-            with torch.no_grad():
-                embedding = self.facenet_model(face_tensor)
-                embedding = embedding.squeeze().cpu().numpy()
-            
-            return embedding
-            
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Error in face embedding: {e}")
             return None
 
+        # Embeddings and "no face" results are cached, failures above are not
+        if key is not None:
+            self.cache.set(key, embedding)
+        return embedding
+
+    @staticmethod
+    def _models_unavailable() -> HTTPException:
+        """503 for a request the models could not serve, unlike "no face found" it is not cached"""
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Face recognition is temporarily unavailable, please try again shortly."
+        )
+
+    def embed_image_array(self, image_array):
+        """
+        Create the embedding for an (H, W, 3) uint8 RGB array, used by the inference pool
+        """
+        return self.embed_image(Image.fromarray(image_array, mode="RGB"))
+
+    def embed_image(self, image, timings: dict = None):
+        """
+        Detect the face in a decoded RGB image and create its embedding, None if no face is found
+        """
+        # Check if facenet model is loaded
+        if not self.ensure_loaded():
+            logger.error("Error: facenet_model is not loaded")
+            return None
+
+        face_tensor = self.extract_face(image, timings)
+        if face_tensor is None:
+            return None
+
+        # Get embedding, batched with concurrent requests when enabled
+        started = time.perf_counter()
+        if self.batcher is not None:
+            embedding = self.batcher.submit(face_tensor)
+        else:
+            embedding = self.embed_faces(face_tensor.unsqueeze(0))[0]
+        record_auth_stage(timings, "embed", started)
+        return embedding
+
+    def decode_image(self, image_bytes: bytes, timings: dict = None):
+        """
+        Convert bytes to an RGB PIL Image. With FACE_DECODE_MAX_SIDE set, JPEGs
+        are decoded at a reduced scale when they are much larger than that
+        """
+        started = time.perf_counter()
+        image = Image.open(io.BytesIO(image_bytes))
+
+        max_side = settings.FACE_DECODE_MAX_SIDE
+        width, height = image.size
+        if max_side > 0 and image.format == "JPEG" and max(width, height) > max_side:
+            # DCT scaling by 1/2, 1/4 or 1/8, the result stays at least max_side on the long edge
+            scale = max(width, height) / max_side
+            image.draft("RGB", (int(width / scale), int(height / scale)))
+
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        else:
+            image.load()
+        record_auth_stage(timings, "decode", started)
+        return image
+
+    def _detection_proxy(self, image):
+        """
+        Downscale the image for MTCNN, returns the proxy and the x/y factors
+        that map its boxes back to the image
+        """
+        max_side = settings.FACE_DETECT_MAX_SIDE
+        width, height = image.size
+        if max_side <= 0 or max(width, height) <= max_side:
+            return image, 1.0, 1.0
+
+        scale = max(width, height) / max_side
+        size = (max(1, round(width / scale)), max(1, round(height / scale)))
+        proxy = image.resize(size, Image.BILINEAR, reducing_gap=2.0)
+        return proxy, width / size[0], height / size[1]
+
+    def extract_face(self, image, timings: dict = None):
+        """
+        Detect the face and return a (3, 160, 160) tensor, None if no face is found
+        """
+        width, height = image.size
+        box = (0, 0, width, height)
+
+        # Detect face using MTCNN on a bounded-size proxy
+        if self.mtcnn is not None:
+            started = time.perf_counter()
+            proxy, scale_x, scale_y = self._detection_proxy(image)
+            boxes, _ = self.mtcnn.detect(proxy)
+            record_auth_stage(timings, "detect", started)
+            
+            if boxes is None or len(boxes) == 0:
+                logger.warning("No face detected in image")
+                return None
+            
+            # Map the first detected face back to the decoded image
+            x1, y1, x2, y2 = boxes[0]
+            box = (x1 * scale_x, y1 * scale_y, x2 * scale_x, y2 * scale_y)
+        # Fallback: use the entire image if MTCNN is not available
+
+        # Crop and resize to 160x160 (FaceNet input size). Stored embeddings were
+        # computed with crop() and a BICUBIC resize, boxes reaching past the image
+        # edge are padded, so the crop must stay identical for logins to match
+        started = time.perf_counter()
+        face = image.crop(box).resize((FACE_SIZE, FACE_SIZE), Image.BICUBIC)
+
+        # Normalized (3, 160, 160) float tensor, one uint8 buffer and one float allocation
+        import torch
+
+        pixels = torch.frombuffer(bytearray(face.tobytes()), dtype=torch.uint8)
+        face_tensor = pixels.view(FACE_SIZE, FACE_SIZE, 3).permute(2, 0, 1).float().div_(255.0)
+        record_auth_stage(timings, "crop", started)
+        return face_tensor
+
+    def embed_faces(self, face_batch):
+        """
+        Run FaceNet on an (N, 3, 160, 160) batch, returns an (N, 512) array
+        """
+        return self.facenet_forward(face_batch)
+
+    def cache_stats(self) -> dict:
+        """Embedding cache counters"""
+        if self.cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.cache.stats()}
+
+    def batch_stats(self) -> dict:
+        """Micro-batching histograms"""
+        if self.remote is not None:
+            return {"enabled": False, "mode": "remote"}
+        if self.batcher is None:
+            return {"enabled": False, "backend": self.backend}
+        return {"enabled": True, "backend": self.backend, **self.batcher.stats()}
+
     def cosine_similarity(self, embedding1, embedding2):
         """
         Calculate cosine similarity between two embeddings
@@ -0,0 +1,110 @@
+"""
+FaceNet Inference Backends
+
+Wraps the InceptionResnetV1 model in a forward function for the selected
+CPU backend:
+
+- eager: float32 eager mode (reference)
+- torchscript: traced and frozen TorchScript graph
+- compile: torch.compile
+- int8: dynamic int8 quantization of the linear layers
+- onnx: ONNX Runtime session on an exported graph, when onnxruntime is installed
+
+Every backend is warmed up once at build time, a backend that fails to
+build or run falls back to eager float32.
+"""
+
+import logging
+import os
+import numpy as np
+import torch
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_BACKENDS = ("eager", "torchscript", "compile", "int8", "onnx")
+INPUT_SHAPE = (1, 3, 160, 160)
+
+
+def _eager(model):
+    def forward(batch):
+        with torch.no_grad():
+            return model(batch).cpu().numpy()
+    return forward
+
+
+def _torchscript(model):
+    with torch.no_grad():
+        traced = torch.jit.trace(model, torch.zeros(INPUT_SHAPE))
+        frozen = torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+    return _eager(frozen)
+
+
+def _compile(model):
+    return _eager(torch.compile(model))
+
+
+def _int8(model):
+    # Dynamic quantization covers nn.Linear, the convolutions stay float32
+    quantized = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return _eager(quantized)
+
+
+def _onnx(model, onnx_path: str):
+    import onnxruntime
+
+    if not os.path.exists(onnx_path):
+        logger.info(f"Exporting FaceNet to ONNX at {onnx_path}")
+        os.makedirs(os.path.dirname(onnx_path) or ".", exist_ok=True)
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                torch.zeros(INPUT_SHAPE),
+                onnx_path,
+                input_names=["input"],
+                output_names=["embedding"],
+                dynamic_axes={"input": {0: "batch"}, "embedding": {0: "batch"}},
+                opset_version=17
+            )
+
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = torch.get_num_threads()
+    session = onnxruntime.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+
+    def forward(batch):
+        return session.run(None, {"input": np.ascontiguousarray(batch.numpy())})[0]
+    return forward
+
+
+def default_onnx_path() -> str:
+    cache_dir = os.getenv("TORCH_HOME") or os.path.join(os.path.expanduser("~"), ".cache", "torch")
+    return os.path.join(cache_dir, "facenet_vggface2.onnx")
+
+
+def build_facenet_backend(model, backend: str = "eager", onnx_path: str = None):
+    """
+    Return (forward, backend_name), forward maps an (N, 3, 160, 160) float
+    tensor to an (N, 512) float32 array
+    """
+    backend = (backend or "eager").lower()
+    if backend not in SUPPORTED_BACKENDS:
+        logger.warning(f"Unknown FaceNet backend {backend}, using eager")
+        backend = "eager"
+
+    builders = {
+        "eager": lambda: _eager(model),
+        "torchscript": lambda: _torchscript(model),
+        "compile": lambda: _compile(model),
+        "int8": lambda: _int8(model),
+        "onnx": lambda: _onnx(model, onnx_path or default_onnx_path()),
+    }
+
+    try:
+        forward = builders[backend]()
+        forward(torch.zeros(INPUT_SHAPE))  # warm up, surfaces lazy compile errors
+        logger.info(f"FaceNet inference backend: {backend}")
+        return forward, backend
+    except Exception as e:
+        if backend == "eager":
+            raise
+        logger.warning(f"FaceNet backend {backend} unavailable ({e}), falling back to eager")
+        return _eager(model), "eager"
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+class OllamaHealthMonitor:
+    """
+    Background Ollama health probe.
+
+    Probes /api/tags on an interval and caches the result together with the
+    loaded model list, so request handlers can check availability without an
+    HTTP round trip. Real generation calls update the state as they complete.
+    """
+
+    def __init__(self, interval_seconds: float = 10.0, timeout_seconds: float = 3.0):
+        self.interval_seconds = interval_seconds
+        self.timeout_seconds = timeout_seconds
+        self.client = None
+        self.healthy: Optional[bool] = None  # None until the first probe completes
+        self.models = []
+        self.last_checked = None
+        self.last_change = None
+        self.last_error = None
+        self._task = None
+
+    def start(self, client):
+        """Start probing with the given AsyncOllamaClient"""
+        self.client = client
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Cancel the probe loop"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await self.probe()
+            await asyncio.sleep(self.interval_seconds)
+
+    async def probe(self):
+        """Probe Ollama once and update the cached state"""
+        try:
+            tags = await asyncio.wait_for(self.client.get_tags(), timeout=self.timeout_seconds)
+            self.models = [model.get("name", "") for model in tags.get("models", [])]
+            self.mark_success()
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            self.mark_failure(f"Health probe timed out after {self.timeout_seconds}s")
+        except Exception as e:
+            self.mark_failure(str(e) or e.__class__.__name__)
+        self.last_checked = time.time()
+
+    def mark_success(self):
+        """Record a successful call to Ollama"""
+        if self.healthy is not True:
+            logger.info("Ollama server is available")
+            self.last_change = time.time()
+        self.healthy = True
+        self.last_error = None
+
+    def mark_failure(self, error: str):
+        """Record a failed call to Ollama"""
+        if self.healthy is not False:
+            logger.warning(f"Ollama server is unavailable: {error}")
+            self.last_change = time.time()
+        self.healthy = False
+        self.last_error = error
+
+    def is_available(self) -> bool:
+        """Unknown state counts as available so requests are not rejected before the first probe"""
+        return self.healthy is not False
+
+    def snapshot(self) -> dict:
+        """Cached state for /health"""
+        if self.healthy is None:
+            state = "unknown"
+        else:
+            state = "up" if self.healthy else "down"
+        return {
+            "status": state,
+            "models": self.models,
+            "last_checked": self.last_checked,
+            "last_change": self.last_change,
+            "last_error": self.last_error,
+        }
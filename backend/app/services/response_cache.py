@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+class ResponseCache:
+    """
+    LRU + TTL cache for deterministic LLM responses.
+
+    The memory tier is bounded by entry count and by the encoded size of the
+    stored values. An optional SQLite tier keeps entries across restarts and
+    refills the memory tier on a hit. Disk reads and writes run in a worker
+    thread, the event loop only ever waits on the memory tier's lock.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024,
+                 ttl_seconds: float = 3600.0, disk_path: Optional[str] = None,
+                 disk_max_entries: int = 10000):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.disk_max_entries = disk_max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()  # one SQLite connection, used from worker threads
+        self._disk = None
+        self._disk_writes = 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stores = 0
+
+        if disk_path:
+            self._open_disk(disk_path)
+
+    def _open_disk(self, path: str):
+        """Open the SQLite tier and drop expired rows"""
+        try:
+            self._disk = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._disk.execute("PRAGMA journal_mode=WAL")
+            self._disk.execute("PRAGMA synchronous=NORMAL")
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, expires_at REAL NOT NULL, value TEXT NOT NULL)"
+            )
+            self._disk.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),))
+            logger.info(f"Response cache disk tier opened at {path}")
+        except sqlite3.Error as e:
+            logger.error(f"Failed to open response cache at {path}: {e}")
+            self._disk = None
+
+    @staticmethod
+    def make_key(**parts) -> str:
+        """Hash the request fields that determine the generated output"""
+        encoded = json.dumps(parts, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[dict]:
+        """Return the cached value or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, size, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._remove(key)
+
+        if self._disk is not None:
+            row = await asyncio.to_thread(self._disk_get, key, now)
+            if row is not None:
+                expires_at, value = row
+                with self._lock:
+                    self._insert(key, value, expires_at)
+                    self.disk_hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    async def set(self, key: str, value: dict):
+        """Store a value in memory and, when enabled, on disk"""
+        encoded = json.dumps(value, ensure_ascii=False)
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._insert(key, value, expires_at, len(encoded))
+            self.stores += 1
+        if self._disk is not None:
+            await asyncio.to_thread(self._disk_set, key, encoded, expires_at)
+
+    async def evict(self, key: str):
+        """Remove one entry from both tiers"""
+        with self._lock:
+            self._remove(key)
+        if self._disk is not None:
+            await asyncio.to_thread(self._disk_execute, "DELETE FROM responses WHERE key = ?", (key,))
+
+    async def clear(self):
+        """Remove all entries from both tiers"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self._disk is not None:
+            await asyncio.to_thread(self._disk_execute, "DELETE FROM responses", ())
+
+    def _insert(self, key: str, value: dict, expires_at: float, size: Optional[int] = None):
+        if size is None:
+            size = len(json.dumps(value, ensure_ascii=False))
+        if size > self.max_bytes:
+            return
+        self._remove(key)
+        self._entries[key] = (expires_at, size, value)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def _disk_execute(self, sql: str, params: tuple):
+        try:
+            with self._disk_lock:
+                self._disk.execute(sql, params)
+        except sqlite3.Error as e:
+            logger.error(f"Response cache disk update failed: {e}")
+
+    def _disk_get(self, key: str, now: float):
+        try:
+            with self._disk_lock:
+                row = self._disk.execute(
+                    "SELECT expires_at, value FROM responses WHERE key = ? AND expires_at > ?",
+                    (key, now)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Response cache disk read failed: {e}")
+            return None
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def _disk_set(self, key: str, encoded: str, expires_at: float):
+        try:
+            with self._disk_lock:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO responses (key, expires_at, value) VALUES (?, ?, ?)",
+                    (key, expires_at, encoded)
+                )
+                # Trim expired and oldest rows every so often instead of on every write
+                self._disk_writes += 1
+                if self._disk_writes % 100 == 0:
+                    self._disk.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),))
+                    self._disk.execute(
+                        "DELETE FROM responses WHERE key IN ("
+                        "SELECT key FROM responses ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                        (self.disk_max_entries,)
+                    )
+        except sqlite3.Error as e:
+            logger.error(f"Response cache disk write failed: {e}")
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "stores": self.stores,
+                "disk_enabled": self._disk is not None,
+            }
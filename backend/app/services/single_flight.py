@@ -0,0 +1,139 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class _Flight:
+    """One in-flight call shared by every caller with the same key"""
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class _Broadcast:
+    """
+    One in-flight stream. A pump task reads the source iterator into a chunk
+    list, subscribers replay the list from the start and then follow it live.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.task = None
+        self._changed = asyncio.Event()
+
+    def publish(self, chunk=None, done: bool = False, error: BaseException = None):
+        if chunk is not None:
+            self.chunks.append(chunk)
+        if done:
+            self.done = True
+            self.error = error
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def wait(self):
+        await self._changed.wait()
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical LLM calls onto one execution.
+
+    The first caller for a key starts the work, later callers with the same
+    key attach to it and receive the same result or stream. The shared work
+    is cancelled only when every attached caller has gone away.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._broadcasts = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key: str, factory):
+        """Await factory() once per key and share its result with concurrent callers"""
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(factory()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(self._flights, key, flight))
+            self.leaders += 1
+        else:
+            self.followers += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                self._forget(self._flights, key, flight)
+                flight.task.cancel()
+
+    async def stream(self, key: str, factory):
+        """
+        Iterate the async iterator returned by factory() once per key and
+        yield every chunk to all concurrent subscribers, late subscribers
+        receive the chunks they missed first
+        """
+        broadcast = self._broadcasts.get(key)
+        if broadcast is None:
+            broadcast = _Broadcast()
+            self._broadcasts[key] = broadcast
+            broadcast.task = asyncio.ensure_future(self._pump(key, broadcast, factory))
+            self.leaders += 1
+        else:
+            self.followers += 1
+
+        broadcast.subscribers += 1
+        position = 0
+        try:
+            while True:
+                if position < len(broadcast.chunks):
+                    chunk = broadcast.chunks[position]
+                    position += 1
+                    yield chunk
+                    continue
+                if broadcast.done:
+                    if broadcast.error is not None:
+                        raise broadcast.error
+                    return
+                await broadcast.wait()
+        finally:
+            broadcast.subscribers -= 1
+            if broadcast.subscribers == 0 and not broadcast.task.done():
+                self._forget(self._broadcasts, key, broadcast)
+                broadcast.task.cancel()
+
+    async def _pump(self, key: str, broadcast: _Broadcast, factory):
+        source = factory()
+        try:
+            async for chunk in source:
+                broadcast.publish(chunk)
+            broadcast.publish(done=True)
+        except asyncio.CancelledError:
+            broadcast.publish(done=True, error=asyncio.CancelledError())
+            raise
+        except Exception as e:
+            logger.error(f"Coalesced stream failed: {e}")
+            broadcast.publish(done=True, error=e)
+        finally:
+            self._forget(self._broadcasts, key, broadcast)
+            await source.aclose()
+
+    @staticmethod
+    def _forget(table: dict, key: str, entry):
+        # A finished entry must not remove a newer flight registered under the same key
+        if table.get(key) is entry:
+            del table[key]
+
+    def stats(self) -> dict:
+        """Generations started and saved by coalescing"""
+        return {
+            "generations": self.leaders,
+            "coalesced": self.followers,
+            "in_flight": len(self._flights) + len(self._broadcasts),
+        }
@@ -0,0 +1,159 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from fastapi import HTTPException, status
+
+from ..core.metrics import rate_limit_rejections_total
+
+
+class Reservation:
+    """Tokens held for one generation until it is settled"""
+
+    __slots__ = ("client", "tokens", "settled")
+
+    def __init__(self, client: str, tokens: int):
+        self.client = client
+        self.tokens = tokens
+        self.settled = False
+
+
+class TokenQuota:
+    """
+    Per-client LLM token budgets.
+
+    Each client has a budget of tokens_per_window that refills continuously
+    over window_seconds. A request reserves its max_tokens up front, so a
+    client cannot start more work than it can pay for, and is settled
+    against the eval_count Ollama reports once the generation finishes:
+    unused tokens are refunded, failed generations are refunded in full.
+    Budgets for at most max_clients are kept, least recently used first out.
+    """
+
+    def __init__(self, tokens_per_window: int, window_seconds: float, max_clients: int = 100000):
+        self.capacity = float(tokens_per_window)
+        self.rate = tokens_per_window / max(1.0, window_seconds)
+        self.max_clients = max(1, max_clients)
+        self._balances: "OrderedDict[str, tuple]" = OrderedDict()  # client -> (balance, last_refill)
+
+        self.reserved = 0
+        self.rejected = 0
+        self.refunded = 0
+        self.charged = 0
+
+    def _balance(self, client: str, now: float) -> float:
+        entry = self._balances.get(client)
+        if entry is None:
+            return self.capacity
+        balance, last = entry
+        return min(self.capacity, balance + (now - last) * self.rate)
+
+    def _store(self, client: str, balance: float, now: float):
+        self._balances[client] = (balance, now)
+        self._balances.move_to_end(client)
+        while len(self._balances) > self.max_clients:
+            self._balances.popitem(last=False)
+
+    def reserve(self, client: str, max_tokens: int) -> Reservation:
+        """Hold max_tokens from the client's budget, 429 with Retry-After when it cannot cover them"""
+        if max_tokens <= 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="max_tokens must be a positive number of tokens."
+            )
+        now = time.monotonic()
+        # A request larger than the whole budget is allowed once the budget is full
+        tokens = int(min(max_tokens, self.capacity))
+        balance = self._balance(client, now)
+        if balance < tokens:
+            self.rejected += 1
+            rate_limit_rejections_total.inc("llm_tokens")
+            retry_after = max(1, math.ceil((tokens - balance) / self.rate))
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"LLM token budget exceeded, {int(balance)} of {tokens} tokens available.",
+                headers={"Retry-After": str(retry_after)}
+            )
+
+        self._store(client, balance - tokens, now)
+        self.reserved += tokens
+        return Reservation(client, tokens)
+
+    def settle(self, reservation: Reservation, used_tokens: int):
+        """Refund the part of a reservation that was not generated"""
+        if reservation.settled:
+            return
+        reservation.settled = True
+
+        refund = reservation.tokens - max(0, used_tokens)
+        now = time.monotonic()
+        # Overuse (only possible when max_tokens was capped to the budget) leaves a debt
+        self._store(reservation.client, min(self.capacity, self._balance(reservation.client, now) + refund), now)
+        self.refunded += max(0, refund)
+        self.charged += max(0, used_tokens)
+
+    def remaining(self, client: str) -> int:
+        return int(self._balance(client, time.monotonic()))
+
+    def stats(self) -> dict:
+        return {
+            "tokens_per_window": int(self.capacity),
+            "window_seconds": round(self.capacity / self.rate, 1),
+            "clients": len(self._balances),
+            "reserved": self.reserved,
+            "charged": self.charged,
+            "refunded": self.refunded,
+            "rejected": self.rejected,
+        }
+
+
+class ConcurrencyBudget:
+    """
+    Caps concurrent generations sent to the model server from this worker.
+
+    Requests wait up to queue_timeout_seconds for a slot and are answered
+    with 503 and Retry-After after that, so a few heavy clients cannot pile
+    up unbounded work on Ollama.
+    """
+
+    def __init__(self, max_concurrent: int, queue_timeout_seconds: float = 30.0,
+                 retry_after_seconds: int = 5):
+        self.max_concurrent = max(1, max_concurrent)
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self.retry_after_seconds = retry_after_seconds
+        self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        self.active = 0
+        self.waiting = 0
+        self.timeouts = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout_seconds)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            rate_limit_rejections_total.inc("llm_concurrency")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Model server is busy, please try again shortly.",
+                headers={"Retry-After": str(self.retry_after_seconds)}
+            )
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "active": self.active,
+            "waiting": self.waiting,
+            "timeouts": self.timeouts,
+        }
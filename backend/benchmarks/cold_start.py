@@ -0,0 +1,136 @@
+"""
+Worker cold-start benchmark
+
+Measures, for each WORKER_ROLE, in a fresh interpreter:
+
+- import time of app.main and whether heavy modules (torch, facenet_pytorch,
+  httpx) were pulled in
+- with --serve, the time from launching uvicorn until /health (liveness)
+  and /ready (readiness) first answer 200
+
+Run from the backend directory with the usual environment (DATABASE_URL,
+OLLAMA_BASE_URL, PYTHONPATH including the repository root for models/):
+
+    python -m benchmarks.cold_start --roles all,auth,llm --repeat 3
+    python -m benchmarks.cold_start --serve --port 8765
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+HEAVY_MODULES = ("torch", "facenet_pytorch", "httpx", "models.ollama_client")
+
+IMPORT_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - started
+print(json.dumps({
+    "import_seconds": elapsed,
+    "modules": len(sys.modules),
+    "loaded": [name for name in %r if name in sys.modules],
+}))
+"""
+
+
+def measure_import(role: str) -> dict:
+    """Import app.main in a fresh interpreter with the given role"""
+    env = dict(os.environ, WORKER_ROLE=role)
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE % (HEAVY_MODULES,)],
+        capture_output=True, text=True, env=env
+    )
+    wall = time.perf_counter() - started
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["process_seconds"] = wall
+    return result
+
+
+def _wait_for(url: str, started: float, timeout: float):
+    """Seconds since started until url answers 200, None on timeout"""
+    while time.perf_counter() - started < timeout:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return time.perf_counter() - started
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.05)
+    return None
+
+
+def measure_serve(role: str, port: int, timeout: float) -> dict:
+    """Launch uvicorn and time liveness and readiness"""
+    env = dict(os.environ, WORKER_ROLE=role)
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        health = _wait_for(f"http://127.0.0.1:{port}/health", started, timeout)
+        ready = _wait_for(f"http://127.0.0.1:{port}/ready", started, timeout)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+    return {"health_seconds": health, "ready_seconds": ready}
+
+
+def _summary(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return None
+    return {"min": round(min(values), 3), "median": round(statistics.median(values), 3), "max": round(max(values), 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--roles", default="all,auth,llm")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--serve", action="store_true", help="also time /health and /ready under uvicorn")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    report = {}
+    for role in [r.strip() for r in args.roles.split(",") if r.strip()]:
+        imports = [measure_import(role) for _ in range(args.repeat)]
+        entry = {
+            "import_seconds": _summary([r["import_seconds"] for r in imports]),
+            "process_seconds": _summary([r["process_seconds"] for r in imports]),
+            "modules": imports[-1]["modules"],
+            "heavy_modules_loaded": imports[-1]["loaded"],
+        }
+        if args.serve:
+            runs = [measure_serve(role, args.port, args.timeout) for _ in range(args.repeat)]
+            entry["health_seconds"] = _summary([r["health_seconds"] for r in runs])
+            entry["ready_seconds"] = _summary([r["ready_seconds"] for r in runs])
+        report[role] = entry
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    for role, entry in report.items():
+        line = f"{role:<5} import {entry['import_seconds']['median']:.3f}s (process {entry['process_seconds']['median']:.3f}s)"
+        if args.serve:
+            health = entry["health_seconds"]["median"] if entry["health_seconds"] else "timeout"
+            ready = entry["ready_seconds"]["median"] if entry["ready_seconds"] else "timeout"
+            line += f", /health {health}s, /ready {ready}s"
+        line += f", heavy modules: {', '.join(entry['heavy_modules_loaded']) or 'none'}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
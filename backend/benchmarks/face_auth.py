@@ -0,0 +1,428 @@
+"""
+Face authentication benchmark suite
+
+Seeds the users table with synthetic enrolments and measures the auth path
+offline, against a local Postgres/pgvector container or a SQLite file as a
+stand-in (SQLite matches with the in-memory index only):
+
+- preprocess: FaceRecognitionService.get_face_embedding on synthetic face
+  images at several resolutions, per-stage latency (decode, detect, crop,
+  embed) and how often a face was found
+- match: AuthService candidate search for N enrolled users (default
+  1k/10k/100k random unit 512-d embeddings) per match backend
+- auth: signup then login throughput and latency at several concurrency
+  levels, in-process through AuthService and/or over HTTP against a
+  running server, with the per-stage timings_ms the endpoints report
+
+Every result carries p50/p95/p99 latencies and is written to a JSON file
+so runs can be diffed between releases. The embedding cache is disabled
+in-process, so repeated images exercise the full pipeline.
+
+The database must be dedicated to benchmarking: seeding refuses to touch a
+users table that already has rows unless --reset is given, which deletes
+them. For --mode http the server must use the same DATABASE_URL.
+
+    python -m benchmarks.face_auth --users 1000,10000,100000 --output face_auth.json
+    python -m benchmarks.face_auth --mode http --url http://127.0.0.1:8000 --concurrency 1,4,16
+    python -m benchmarks.face_auth --images ./faces --resolutions 640x480,1920x1080
+
+Synthetic images are drawn face-like shapes, MTCNN may not find a face in
+them; --images with real photos gives meaningful detect and login numbers.
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+from fastapi import HTTPException
+from PIL import Image, ImageDraw
+from sqlalchemy import event, func, select, text
+
+from app.core.config import settings
+from app.core.database import Base, SessionLocal, engine
+from app.core.vector_index import ensure_vector_extension
+from app.models.user import User
+from app.services.auth_service import auth_service
+from app.services.embedding_index import EMBEDDING_DIM, embedding_index
+from app.services.face_recognition_service import face_recognition_service
+
+SEED_CHUNK = 2000
+QUERY_SAMPLE = 1000
+
+
+def summarize(values_ms) -> dict:
+    """Latency percentiles in milliseconds"""
+    if not values_ms:
+        return {"count": 0}
+    values = np.asarray(values_ms, dtype=np.float64)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "count": int(values.size),
+        "mean": round(float(values.mean()), 3),
+        "p50": round(float(p50), 3),
+        "p95": round(float(p95), 3),
+        "p99": round(float(p99), 3),
+    }
+
+
+def summarize_stages(timings: list) -> dict:
+    """Percentiles per stage from a list of timings_ms dicts"""
+    stages = {}
+    for entry in timings:
+        for stage, value in (entry or {}).items():
+            stages.setdefault(stage, []).append(value)
+    return {stage: summarize(values) for stage, values in sorted(stages.items())}
+
+
+def synthetic_embeddings(count: int, rng: np.random.Generator) -> np.ndarray:
+    """Random L2-normalized float32 embeddings"""
+    vectors = rng.standard_normal((count, EMBEDDING_DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def synthetic_face_image(width: int, height: int, seed: int) -> bytes:
+    """A face-like drawing on a noisy background, JPEG encoded"""
+    rng = np.random.default_rng(seed)
+    background = rng.integers(60, 200, size=(height, width, 3), dtype=np.uint8)
+    image = Image.fromarray(background, mode="RGB")
+    draw = ImageDraw.Draw(image)
+
+    size = min(width, height) * rng.uniform(0.35, 0.6)
+    cx = width / 2 + rng.uniform(-0.1, 0.1) * width
+    cy = height / 2 + rng.uniform(-0.1, 0.1) * height
+    skin = tuple(int(c) for c in rng.integers((170, 120, 90), (240, 190, 160)))
+    draw.ellipse((cx - size * 0.38, cy - size * 0.5, cx + size * 0.38, cy + size * 0.5), fill=skin)
+    for side in (-1, 1):
+        ex, ey = cx + side * size * 0.15, cy - size * 0.1
+        draw.ellipse((ex - size * 0.06, ey - size * 0.035, ex + size * 0.06, ey + size * 0.035), fill=(250, 250, 250))
+        draw.ellipse((ex - size * 0.025, ey - size * 0.025, ex + size * 0.025, ey + size * 0.025), fill=(40, 30, 20))
+        draw.line((ex - size * 0.08, ey - size * 0.08, ex + size * 0.08, ey - size * 0.09), fill=(60, 40, 30), width=max(1, int(size * 0.02)))
+    draw.polygon([(cx, cy - size * 0.02), (cx - size * 0.05, cy + size * 0.12), (cx + size * 0.05, cy + size * 0.12)],
+                 fill=tuple(max(0, c - 30) for c in skin))
+    draw.arc((cx - size * 0.14, cy + size * 0.12, cx + size * 0.14, cy + size * 0.3), 20, 160,
+             fill=(150, 50, 50), width=max(1, int(size * 0.02)))
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def load_images(directory: str, resolutions, count: int, seed: int) -> dict:
+    """Images keyed by resolution label, real photos are resized to each resolution"""
+    images = {}
+    if directory:
+        paths = sorted(
+            os.path.join(directory, name) for name in os.listdir(directory)
+            if name.lower().endswith((".jpg", ".jpeg", ".png", ".webp"))
+        )[:count]
+        if not paths:
+            raise SystemExit(f"No images found in {directory}")
+    for width, height in resolutions:
+        label = f"{width}x{height}"
+        if directory:
+            images[label] = []
+            for path in paths:
+                with Image.open(path) as photo:
+                    buffer = io.BytesIO()
+                    photo.convert("RGB").resize((width, height)).save(buffer, format="JPEG", quality=90)
+                    images[label].append(buffer.getvalue())
+        else:
+            images[label] = [synthetic_face_image(width, height, seed + i) for i in range(count)]
+    return images
+
+
+def prepare_database(reset: bool):
+    """Create the schema, check the users table is ours to fill"""
+    if engine.dialect.name == "sqlite":
+        # Stand-in for Postgres: the created_at server default calls now()
+        @event.listens_for(engine, "connect")
+        def _sqlite_now(dbapi_connection, connection_record):
+            dbapi_connection.create_function("now", 0, lambda: datetime.now(timezone.utc).isoformat())
+    else:
+        ensure_vector_extension(engine)
+    Base.metadata.create_all(bind=engine)
+
+    with engine.begin() as conn:
+        existing = conn.execute(select(func.count()).select_from(User.__table__)).scalar()
+        if existing and not reset:
+            raise SystemExit(f"users has {existing} rows, use a dedicated database or pass --reset to delete them")
+        if existing:
+            conn.execute(User.__table__.delete())
+
+
+def seed_users(target: int, rng: np.random.Generator, sample: list) -> float:
+    """Insert synthetic users until the table holds target rows, returns seconds spent"""
+    with engine.connect() as conn:
+        current = conn.execute(select(func.count()).select_from(User.__table__)).scalar()
+    started = time.perf_counter()
+    while current < target:
+        batch = min(SEED_CHUNK, target - current)
+        vectors = synthetic_embeddings(batch, rng)
+        rows = [
+            {"id": uuid.uuid4(), "face_embedding": vector, "recognition_threshold": 0.6}
+            for vector in vectors
+        ]
+        with engine.begin() as conn:
+            conn.execute(User.__table__.insert(), rows)
+        # Keep some enrolled vectors around to build login queries from
+        for vector in vectors[:max(0, QUERY_SAMPLE - len(sample))]:
+            sample.append(vector)
+        current += batch
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE users"))
+    return time.perf_counter() - started
+
+
+def bench_preprocess(images: dict, repeats: int) -> list:
+    """get_face_embedding per resolution, per-stage latency and face detection rate"""
+    results = []
+    for label, blobs in images.items():
+        totals, timings, found = [], [], 0
+        for _ in range(repeats):
+            for blob in blobs:
+                stage_timings = {}
+                started = time.perf_counter()
+                embedding = face_recognition_service.get_face_embedding(blob, stage_timings)
+                totals.append((time.perf_counter() - started) * 1000)
+                timings.append(stage_timings)
+                found += embedding is not None
+        results.append({
+            "benchmark": "preprocess",
+            "mode": "inproc",
+            "resolution": label,
+            "backend": face_recognition_service.backend,
+            "face_found_rate": round(found / max(1, len(totals)), 3),
+            "latency_ms": summarize(totals),
+            "stages_ms": summarize_stages(timings),
+        })
+    return results
+
+
+def bench_match(users: int, queries: np.ndarray, backends) -> list:
+    """Candidate search for perturbed enrolled embeddings, per match backend"""
+    results = []
+    configured = settings.FACE_MATCH_BACKEND
+    try:
+        for backend in backends:
+            settings.FACE_MATCH_BACKEND = backend
+            db = SessionLocal()
+            try:
+                entry = {"benchmark": "match", "mode": "inproc", "users": users, "backend": backend}
+                if backend == "memory":
+                    started = time.perf_counter()
+                    embedding_index.sync_from_db(db)
+                    entry["index_sync_ms"] = round((time.perf_counter() - started) * 1000, 3)
+
+                totals, timings, hits = [], [], 0
+                for query in queries:
+                    stage_timings = {}
+                    started = time.perf_counter()
+                    candidates = auth_service._find_candidates(query, db, stage_timings)
+                    totals.append((time.perf_counter() - started) * 1000)
+                    timings.append(stage_timings)
+                    hits += bool(candidates) and candidates[0][1] > candidates[0][2]
+                entry["match_rate"] = round(hits / max(1, len(queries)), 3)
+                entry["latency_ms"] = summarize(totals)
+                entry["stages_ms"] = summarize_stages(timings)
+                results.append(entry)
+            finally:
+                db.close()
+    finally:
+        settings.FACE_MATCH_BACKEND = configured
+    return results
+
+
+def _inproc_call(method, blob) -> tuple:
+    db = SessionLocal()
+    started = time.perf_counter()
+    try:
+        result = method(blob, db)
+        status_code = 200
+    except HTTPException as e:
+        result, status_code = {}, e.status_code
+    finally:
+        db.close()
+    return (time.perf_counter() - started) * 1000, status_code, result.get("timings_ms")
+
+
+async def _http_call(client, path: str, blob) -> tuple:
+    started = time.perf_counter()
+    response = await client.post(path, files={"file": ("face.jpg", blob, "image/jpeg")})
+    elapsed = (time.perf_counter() - started) * 1000
+    timings = response.json().get("timings_ms") if response.headers.get("content-type", "").startswith("application/json") else None
+    return elapsed, response.status_code, timings
+
+
+async def _run_http(url: str, path: str, blobs: list, concurrency: int) -> list:
+    import httpx
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=120.0) as client:
+        pending = iter(blobs)
+        results = []
+
+        async def worker():
+            for blob in pending:
+                results.append(await _http_call(client, path, blob))
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return results
+
+
+def _auth_result(operation: str, mode: str, users: int, resolution: str, concurrency: int,
+                 calls: list, wall_seconds: float) -> dict:
+    statuses = {}
+    for _, status_code, _ in calls:
+        statuses[str(status_code)] = statuses.get(str(status_code), 0) + 1
+    ok = [call for call in calls if 200 <= call[1] < 300]
+    return {
+        "benchmark": operation,
+        "mode": mode,
+        "users": users,
+        "resolution": resolution,
+        "concurrency": concurrency,
+        "requests": len(calls),
+        "statuses": statuses,
+        "throughput_rps": round(len(calls) / wall_seconds, 2) if wall_seconds > 0 else None,
+        "latency_ms": summarize([call[0] for call in calls]),
+        "success_latency_ms": summarize([call[0] for call in ok]),
+        "stages_ms": summarize_stages([call[2] for call in ok]),
+    }
+
+
+def bench_auth(mode: str, users: int, images: dict, concurrency_levels, requests: int, url: str) -> list:
+    """Signup then login with the same images, so logins can match the fresh enrolments"""
+    results = []
+    for label, blobs in images.items():
+        batch = [blobs[i % len(blobs)] for i in range(requests)]
+        for concurrency in concurrency_levels:
+            for operation in ("signup", "login"):
+                started = time.perf_counter()
+                if mode == "inproc":
+                    method = auth_service.signup_user if operation == "signup" else auth_service.login_user
+                    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                        calls = list(pool.map(lambda blob: _inproc_call(method, blob), batch))
+                else:
+                    path = f"{settings.API_V1_STR}/users/{operation}"
+                    calls = asyncio.run(_run_http(url, path, batch, concurrency))
+                wall = time.perf_counter() - started
+                results.append(_auth_result(operation, mode, users, label, concurrency, calls, wall))
+    return results
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _parse_list(value: str, cast=int):
+    return [cast(item) for item in value.split(",") if item.strip()]
+
+
+def _parse_resolution(value: str):
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=("inproc", "http", "all"), default="inproc")
+    parser.add_argument("--users", default="1000,10000,100000", help="enrolled user counts to seed and match against")
+    parser.add_argument("--resolutions", default="640x480,1280x960,3024x4032")
+    parser.add_argument("--images", help="directory of real face photos instead of synthetic images")
+    parser.add_argument("--image-count", type=int, default=8, help="distinct images per resolution")
+    parser.add_argument("--repeats", type=int, default=3, help="preprocess passes over the images")
+    parser.add_argument("--queries", type=int, default=500, help="match queries per user count")
+    parser.add_argument("--requests", type=int, default=32, help="signups and logins per concurrency level")
+    parser.add_argument("--concurrency", default="1,4,16")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--skip", default="", help="comma separated benchmarks to skip: preprocess,match,auth")
+    parser.add_argument("--reset", action="store_true", help="delete existing rows in users first")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", default="face_auth_benchmark.json")
+    args = parser.parse_args()
+
+    skip = set(_parse_list(args.skip, str))
+    modes = ("inproc", "http") if args.mode == "all" else (args.mode,)
+    concurrency_levels = _parse_list(args.concurrency)
+    rng = np.random.default_rng(args.seed)
+
+    # Measure the full pipeline every time, not cache hits
+    face_recognition_service.cache = None
+
+    images = load_images(args.images, [_parse_resolution(r) for r in args.resolutions.split(",")],
+                         args.image_count, args.seed)
+    match_backends = ["memory"] if engine.dialect.name == "sqlite" else ["pgvector", "memory"]
+
+    report = {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "git_revision": _git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "database": engine.dialect.name,
+            "settings": {
+                "FACE_INFERENCE_MODE": settings.FACE_INFERENCE_MODE,
+                "FACE_INFERENCE_BACKEND": settings.FACE_INFERENCE_BACKEND,
+                "FACE_BATCH_ENABLED": settings.FACE_BATCH_ENABLED,
+                "FACE_DECODE_MAX_SIDE": settings.FACE_DECODE_MAX_SIDE,
+                "FACE_DETECT_MAX_SIDE": settings.FACE_DETECT_MAX_SIDE,
+                "FACE_MATCH_BACKEND": settings.FACE_MATCH_BACKEND,
+                "FACE_SEARCH_TOP_K": settings.FACE_SEARCH_TOP_K,
+            },
+            "args": vars(args),
+        },
+        "results": [],
+    }
+    results = report["results"]
+
+    if "preprocess" not in skip and "inproc" in modes:
+        results.extend(bench_preprocess(images, args.repeats))
+        print(f"preprocess done, {len(images)} resolutions")
+
+    prepare_database(args.reset)
+    sample = []
+    for users in _parse_list(args.users):
+        seed_seconds = seed_users(users, rng, sample)
+        results.append({"benchmark": "seed", "users": users, "seconds": round(seed_seconds, 3)})
+
+        if "match" not in skip:
+            # Perturbed copies of enrolled embeddings, close enough to match
+            base = np.asarray(sample)[rng.integers(0, len(sample), size=args.queries)]
+            queries = base + rng.standard_normal(base.shape).astype(np.float32) * 0.02
+            results.extend(bench_match(users, queries, match_backends))
+
+        if "auth" not in skip:
+            for mode in modes:
+                results.extend(bench_auth(mode, users, images, concurrency_levels, args.requests, args.url))
+        print(f"{users} users done")
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+
+    for entry in results:
+        latency = entry.get("latency_ms")
+        if not latency or not latency.get("count"):
+            continue
+        name = " ".join(str(entry[key]) for key in ("benchmark", "mode", "users", "resolution", "backend", "concurrency") if entry.get(key) is not None)
+        print(f"{name:<48} p50 {latency['p50']:>9.2f} ms  p95 {latency['p95']:>9.2f} ms  p99 {latency['p99']:>9.2f} ms")
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Face preprocessing parity check
+
+FACE_DECODE_MAX_SIDE (JPEG draft decoding) and FACE_DETECT_MAX_SIDE (MTCNN on
+a downscaled proxy) make preprocessing cheaper but change the embeddings,
+while enrolled users keep the vectors computed at full resolution. This
+compares both pipelines on the same images and reports:
+
+- decode + detect + crop latency of the full-resolution and the reduced pipeline
+- cosine drift between each image's two embeddings
+- self-match failures: reduced-pipeline logins that no longer reach the
+  threshold against their own full-resolution enrolment
+- decision flips: pairwise login/enrolment match decisions at the threshold
+  that differ from the full-resolution pipeline
+
+Run from the backend directory before enabling either setting:
+
+    python -m benchmarks.face_preprocessing --images ./faces --decode-max-side 1280 --detect-max-side 640
+
+Without --images synthetic face drawings are used, MTCNN may not find a
+face in them, real photos give the meaningful numbers.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+
+from app.core.config import settings
+from benchmarks.face_auth import synthetic_face_image
+
+
+def load_images(images_dir: str, samples: int, resolution: str, seed: int) -> list:
+    """(name, bytes) pairs from a directory, or synthetic JPEGs at the given resolution"""
+    if images_dir:
+        images = []
+        for name in sorted(os.listdir(images_dir)):
+            path = os.path.join(images_dir, name)
+            if os.path.isfile(path):
+                with open(path, "rb") as f:
+                    images.append((name, f.read()))
+        return images
+
+    width, height = (int(part) for part in resolution.lower().split("x"))
+    return [(f"synthetic-{seed + i}", synthetic_face_image(width, height, seed + i)) for i in range(samples)]
+
+
+def preprocess(service, images: list, decode_max_side: int, detect_max_side: int):
+    """Face tensors keyed by image name, None where no face was found, and per-image milliseconds"""
+    settings.FACE_DECODE_MAX_SIDE = decode_max_side
+    settings.FACE_DETECT_MAX_SIDE = detect_max_side
+    faces, latencies = {}, []
+    for name, blob in images:
+        started = time.perf_counter()
+        try:
+            faces[name] = service.extract_face(service.decode_image(blob))
+        except Exception as e:
+            print(f"Skipping {name}: {e}", file=sys.stderr)
+            faces[name] = None
+        latencies.append((time.perf_counter() - started) * 1000)
+    return faces, latencies
+
+
+def _normalize(embeddings: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+def compare(enrolled: np.ndarray, logins: np.ndarray, threshold: float) -> dict:
+    """Drift per image, own-enrolment failures and login x enrolment decision flips"""
+    enrolled, logins = _normalize(enrolled), _normalize(logins)
+    own = np.sum(enrolled * logins, axis=1)
+    base_sim = enrolled @ enrolled.T
+    cand_sim = logins @ enrolled.T
+    flips = (base_sim > threshold) != (cand_sim > threshold)
+    return {
+        "cosine_drift": {"mean": float(np.mean(1.0 - own)), "max": float(np.max(1.0 - own))},
+        "own_similarity_min": float(np.min(own)),
+        "self_match_failures": int(np.sum(own <= threshold)),
+        "pairs": int(flips.size),
+        "decision_flips": int(np.sum(flips)),
+    }
+
+
+def _summary(values) -> dict:
+    return {
+        "mean": round(float(np.mean(values)), 2),
+        "p50": round(float(np.percentile(values, 50)), 2),
+        "p95": round(float(np.percentile(values, 95)), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", default="", help="directory of face photos")
+    parser.add_argument("--samples", type=int, default=32, help="synthetic images when --images is not set")
+    parser.add_argument("--resolution", default="1920x1080", help="synthetic image size")
+    parser.add_argument("--decode-max-side", type=int, default=1280)
+    parser.add_argument("--detect-max-side", type=int, default=640)
+    parser.add_argument("--threshold", type=float, default=0.6)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    import torch
+    from app.services.face_recognition_service import FaceRecognitionService
+
+    service = FaceRecognitionService(mode="local")
+    if not service.ensure_loaded():
+        sys.exit("Face models failed to load")
+
+    images = load_images(args.images, args.samples, args.resolution, args.seed)
+    baseline, baseline_ms = preprocess(service, images, 0, 0)
+    reduced, reduced_ms = preprocess(service, images, args.decode_max_side, args.detect_max_side)
+
+    names = [name for name, _ in images if baseline[name] is not None and reduced[name] is not None]
+    detection_mismatches = sum((baseline[name] is None) != (reduced[name] is None) for name, _ in images)
+    report = {
+        "images": len(images),
+        "faces": len(names),
+        "detection_mismatches": detection_mismatches,
+        "threshold": args.threshold,
+        "decode_max_side": args.decode_max_side,
+        "detect_max_side": args.detect_max_side,
+        "preprocess_ms": {"full": _summary(baseline_ms), "reduced": _summary(reduced_ms)},
+    }
+    if names:
+        with torch.no_grad():
+            enrolled = service.embed_faces(torch.stack([baseline[name] for name in names]))
+            logins = service.embed_faces(torch.stack([reduced[name] for name in names]))
+        report["accuracy"] = compare(np.asarray(enrolled), np.asarray(logins), args.threshold)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    full, fast = report["preprocess_ms"]["full"], report["preprocess_ms"]["reduced"]
+    print(f"{report['faces']}/{report['images']} images with a face in both pipelines, "
+          f"{detection_mismatches} found by only one")
+    print(f"preprocess p50 {full['p50']} ms -> {fast['p50']} ms, p95 {full['p95']} ms -> {fast['p95']} ms")
+    if "accuracy" in report:
+        acc = report["accuracy"]
+        print(f"cosine drift mean {acc['cosine_drift']['mean']:.2e} max {acc['cosine_drift']['max']:.2e}, "
+              f"lowest own similarity {acc['own_similarity_min']:.3f}")
+        print(f"self-match failures {acc['self_match_failures']}/{report['faces']}, "
+              f"decision flips {acc['decision_flips']}/{acc['pairs']} at threshold {args.threshold}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+FaceNet backend calibration and benchmark
+
+Runs every inference backend from app.services.facenet_backends on the same
+inputs, each in its own process so RSS is measured in isolation, and reports:
+
+- per-image latency (batch of one) and peak RSS per backend
+- cosine drift of each backend's embeddings against the eager float32 baseline
+- how many pairwise match decisions at the login threshold flip vs the baseline
+
+Run from the backend directory:
+
+    python -m benchmarks.facenet_backends --images ./faces --threshold 0.6
+
+Without --images a seeded synthetic set is used, each random image paired
+with a lightly perturbed copy so some pairs land near the threshold. Real
+face crops give the meaningful accuracy numbers.
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+from app.services.facenet_backends import SUPPORTED_BACKENDS
+
+
+def _rss_mb() -> float:
+    """Current resident set size in MB"""
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def _peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load_inputs(images_dir: str, samples: int, seed: int) -> np.ndarray:
+    """(N, 3, 160, 160) float32 faces, preprocessed the same way as the API"""
+    if not images_dir:
+        rng = np.random.default_rng(seed)
+        base = rng.random((samples // 2, 3, 160, 160), dtype=np.float32)
+        noisy = np.clip(base + rng.normal(0, 0.02, base.shape).astype(np.float32), 0, 1)
+        return np.concatenate([base, noisy])
+
+    from PIL import Image
+    from facenet_pytorch import MTCNN
+
+    mtcnn = MTCNN()
+    faces = []
+    for name in sorted(os.listdir(images_dir)):
+        try:
+            image = Image.open(os.path.join(images_dir, name)).convert("RGB")
+        except Exception:
+            continue
+        boxes, _ = mtcnn.detect(image)
+        if boxes is None or len(boxes) == 0:
+            continue
+        face = image.crop(tuple(boxes[0])).resize((160, 160))
+        faces.append(np.asarray(face, dtype=np.float32).transpose(2, 0, 1) / 255.0)
+    if not faces:
+        sys.exit(f"No faces detected in {images_dir}")
+    return np.stack(faces)
+
+
+def run_backend(backend: str, inputs_path: str, output_path: str, iterations: int, threads: int) -> dict:
+    """Build one backend in this process, embed the inputs and time batch-of-one inference"""
+    import torch
+    from facenet_pytorch import InceptionResnetV1
+    from app.services.facenet_backends import build_facenet_backend
+
+    torch.set_num_threads(threads)
+    rss_before = _rss_mb()
+    model = InceptionResnetV1(pretrained="vggface2").eval()
+
+    started = time.perf_counter()
+    forward, actual = build_facenet_backend(model, backend, onnx_path=os.path.join(tempfile.gettempdir(), "facenet_bench.onnx"))
+    build_seconds = time.perf_counter() - started
+
+    inputs = torch.from_numpy(np.load(inputs_path))
+    embeddings = np.concatenate([forward(inputs[i:i + 1]) for i in range(len(inputs))])
+    np.save(output_path, embeddings.astype(np.float32))
+
+    latencies = []
+    for i in range(iterations):
+        sample = inputs[i % len(inputs):i % len(inputs) + 1]
+        started = time.perf_counter()
+        forward(sample)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    return {
+        "backend": backend,
+        "actual_backend": actual,
+        "build_seconds": round(build_seconds, 2),
+        "latency_ms": {
+            "mean": round(float(np.mean(latencies)), 2),
+            "p50": round(float(np.percentile(latencies, 50)), 2),
+            "p95": round(float(np.percentile(latencies, 95)), 2),
+        },
+        "rss_mb": round(_rss_mb(), 1),
+        "rss_model_mb": round(_rss_mb() - rss_before, 1),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+
+
+def _normalize(embeddings: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+def compare(baseline: np.ndarray, candidate: np.ndarray, threshold: float) -> dict:
+    """Cosine drift per input and pairwise decision flips at the threshold"""
+    baseline, candidate = _normalize(baseline), _normalize(candidate)
+    drift = 1.0 - np.sum(baseline * candidate, axis=1)
+
+    upper = np.triu_indices(len(baseline), k=1)
+    base_sim = (baseline @ baseline.T)[upper]
+    cand_sim = (candidate @ candidate.T)[upper]
+    flips = (base_sim > threshold) != (cand_sim > threshold)
+
+    return {
+        "cosine_drift": {
+            "mean": float(np.mean(drift)),
+            "max": float(np.max(drift)),
+        },
+        "pair_similarity_max_delta": float(np.max(np.abs(base_sim - cand_sim))) if len(base_sim) else 0.0,
+        "pairs": int(len(base_sim)),
+        "baseline_matches": int(np.sum(base_sim > threshold)),
+        "decision_flips": int(np.sum(flips)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default=",".join(SUPPORTED_BACKENDS))
+    parser.add_argument("--images", default="", help="directory of face images for calibration")
+    parser.add_argument("--samples", type=int, default=64, help="synthetic inputs when --images is not set")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=max(1, os.cpu_count() or 1))
+    parser.add_argument("--threshold", type=float, default=0.6)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--inputs-path", help=argparse.SUPPRESS)
+    parser.add_argument("--output-path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_backend(args.worker, args.inputs_path, args.output_path, args.iterations, args.threads)))
+        return
+
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    if "eager" in backends:
+        backends.remove("eager")
+    backends.insert(0, "eager")  # baseline first
+
+    with tempfile.TemporaryDirectory() as workdir:
+        inputs_path = os.path.join(workdir, "inputs.npy")
+        np.save(inputs_path, load_inputs(args.images, args.samples, args.seed))
+
+        results, baseline = [], None
+        for backend in backends:
+            output_path = os.path.join(workdir, f"{backend}.npy")
+            proc = subprocess.run(
+                [sys.executable, "-m", "benchmarks.facenet_backends", "--worker", backend,
+                 "--inputs-path", inputs_path, "--output-path", output_path,
+                 "--iterations", str(args.iterations), "--threads", str(args.threads)],
+                capture_output=True, text=True
+            )
+            if proc.returncode != 0:
+                results.append({"backend": backend, "error": proc.stderr.strip().splitlines()[-1:]})
+                continue
+
+            result = json.loads(proc.stdout.strip().splitlines()[-1])
+            embeddings = np.load(output_path)
+            if baseline is None:
+                baseline = embeddings
+            result["accuracy"] = compare(baseline, embeddings, args.threshold)
+            results.append(result)
+
+    if args.json:
+        print(json.dumps({"threshold": args.threshold, "results": results}, indent=2))
+        return
+
+    print(f"{'backend':<12} {'ran as':<12} {'p50 ms':>8} {'p95 ms':>8} {'rss MB':>8} {'drift mean':>11} {'drift max':>10} {'flips':>7}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['backend']:<12} failed: {' '.join(r['error'])}")
+            continue
+        acc = r["accuracy"]
+        print(f"{r['backend']:<12} {r['actual_backend']:<12} {r['latency_ms']['p50']:>8} {r['latency_ms']['p95']:>8} "
+              f"{r['rss_mb']:>8} {acc['cosine_drift']['mean']:>11.2e} {acc['cosine_drift']['max']:>10.2e} "
+              f"{acc['decision_flips']:>4}/{acc['pairs']}")
+    print(f"Decision flips are pairwise match decisions at threshold {args.threshold} that differ from eager float32")
+
+
+if __name__ == "__main__":
+    main()
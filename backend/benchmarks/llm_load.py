@@ -0,0 +1,217 @@
+"""
+LLM gateway load test
+
+Drives the backend's /api/v1/code/* and /api/v1/chat/* endpoints at fixed
+concurrency levels and reports, per scenario and level:
+
+- throughput in requests and generated tokens per second
+- latency p50/p95/p99, and time to first token for streaming endpoints
+  (first NDJSON line with text)
+- status code counts, so limiter rejections (429/503) and failures show up
+
+With --baseline the same load is sent straight to Ollama's /api/generate.
+The difference from the gateway numbers is the backend's own overhead.
+Point the backend at benchmarks/mock_ollama.py to measure the gateway and
+its concurrency limits independently of model speed:
+
+    python -m benchmarks.mock_ollama --port 11434 --ttft-ms 150 --tokens-per-second 40
+    OLLAMA_BASE_URL=http://127.0.0.1:11434 LLM_QUOTA_ENABLED=false RATE_LIMIT_PER_MINUTE=1000000 \\
+        uvicorn app.main:app --port 8000
+    python -m benchmarks.llm_load --scenarios code,code-stream,chat-stream --concurrency 1,8,32 --baseline
+
+Prompts are unique per request unless --prompt-pool is set, in which case
+requests cycle through that many prompts and exercise the response cache
+and request coalescing.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+import httpx
+import numpy as np
+
+API = "/api/v1"
+
+# name -> (path, streaming)
+SCENARIOS = {
+    "code": ("/code/generate", False),
+    "code-stream": ("/code/generate/stream", True),
+    "translate": ("/code/translate", False),
+    "translate-stream": ("/code/translate/stream", True),
+    "chat": ("/chat/generate", False),
+    "chat-stream": ("/chat/generate/stream", True),
+    "message": ("/chat/message", False),
+    "message-stream": ("/chat/message/stream", True),
+}
+
+
+def build_body(scenario: str, prompt: str, max_tokens: int, use_cache: bool) -> dict:
+    if scenario.startswith("code"):
+        return {"prompt": prompt, "language": "python", "max_tokens": max_tokens, "use_cache": use_cache}
+    if scenario.startswith("translate"):
+        return {"source_code": f"def f():\n    return '{prompt}'", "source_language": "python",
+                "target_language": "javascript", "use_cache": use_cache}
+    if scenario.startswith("chat"):
+        return {"messages": [{"role": "user", "content": prompt}], "max_tokens": max_tokens}
+    return {"message": prompt, "max_tokens": max_tokens}
+
+
+def summarize(values) -> dict:
+    if not values:
+        return {"count": 0}
+    values = np.asarray(values, dtype=np.float64)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "count": int(values.size),
+        "mean": round(float(values.mean()), 2),
+        "p50": round(float(p50), 2),
+        "p95": round(float(p95), 2),
+        "p99": round(float(p99), 2),
+    }
+
+
+async def _request(client: httpx.AsyncClient, path: str, body: dict, stream: bool) -> dict:
+    """One request, returns status, latency and TTFT in ms and generated tokens"""
+    started = time.perf_counter()
+    ttft = None
+    tokens = 0
+    try:
+        if not stream:
+            response = await client.post(path, json=body)
+            data = response.json() if response.headers.get("content-type", "").startswith("application/json") else {}
+            status = response.status_code
+            if status == 200 and "error" in data:
+                status = "error"
+            tokens = data.get("eval_count") or data.get("tokens_generated") or 0
+        else:
+            async with client.stream("POST", path, json=body) as response:
+                status = response.status_code
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    event = json.loads(line)
+                    if "error" in event:
+                        status = "error"
+                        break
+                    text = event.get("response") or (event.get("message") or {}).get("content")
+                    if ttft is None and text:
+                        ttft = (time.perf_counter() - started) * 1000
+                    if event.get("done"):
+                        tokens = event.get("eval_count") or 0
+                        break
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    latency = (time.perf_counter() - started) * 1000
+    return {"status": status, "latency": latency, "ttft": ttft, "tokens": tokens}
+
+
+async def run_level(url: str, scenario: str, concurrency: int, requests: int, duration: float,
+                    prompt_pool: int, max_tokens: int, use_cache: bool, direct: bool, model: str) -> dict:
+    path, stream = SCENARIOS[scenario]
+    run_id = uuid.uuid4().hex[:8]
+    counter = iter(range(10 ** 12))
+    results = []
+    deadline = time.perf_counter() + duration if duration else None
+
+    def next_body(index: int):
+        key = index % prompt_pool if prompt_pool else index
+        prompt = f"Write a function that returns the {key}th prime number ({run_id if not prompt_pool else 'pool'})"
+        if direct:
+            return "/api/generate", {"model": model, "prompt": prompt, "stream": stream,
+                                     "options": {"num_predict": max_tokens}}
+        return API + path, build_body(scenario, prompt, max_tokens, use_cache)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    timeout = httpx.Timeout(connect=10.0, read=600.0, write=10.0, pool=600.0)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=timeout) as client:
+        async def worker():
+            for index in counter:
+                if deadline is not None:
+                    if time.perf_counter() >= deadline:
+                        return
+                elif index >= requests:
+                    return
+                request_path, body = next_body(index)
+                results.append(await _request(client, request_path, body, stream))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - started
+
+    statuses = {}
+    for result in results:
+        statuses[str(result["status"])] = statuses.get(str(result["status"]), 0) + 1
+    ok = [result for result in results if result["status"] == 200]
+    tokens = sum(result["tokens"] for result in ok)
+    return {
+        "scenario": scenario,
+        "target": "ollama" if direct else "gateway",
+        "stream": stream,
+        "concurrency": concurrency,
+        "requests": len(results),
+        "wall_seconds": round(wall, 3),
+        "statuses": statuses,
+        "throughput_rps": round(len(ok) / wall, 2) if wall > 0 else None,
+        "tokens_per_second": round(tokens / wall, 2) if wall > 0 else None,
+        "latency_ms": summarize([result["latency"] for result in ok]),
+        "ttft_ms": summarize([result["ttft"] for result in ok if result["ttft"] is not None]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="backend base URL")
+    parser.add_argument("--ollama-url", default="http://127.0.0.1:11434", help="Ollama or mock URL for --baseline")
+    parser.add_argument("--model", default="codellama:7b")
+    parser.add_argument("--scenarios", default="code,code-stream,chat,chat-stream",
+                        help=f"comma separated, from {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", default="1,8,32")
+    parser.add_argument("--requests", type=int, default=64, help="requests per scenario and level")
+    parser.add_argument("--duration", type=float, default=0.0, help="run each level for this many seconds instead")
+    parser.add_argument("--max-tokens", type=int, default=128)
+    parser.add_argument("--prompt-pool", type=int, default=0, help="cycle through this many prompts, 0 = all unique")
+    parser.add_argument("--no-cache", action="store_true", help="send use_cache=false")
+    parser.add_argument("--baseline", action="store_true", help="also load Ollama's /api/generate directly")
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(unknown)}")
+    levels = [int(level) for level in args.concurrency.split(",") if level.strip()]
+
+    results = []
+    for scenario in scenarios:
+        for concurrency in levels:
+            targets = [(args.url, False)]
+            if args.baseline:
+                targets.append((args.ollama_url, True))
+            for url, direct in targets:
+                result = asyncio.run(run_level(
+                    url, scenario, concurrency, args.requests, args.duration, args.prompt_pool,
+                    args.max_tokens, not args.no_cache, direct, args.model
+                ))
+                results.append(result)
+                latency, ttft = result["latency_ms"], result["ttft_ms"]
+                line = (f"{scenario:<17} {result['target']:<7} c={concurrency:<3} "
+                        f"{result['throughput_rps']:>8.2f} req/s {result['tokens_per_second']:>9.1f} tok/s")
+                if latency.get("count"):
+                    line += f"  p50 {latency['p50']:>8.1f}  p95 {latency['p95']:>8.1f}  p99 {latency['p99']:>8.1f} ms"
+                if ttft.get("count"):
+                    line += f"  ttft p50 {ttft['p50']:>7.1f}  p99 {ttft['p99']:>7.1f} ms"
+                if set(result["statuses"]) != {"200"}:
+                    line += f"  statuses {result['statuses']}"
+                print(line)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
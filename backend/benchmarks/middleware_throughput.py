@@ -0,0 +1,175 @@
+"""
+Middleware stack throughput benchmark
+
+Serves GET /health through two otherwise identical FastAPI apps and reports
+requests per second for each:
+
+- legacy: the previous stack, SecurityHeadersMiddleware as a
+  BaseHTTPMiddleware plus @app.middleware("http") wrappers for rate
+  limiting and validation
+- asgi: the plain ASGI middleware from app.middlewares
+
+Requests are driven in-process through the ASGI interface, so the numbers
+measure framework and middleware overhead without sockets or an HTTP
+parser. Both stacks use an in-memory limiter with a limit high enough that
+nothing is rejected, plus the same CORS middleware.
+
+    python -m benchmarks.middleware_throughput --requests 20000 --concurrency 32
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.middlewares.rate_limit import MemoryRateLimitBackend, RateLimiter, RateLimitMiddleware
+from app.middlewares.security import SECURITY_HEADERS, SecurityHeadersMiddleware
+from app.middlewares.validation import InputValidationMiddleware, ValidationMiddleware
+
+UNLIMITED = 10 ** 12
+
+
+class LegacySecurityHeadersMiddleware(BaseHTTPMiddleware):
+    """The previous implementation, kept here as the baseline"""
+
+    async def dispatch(self, request: Request, call_next):
+        response = await call_next(request)
+        for name, value in SECURITY_HEADERS.items():
+            response.headers[name] = value
+        return response
+
+
+def _add_cors_and_health(app: FastAPI):
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["http://localhost:3000"],
+        allow_credentials=True,
+        allow_methods=["GET", "POST"],
+        allow_headers=["Content-Type", "Authorization"],
+    )
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+
+def legacy_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(LegacySecurityHeadersMiddleware)
+    _add_cors_and_health(app)
+    backend = MemoryRateLimitBackend(RateLimiter(requests_per_minute=UNLIMITED))
+
+    @app.middleware("http")
+    async def apply_rate_limit(request, call_next):
+        allowed, retry_after = await backend.hit(request.client.host)
+        if not allowed:
+            return JSONResponse(status_code=429, content={"detail": "Too many requests."},
+                                headers={"Retry-After": str(retry_after)})
+        return await call_next(request)
+
+    @app.middleware("http")
+    async def apply_validation(request, call_next):
+        try:
+            InputValidationMiddleware.validate_request(request)
+        except Exception:
+            return JSONResponse(status_code=400, content={"detail": "Invalid request format."})
+        return await call_next(request)
+
+    return app
+
+
+def asgi_app() -> FastAPI:
+    app = FastAPI()
+    _add_cors_and_health(app)
+    app.add_middleware(RateLimitMiddleware, backend=MemoryRateLimitBackend(RateLimiter(requests_per_minute=UNLIMITED)))
+    app.add_middleware(ValidationMiddleware)
+    app.add_middleware(SecurityHeadersMiddleware)
+    return app
+
+
+def _scope(index: int) -> dict:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/health",
+        "raw_path": b"/health",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"localhost"), (b"user-agent", b"bench")],
+        "client": (f"10.0.{(index >> 8) & 255}.{index & 255}", 40000),
+        "server": ("127.0.0.1", 8000),
+    }
+
+
+async def _call(app, index: int):
+    status = None
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(_scope(index), receive, send)
+    if status != 200:
+        raise RuntimeError(f"/health answered {status}")
+
+
+async def measure(app, requests: int, concurrency: int) -> float:
+    """Requests per second for /health with `concurrency` requests in flight"""
+    # Warm-up builds the middleware stack and route caches
+    for i in range(100):
+        await _call(app, i)
+
+    counter = iter(range(requests))
+
+    async def client():
+        for index in counter:
+            await _call(app, index)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return requests / (time.perf_counter() - started)
+
+
+async def run(args) -> dict:
+    stacks = {"legacy": legacy_app(), "asgi": asgi_app()}
+    rates = {name: [] for name in stacks}
+    # Alternate the stacks so drift in machine load affects both alike
+    for _ in range(args.repeat):
+        for name, app in stacks.items():
+            rates[name].append(await measure(app, args.requests, args.concurrency))
+    return {name: max(values) for name, values in rates.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    report["speedup"] = report["asgi"] / report["legacy"]
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"legacy  {report['legacy']:>10,.0f} req/s")
+    print(f"asgi    {report['asgi']:>10,.0f} req/s")
+    print(f"speedup {report['speedup']:>10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
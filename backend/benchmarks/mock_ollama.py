@@ -0,0 +1,301 @@
+"""
+Mock Ollama server
+
+A local stand-in for Ollama implementing the endpoints the backend uses,
+/api/tags, /api/generate, /api/chat and /api/pull, so the LLM gateway can
+be load-tested on machines without a GPU or model weights. Generation is
+simulated with configurable timing instead of a model:
+
+- time to first token: a fixed --ttft-ms plus prompt tokens at
+  --prompt-tokens-per-second, and --load-ms once per model (cold load)
+- --tokens-per-second for the generated tokens, --jitter on every delay
+- --parallel generations at a time, further requests queue like
+  OLLAMA_NUM_PARALLEL
+- --error-rate for HTTP 500 before any output and --stream-error-rate for
+  streams that fail midway with an error line
+- --tokens-per-chunk and --response-tokens for the streaming shape
+
+Responses carry the usual eval counts, nanosecond durations and a prompt
+context array, so clients and metrics see realistic fields. Prompt tokens
+are estimated as characters / 4. A request with a context array continues
+it like a warm prompt cache: only the new prompt counts towards
+prompt_eval_count and the returned context grows by prompt plus output.
+
+    python -m benchmarks.mock_ollama --port 11434 --ttft-ms 150 --tokens-per-second 40
+    OLLAMA_BASE_URL=http://127.0.0.1:11434 uvicorn app.main:app --port 8000
+
+GET /mock/stats reports request, queue and error counters.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timezone
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Generated text is cycled from this snippet, split into roughly token-sized pieces
+_TOKENS = (
+    "def", " fibonacci", "(n", "):", "\n", "   ", " if", " n", " <", " 2", ":", "\n", "       ", " return", " n",
+    "\n", "   ", " return", " fibonacci", "(n", " -", " 1", ")", " +", " fibonacci", "(n", " -", " 2", ")", "\n",
+)
+
+
+class MockOllamaConfig:
+    def __init__(self, model: str = "codellama:7b", ttft_ms: float = 150.0, prompt_tokens_per_second: float = 0.0,
+                 tokens_per_second: float = 40.0, response_tokens: int = 128, tokens_per_chunk: int = 1,
+                 parallel: int = 4, load_ms: float = 0.0, jitter: float = 0.1, error_rate: float = 0.0,
+                 stream_error_rate: float = 0.0, seed: int = None):
+        self.model = model
+        self.ttft_ms = ttft_ms
+        self.prompt_tokens_per_second = prompt_tokens_per_second
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.tokens_per_chunk = max(1, tokens_per_chunk)
+        self.parallel = max(1, parallel)
+        self.load_ms = load_ms
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.stream_error_rate = stream_error_rate
+        self.seed = seed
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _prompt_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class MockOllama:
+    """Simulated generation state shared by the endpoints"""
+
+    def __init__(self, config: MockOllamaConfig):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.slots = asyncio.Semaphore(config.parallel)
+        self.models = {config.model}
+        self.loaded = set()
+        self.requests = 0
+        self.active = 0
+        self.queued = 0
+        self.errors = 0
+        self.stream_errors = 0
+
+    def _delay(self, seconds: float) -> float:
+        jitter = self.config.jitter
+        if jitter > 0:
+            seconds *= self.random.uniform(1.0 - jitter, 1.0 + jitter)
+        return max(0.0, seconds)
+
+    def _eval_tokens(self, options: dict) -> int:
+        limit = options.get("num_predict")
+        tokens = self.config.response_tokens
+        if isinstance(limit, int) and limit > 0:
+            tokens = min(tokens, limit)
+        return max(1, tokens)
+
+    def _fails(self, rate: float) -> bool:
+        return rate > 0 and self.random.random() < rate
+
+    async def _start(self, model: str, prompt_tokens: int) -> dict:
+        """Wait for a slot, then for model load and prompt evaluation, returns the durations in ns"""
+        self.requests += 1
+        self.queued += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.queued -= 1
+        self.active += 1
+
+        load = 0.0
+        if model not in self.loaded:
+            load = self._delay(self.config.load_ms / 1000)
+            self.loaded.add(model)
+        prompt_eval = self.config.ttft_ms / 1000
+        if self.config.prompt_tokens_per_second > 0:
+            prompt_eval += prompt_tokens / self.config.prompt_tokens_per_second
+        prompt_eval = self._delay(prompt_eval)
+        await asyncio.sleep(load + prompt_eval)
+        return {"load_duration": int(load * 1e9), "prompt_eval_duration": int(prompt_eval * 1e9)}
+
+    def _finish(self):
+        self.active -= 1
+        self.slots.release()
+
+    async def _tokens(self, count: int):
+        """Yield pieces of tokens_per_chunk tokens at tokens_per_second"""
+        per_token = 1.0 / self.config.tokens_per_second if self.config.tokens_per_second > 0 else 0.0
+        emitted = 0
+        while emitted < count:
+            size = min(self.config.tokens_per_chunk, count - emitted)
+            await asyncio.sleep(self._delay(per_token * size))
+            yield "".join(_TOKENS[(emitted + i) % len(_TOKENS)] for i in range(size)), size
+            emitted += size
+
+    def _final(self, model: str, prompt_tokens: int, eval_tokens: int, durations: dict,
+               started: float, eval_started: float, done_reason: str) -> dict:
+        now = time.perf_counter()
+        return {
+            "model": model,
+            "created_at": _now(),
+            "done": True,
+            "done_reason": done_reason,
+            "total_duration": int((now - started) * 1e9),
+            "load_duration": durations["load_duration"],
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": durations["prompt_eval_duration"],
+            "eval_count": eval_tokens,
+            "eval_duration": int((now - eval_started) * 1e9),
+        }
+
+    async def generate(self, body: dict, chat: bool):
+        """Serve /api/generate or /api/chat, JSON or NDJSON stream"""
+        model = body.get("model") or self.config.model
+        if chat:
+            prompt = "".join(message.get("content", "") for message in body.get("messages", []))
+        else:
+            prompt = (body.get("system") or "") + (body.get("prompt") or "")
+        prompt_tokens = _prompt_tokens(prompt)
+        eval_tokens = self._eval_tokens(body.get("options") or {})
+        done_reason = "length" if eval_tokens == (body.get("options") or {}).get("num_predict") else "stop"
+
+        if model not in self.models:
+            self.errors += 1
+            return JSONResponse(status_code=404, content={"error": f"model '{model}' not found, try pulling it first"})
+        if self._fails(self.config.error_rate):
+            self.errors += 1
+            return JSONResponse(status_code=500, content={"error": "mock generation failure"})
+
+        def piece(text: str) -> dict:
+            if chat:
+                return {"message": {"role": "assistant", "content": text}}
+            return {"response": text}
+
+        def final(durations, started, eval_started, text: str = "") -> dict:
+            event = {**self._final(model, prompt_tokens, eval_tokens, durations, started, eval_started, done_reason),
+                     **piece(text)}
+            if not chat:
+                event["context"] = list(body.get("context") or []) + list(range(prompt_tokens + eval_tokens))
+            return event
+
+        started = time.perf_counter()
+        if not body.get("stream", True):
+            durations = await self._start(model, prompt_tokens)
+            try:
+                eval_started = time.perf_counter()
+                text = "".join([text async for text, _ in self._tokens(eval_tokens)])
+                return JSONResponse(final(durations, started, eval_started, text))
+            finally:
+                self._finish()
+
+        fail_at = self.random.randint(1, eval_tokens) if self._fails(self.config.stream_error_rate) else None
+
+        async def stream():
+            durations = await self._start(model, prompt_tokens)
+            try:
+                eval_started = time.perf_counter()
+                emitted = 0
+                async for text, size in self._tokens(eval_tokens):
+                    emitted += size
+                    if fail_at is not None and emitted >= fail_at:
+                        self.stream_errors += 1
+                        yield json.dumps({"error": "mock stream failure"}) + "\n"
+                        return
+                    yield json.dumps({"model": model, "created_at": _now(), **piece(text), "done": False}) + "\n"
+                yield json.dumps(final(durations, started, eval_started)) + "\n"
+            finally:
+                self._finish()
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "active": self.active,
+            "queued": self.queued,
+            "errors": self.errors,
+            "stream_errors": self.stream_errors,
+            "parallel": self.config.parallel,
+            "models": sorted(self.models),
+        }
+
+
+def create_app(config: MockOllamaConfig) -> FastAPI:
+    app = FastAPI(title="Mock Ollama")
+    mock = MockOllama(config)
+    app.state.mock = mock
+
+    @app.get("/api/tags")
+    async def tags():
+        return {
+            "models": [
+                {"name": name, "model": name, "modified_at": _now(), "size": 3825819519,
+                 "digest": "mock", "details": {"format": "gguf", "family": "llama"}}
+                for name in sorted(mock.models)
+            ]
+        }
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        return await mock.generate(await request.json(), chat=False)
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        return await mock.generate(await request.json(), chat=True)
+
+    @app.post("/api/pull")
+    async def pull(request: Request):
+        body = await request.json()
+        name = body.get("model") or body.get("name") or config.model
+        mock.models.add(name)
+        statuses = ["pulling manifest", "verifying sha256 digest", "writing manifest", "success"]
+        if not body.get("stream", True):
+            return {"status": "success"}
+        return StreamingResponse(
+            (json.dumps({"status": status}) + "\n" for status in statuses),
+            media_type="application/x-ndjson"
+        )
+
+    @app.get("/mock/stats")
+    async def stats():
+        return mock.stats()
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--model", default="codellama:7b")
+    parser.add_argument("--ttft-ms", type=float, default=150.0)
+    parser.add_argument("--prompt-tokens-per-second", type=float, default=0.0, help="0 leaves TTFT independent of prompt length")
+    parser.add_argument("--tokens-per-second", type=float, default=40.0)
+    parser.add_argument("--response-tokens", type=int, default=128, help="tokens generated unless num_predict is lower")
+    parser.add_argument("--tokens-per-chunk", type=int, default=1)
+    parser.add_argument("--parallel", type=int, default=4, help="concurrent generations, more requests queue")
+    parser.add_argument("--load-ms", type=float, default=0.0, help="cold model load on first use")
+    parser.add_argument("--jitter", type=float, default=0.1, help="relative random variation of every delay")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--stream-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    config = MockOllamaConfig(
+        model=args.model, ttft_ms=args.ttft_ms, prompt_tokens_per_second=args.prompt_tokens_per_second,
+        tokens_per_second=args.tokens_per_second, response_tokens=args.response_tokens,
+        tokens_per_chunk=args.tokens_per_chunk, parallel=args.parallel, load_ms=args.load_ms,
+        jitter=args.jitter, error_rate=args.error_rate, stream_error_rate=args.stream_error_rate, seed=args.seed
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Rate limit backend consistency check
+
+Drives the shared-store backends with simulated time (injected `now`
+values) and compares every decision and Retry-After with the in-memory
+token bucket. The traffic covers a full burst, steady requests at and
+above the refill rate, idle gaps long enough to refill completely, and a
+few clients interleaved, so it runs in well under a second.
+
+    python -m benchmarks.rate_limit_backends --rpm 60 --burst 10
+
+The SQLite backend runs against a temporary file. With --redis-url, or
+fakeredis installed, the Redis backend is driven through the same traffic.
+It does not apply a burst, and its sliding window weights the previous
+minute, so it is reported against an exact 60 second window rather than
+checked.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+
+from app.middlewares.rate_limit import (
+    MemoryRateLimitBackend,
+    RateLimiter,
+    RedisRateLimitBackend,
+    SQLiteRateLimitBackend,
+)
+
+
+def traffic(rpm: int, burst: int, clients: int, seed: int) -> list:
+    """(now, key) pairs in time order"""
+    rng = random.Random(seed)
+    rate = rpm / 60.0
+    refill = burst / rate
+    now = 1_000_000.0
+    events = []
+    for key in (f"10.0.0.{i}" for i in range(clients)):
+        events += [(now, key)] * (burst + 3)  # burst and a few rejections
+    for step in range(rpm * 3):
+        key = f"10.0.0.{rng.randrange(clients)}"
+        now += rng.choice((0.0, 0.5, 1.0, 2.0)) / rate
+        events.append((now, key))
+        if step % rpm == rpm - 1:
+            now += refill + 1.0  # idle long enough to refill every bucket
+    return events
+
+
+async def replay(backend, events: list) -> list:
+    return [await backend.hit(key, now=now) for now, key in events]
+
+
+def window_limit_violations(events: list, decisions: list, rpm: int) -> int:
+    """Allowed requests beyond rpm within an exact 60 second window"""
+    allowed = {}
+    violations = 0
+    for (now, key), (ok, _) in zip(events, decisions):
+        if not ok:
+            continue
+        times = [t for t in allowed.get(key, []) if t > now - 60]
+        times.append(now)
+        allowed[key] = times
+        violations += len(times) > rpm
+    return violations
+
+
+async def check(args) -> bool:
+    events = traffic(args.rpm, args.burst, args.clients, args.seed)
+    reference = await replay(MemoryRateLimitBackend(RateLimiter(args.rpm, burst=args.burst)), events)
+    print(f"{len(events)} requests from {args.clients} clients, {args.rpm}/min, burst {args.burst}, "
+          f"{sum(not ok for ok, _ in reference)} rejected by the memory backend")
+
+    passed = True
+    with tempfile.TemporaryDirectory() as tmp:
+        sqlite = SQLiteRateLimitBackend(os.path.join(tmp, "rate-limit.db"), args.rpm, burst=args.burst)
+        decisions = await replay(sqlite, events)
+        stats = await sqlite.stats()
+        await sqlite.close()
+    mismatches = [
+        (now, key, expected, got)
+        for (now, key), expected, got in zip(events, reference, decisions)
+        if expected != got
+    ]
+    print(f"sqlite: {len(mismatches)} decisions differ from memory, {stats['keys']} keys stored")
+    for now, key, expected, got in mismatches[:5]:
+        print(f"  t={now:.2f} {key}: memory {expected}, sqlite {got}")
+    passed &= not mismatches
+
+    client = None
+    if args.redis_url:
+        import redis.asyncio as redis
+
+        client = redis.from_url(args.redis_url)
+    else:
+        try:
+            import fakeredis
+
+            client = fakeredis.FakeAsyncRedis()
+        except ImportError:
+            print("redis: skipped, pass --redis-url or install fakeredis")
+    if client is not None:
+        # A fresh prefix per run, keys expire after two windows
+        prefix = f"rl-check:{os.getpid()}:{random.getrandbits(32):08x}:"
+        redis_backend = RedisRateLimitBackend(requests_per_minute=args.rpm, prefix=prefix, client=client)
+        decisions = await replay(redis_backend, events)
+        await redis_backend.close()
+        violations = window_limit_violations(events, decisions, args.rpm)
+        print(f"redis: {sum(not ok for ok, _ in decisions)} rejected, "
+              f"{violations} allowed beyond {args.rpm} in an exact 60s window")
+
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rpm", type=int, default=60)
+    parser.add_argument("--burst", type=int, default=10)
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--redis-url", default="", help="check against a real Redis")
+    args = parser.parse_args()
+
+    if not asyncio.run(check(args)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
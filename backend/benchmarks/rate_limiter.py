@@ -0,0 +1,94 @@
+"""
+Rate limiter microbenchmark
+
+Compares the token bucket limiter against the previous list-of-timestamps
+implementation under a stream of distinct client IPs, reporting the mean
+cost per check and the memory held by the key table (tracemalloc).
+
+    python -m benchmarks.rate_limiter --ips 1000000 --max-keys 100000
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+from collections import defaultdict
+
+from app.middlewares.rate_limit import RateLimiter
+
+
+class ListRateLimiter:
+    """The previous implementation, kept here as the baseline"""
+
+    def __init__(self, requests_per_minute: int = 60):
+        self.requests_per_minute = requests_per_minute
+        self.requests = defaultdict(list)
+
+    def is_allowed(self, client_ip: str) -> bool:
+        now = time.time()
+        minute_ago = now - 60
+        self.requests[client_ip] = [t for t in self.requests[client_ip] if t > minute_ago]
+        if len(self.requests[client_ip]) >= self.requests_per_minute:
+            return False
+        self.requests[client_ip].append(now)
+        return True
+
+
+def _ips(count: int):
+    return [f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}" if i < 1 << 24 else f"ip-{i}" for i in range(count)]
+
+
+def run(name: str, factory, ips, hot_requests: int):
+    """
+    Time one check per distinct IP, then repeated checks from a single hot IP,
+    and measure the key table on a second, traced pass (tracemalloc slows every allocation)
+    """
+    limiter = factory()
+    gc.collect()
+    started = time.perf_counter()
+    for ip in ips:
+        limiter.is_allowed(ip)
+    distinct_ns = (time.perf_counter() - started) / len(ips) * 1e9
+
+    # A client at its limit, the old implementation rebuilds its whole list each time
+    hot = ips[0]
+    started = time.perf_counter()
+    for _ in range(hot_requests):
+        limiter.is_allowed(hot)
+    hot_ns = (time.perf_counter() - started) / hot_requests * 1e9
+    del limiter
+
+    gc.collect()
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    limiter = factory()
+    for ip in ips:
+        limiter.is_allowed(ip)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    keys = len(limiter.buckets) if hasattr(limiter, "buckets") else len(limiter.requests)
+    print(f"{name:<28} {distinct_ns:>10.0f} {hot_ns:>10.0f} {keys:>10} "
+          f"{(current - baseline) / 1e6:>10.1f} {(peak - baseline) / 1e6:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ips", type=int, default=1_000_000)
+    parser.add_argument("--rpm", type=int, default=60)
+    parser.add_argument("--max-keys", type=int, default=100_000)
+    parser.add_argument("--hot-requests", type=int, default=100_000)
+    parser.add_argument("--skip-baseline", action="store_true", help="skip the list-based limiter")
+    args = parser.parse_args()
+
+    ips = _ips(args.ips)
+    print(f"{args.ips} distinct IPs, {args.rpm} requests/minute")
+    print(f"{'limiter':<28} {'ns/check':>10} {'hot ns':>10} {'keys':>10} {'held MB':>10} {'peak MB':>10}")
+    run(f"token bucket (max {args.max_keys})", lambda: RateLimiter(args.rpm, max_keys=args.max_keys), ips, args.hot_requests)
+    run("token bucket (unbounded)", lambda: RateLimiter(args.rpm, max_keys=args.ips), ips, args.hot_requests)
+    if not args.skip_baseline:
+        run("timestamp lists (previous)", lambda: ListRateLimiter(args.rpm), ips, args.hot_requests)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,34 +4,101 @@ Ollama Client for CodeLlama 7B Model Integration
 Handles model loading, text generation, and code completion
 """
 
+import asyncio
 import requests
+import httpx
 import json
 import time
 import os
-from typing import Dict, List, Optional, Any
+from typing import AsyncIterator, Callable, Dict, List, Optional, Any
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+DEFAULT_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+DEFAULT_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", "120"))
+DEFAULT_TOTAL_TIMEOUT = float(os.getenv("OLLAMA_TOTAL_TIMEOUT", "300"))
+
+def _resolve_base_url(base_url: Optional[str]) -> str:
+    """Return the Ollama base URL, falling back to the environment"""
+    if base_url is None:
+        base_url = os.getenv("OLLAMA_BASE_URL")
+        if not base_url:
+            raise ValueError("OLLAMA_BASE_URL environment variable must be set")
+    return base_url.rstrip('/')
+
+def _build_generate_payload(model_name: str, prompt: str, system_prompt: Optional[str],
+                            max_tokens: int, temperature: float, top_p: float,
+                            stream: bool, context: Optional[List[int]] = None,
+                            keep_alive: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Build the /api/generate request body. context is the token array returned
+    by a previous generation, so a follow-up prompt continues that conversation
+    without resending it, keep_alive keeps the model and its cache loaded.
+    """
+    payload = {
+        "model": model_name,
+        "prompt": prompt,
+        "stream": stream,
+        "options": {
+            "num_predict": max_tokens,
+            "temperature": temperature,
+            "top_p": top_p
+        }
+    }
+    
+    if system_prompt:
+        payload["system"] = system_prompt
+    if context:
+        payload["context"] = context
+    if keep_alive:
+        payload["keep_alive"] = keep_alive
+    return payload
+
+def _code_system_prompt(language: str) -> str:
+    """System prompt used for code completion"""
+    return f"You are a helpful coding assistant. Generate code in {language} language. Only provide the code without explanations."
+
+def _messages_to_prompt(messages: List[Dict[str, str]]):
+    """
+    Convert chat messages to a single prompt string
+    
+    Returns:
+        Tuple of (prompt, system_prompt or None)
+    """
+    prompt = ""
+    system_prompt = None
+    for message in messages:
+        role = message.get('role', 'user')
+        content = message.get('content', '')
+        if role == 'system':
+            system_prompt = content
+        elif role == 'user':
+            prompt += f"User: {content}\n"
+        elif role == 'assistant':
+            prompt += f"Assistant: {content}\n"
+    
+    prompt += "Assistant: "
+    return prompt, system_prompt
+
 class OllamaClient:
-    def __init__(self, base_url: str = None, model_name: str = "codellama:7b"):
+    def __init__(self, base_url: str = None, model_name: str = "codellama:7b",
+                 connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: float = DEFAULT_READ_TIMEOUT):
         """
         Initialize Ollama client
         
         Args:
             base_url: Ollama server URL (default: from environment variable)
             model_name: Model name to use (default: codellama:7b)
+            connect_timeout: Seconds to wait for a connection
+            read_timeout: Seconds to wait between bytes of a response
         """
-        # Get base_url from env
-        if base_url is None:
-            base_url = os.getenv("OLLAMA_BASE_URL")
-            if not base_url:
-                raise ValueError("OLLAMA_BASE_URL environment variable must be set")
-        
-        self.base_url = base_url.rstrip('/')
+        self.base_url = _resolve_base_url(base_url)
         self.model_name = model_name
+        self.timeout = (connect_timeout, read_timeout)
         self.session = requests.Session()
         
         logger.info(f"Initialized Ollama client with base_url: {self.base_url}")
@@ -44,7 +111,7 @@ class OllamaClient:
             bool: True if server is accessible, False otherwise
         """
         try:
-            response = self.session.get(f"{self.base_url}/api/tags")
+            response = self.session.get(f"{self.base_url}/api/tags", timeout=self.timeout)
             return response.status_code == 200
         except requests.exceptions.RequestException as e:
             logger.error(f"Failed to connect to Ollama server: {e}")
@@ -58,7 +125,7 @@ class OllamaClient:
             List of model information dictionaries
         """
         try:
-            response = self.session.get(f"{self.base_url}/api/tags")
+            response = self.session.get(f"{self.base_url}/api/tags", timeout=self.timeout)
             if response.status_code == 200:
                 return response.json().get("models", [])
             else:
@@ -84,7 +151,8 @@ class OllamaClient:
             logger.info(f"Pulling model: {model_to_pull}")
             response = self.session.post(
                 f"{self.base_url}/api/pull",
-                json={"name": model_to_pull}
+                json={"name": model_to_pull},
+                timeout=(self.timeout[0], None)
             )
             
             if response.status_code == 200:
@@ -115,26 +183,17 @@ class OllamaClient:
         Returns:
             Dictionary containing generated text and metadata
         """
-        payload = {
-            "model": self.model_name,
-            "prompt": prompt,
-            "stream": stream,
-            "options": {
-                "num_predict": max_tokens,
-                "temperature": temperature,
-                "top_p": top_p
-            }
-        }
-        
-        if system_prompt:
-            payload["system"] = system_prompt
+        payload = _build_generate_payload(
+            self.model_name, prompt, system_prompt, max_tokens, temperature, top_p, stream
+        )
         
         try:
             logger.info(f"Generating text with prompt length: {len(prompt)}")
             response = self.session.post(
                 f"{self.base_url}/api/generate",
                 json=payload,
-                stream=stream
+                stream=stream,
+                timeout=self.timeout
             )
             
             if response.status_code == 200:
@@ -162,7 +221,7 @@ class OllamaClient:
         Returns:
             Dictionary with combined response and metadata
         """
-        full_response = ""
+        chunks = []
         response_data = {}
         
         for line in response.iter_lines():
@@ -170,14 +229,14 @@ class OllamaClient:
                 try:
                     data = json.loads(line.decode('utf-8'))
                     if 'response' in data:
-                        full_response += data['response']
+                        chunks.append(data['response'])
                     if 'done' in data and data['done']:
                         response_data = data
                         break
                 except json.JSONDecodeError:
                     continue
         
-        response_data['response'] = full_response
+        response_data['response'] = "".join(chunks)
         return response_data
     
     def code_completion(self, code_prompt: str, language: str = "python", 
@@ -194,11 +253,9 @@ class OllamaClient:
         Returns:
             Dictionary with completed code
         """
-        system_prompt = f"You are a helpful coding assistant. Generate code in {language} language. Only provide the code without explanations."
-        
         return self.generate_text(
             prompt=code_prompt,
-            system_prompt=system_prompt,
+            system_prompt=_code_system_prompt(language),
             max_tokens=max_tokens,
             temperature=temperature
         )
@@ -217,22 +274,355 @@ class OllamaClient:
             Dictionary with chat response
         """
         # Convert messages to prompt format
-        prompt = ""
-        for message in messages:
-            role = message.get('role', 'user')
-            content = message.get('content', '')
-            if role == 'system':
-                system_prompt = content
-            elif role == 'user':
-                prompt += f"User: {content}\n"
-            elif role == 'assistant':
-                prompt += f"Assistant: {content}\n"
-        
-        prompt += "Assistant: "
+        prompt, system_prompt = _messages_to_prompt(messages)
         
         return self.generate_text(
             prompt=prompt,
-            system_prompt=system_prompt if 'system_prompt' in locals() else None,
+            system_prompt=system_prompt,
+            max_tokens=max_tokens,
+            temperature=temperature
+        )
+
+class AsyncOllamaClient:
+    def __init__(self, base_url: str = None, model_name: str = "codellama:7b",
+                 max_connections: int = 10, max_keepalive_connections: int = 5,
+                 keepalive_expiry: float = 30.0,
+                 connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: float = DEFAULT_READ_TIMEOUT,
+                 total_timeout: float = DEFAULT_TOTAL_TIMEOUT,
+                 observer: Optional[Callable[[Dict[str, Any]], None]] = None):
+        """
+        Initialize asyncio Ollama client
+        
+        Requests share a bounded keep-alive connection pool. Cancelling the
+        awaiting task aborts the in-flight HTTP request and frees its connection.
+        
+        Args:
+            base_url: Ollama server URL (default: from environment variable)
+            model_name: Model name to use (default: codellama:7b)
+            max_connections: Maximum open connections to Ollama
+            max_keepalive_connections: Idle connections kept for reuse
+            keepalive_expiry: Seconds an idle connection is kept
+            connect_timeout: Seconds to wait for a connection
+            read_timeout: Seconds to wait between bytes of a response
+            total_timeout: Upper bound in seconds for a whole generation
+            observer: Called after each generation with a dict of model,
+                stream, elapsed and ttft seconds (None when not measured)
+                and the final result or chunk, e.g. to record metrics
+        """
+        self.base_url = _resolve_base_url(base_url)
+        self.model_name = model_name
+        self.total_timeout = total_timeout
+        self.observer = observer
+        self.connect_timeout = connect_timeout
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry
+            ),
+            timeout=httpx.Timeout(
+                connect=connect_timeout,
+                read=read_timeout,
+                write=connect_timeout,
+                pool=connect_timeout
+            )
+        )
+        
+        logger.info(f"Initialized async Ollama client with base_url: {self.base_url}")
+    
+    async def aclose(self):
+        """Close pooled connections"""
+        await self.client.aclose()
+    
+    async def __aenter__(self):
+        return self
+    
+    def _notify(self, stream: bool, started: float, ttft: Optional[float], result: Dict[str, Any]):
+        """Report a finished generation to the observer, which must not break the request"""
+        if self.observer is None:
+            return
+        try:
+            self.observer({
+                "model": self.model_name,
+                "stream": stream,
+                "elapsed": time.perf_counter() - started,
+                "ttft": ttft,
+                "result": result
+            })
+        except Exception as e:
+            logger.warning(f"Generation observer failed: {e}")
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+    
+    async def check_server(self) -> bool:
+        """
+        Check if Ollama server is running
+        
+        Returns:
+            bool: True if server is accessible, False otherwise
+        """
+        try:
+            await self.get_tags()
+            return True
+        except httpx.HTTPError as e:
+            logger.error(f"Failed to connect to Ollama server: {e}")
+            return False
+    
+    async def get_tags(self) -> Dict[str, Any]:
+        """
+        Fetch /api/tags, raising on connection errors and non-200 responses
+        
+        Returns:
+            Parsed /api/tags response
+        """
+        response = await self.client.get("/api/tags")
+        response.raise_for_status()
+        return response.json()
+    
+    async def list_models(self) -> List[Dict[str, Any]]:
+        """
+        List available models
+        
+        Returns:
+            List of model information dictionaries
+        """
+        try:
+            response = await self.client.get("/api/tags")
+            if response.status_code == 200:
+                return response.json().get("models", [])
+            else:
+                logger.error(f"Failed to list models: {response.status_code}")
+                return []
+        except httpx.HTTPError as e:
+            logger.error(f"Error listing models: {e}")
+            return []
+    
+    async def pull_model(self, model_name: Optional[str] = None) -> bool:
+        """
+        Pull model from Ollama registry
+        
+        Args:
+            model_name: Model name to pull (defaults to self.model_name)
+            
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        model_to_pull = model_name or self.model_name
+        
+        try:
+            logger.info(f"Pulling model: {model_to_pull}")
+            # Downloads can take much longer than a generation, only bound the connect phase
+            response = await self.client.post(
+                "/api/pull",
+                json={"name": model_to_pull, "stream": False},
+                timeout=httpx.Timeout(None, connect=self.connect_timeout)
+            )
+            
+            if response.status_code == 200:
+                logger.info(f"Successfully pulled model: {model_to_pull}")
+                return True
+            else:
+                logger.error(f"Failed to pull model: {response.status_code}")
+                return False
+                
+        except httpx.HTTPError as e:
+            logger.error(f"Error pulling model: {e}")
+            return False
+    
+    async def generate_text(self, prompt: str, system_prompt: Optional[str] = None, 
+                            max_tokens: int = 2048, temperature: float = 0.7,
+                            top_p: float = 0.9, context: Optional[List[int]] = None,
+                            keep_alive: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Generate text using the model
+        
+        Args:
+            prompt: Input prompt
+            system_prompt: System prompt (optional)
+            max_tokens: Maximum tokens to generate
+            temperature: Sampling temperature (0.0 to 1.0)
+            top_p: Top-p sampling parameter
+            context: Context array of a previous generation to continue (optional)
+            keep_alive: How long Ollama keeps the model loaded, e.g. "30m" (optional)
+            
+        Returns:
+            Dictionary containing generated text and metadata
+        """
+        payload = _build_generate_payload(
+            self.model_name, prompt, system_prompt, max_tokens, temperature, top_p, False,
+            context=context, keep_alive=keep_alive
+        )
+        
+        started = time.perf_counter()
+        result = await self._generate_text(prompt, payload)
+        self._notify(False, started, None, result)
+        return result
+    
+    async def _generate_text(self, prompt: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            logger.info(f"Generating text with prompt length: {len(prompt)}")
+            response = await asyncio.wait_for(
+                self.client.post("/api/generate", json=payload),
+                timeout=self.total_timeout
+            )
+            
+            if response.status_code == 200:
+                result = response.json()
+                logger.info(f"Generated {len(result.get('response', ''))} characters")
+                return result
+            else:
+                logger.error(f"Failed to generate text: {response.status_code}")
+                return {"error": f"HTTP {response.status_code}", "status_code": response.status_code}
+                
+        except asyncio.TimeoutError:
+            logger.error(f"Text generation exceeded {self.total_timeout}s")
+            return {"error": f"Generation timed out after {self.total_timeout}s", "timeout": True}
+        except (httpx.ReadTimeout, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+            # A slow server or a full local connection pool, not an unreachable server.
+            # The health probe decides whether Ollama is down
+            logger.error(f"Text generation timed out: {e!r}")
+            return {"error": str(e) or e.__class__.__name__, "timeout": True}
+        except httpx.HTTPError as e:
+            logger.error(f"Error generating text: {e}")
+            return {"error": str(e) or e.__class__.__name__}
+    
+    async def generate_text_stream(self, prompt: str, system_prompt: Optional[str] = None,
+                                   max_tokens: int = 2048, temperature: float = 0.7,
+                                   top_p: float = 0.9, context: Optional[List[int]] = None,
+                                   keep_alive: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Generate text and yield Ollama's NDJSON chunks as they arrive
+        
+        Args:
+            prompt: Input prompt
+            system_prompt: System prompt (optional)
+            max_tokens: Maximum tokens to generate
+            temperature: Sampling temperature (0.0 to 1.0)
+            top_p: Top-p sampling parameter
+            context: Context array of a previous generation to continue (optional)
+            keep_alive: How long Ollama keeps the model loaded, e.g. "30m" (optional)
+            
+        Yields:
+            Chunk dictionaries, the last one has done=True and carries the
+            eval counts and durations. Failures are yielded as a final
+            {"error": ..., "done": True} chunk.
+        """
+        payload = _build_generate_payload(
+            self.model_name, prompt, system_prompt, max_tokens, temperature, top_p, True,
+            context=context, keep_alive=keep_alive
+        )
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.total_timeout
+        started = time.perf_counter()
+        ttft = None
+        
+        final = None
+        try:
+            logger.info(f"Streaming text with prompt length: {len(prompt)}")
+            async with self.client.stream("POST", "/api/generate", json=payload) as response:
+                if response.status_code != 200:
+                    logger.error(f"Failed to generate text: {response.status_code}")
+                    final = {"error": f"HTTP {response.status_code}", "status_code": response.status_code, "done": True}
+                else:
+                    async for line in response.aiter_lines():
+                        if loop.time() > deadline:
+                            logger.error(f"Text generation exceeded {self.total_timeout}s")
+                            final = {"error": f"Generation timed out after {self.total_timeout}s", "timeout": True, "done": True}
+                            break
+                        if not line:
+                            continue
+                        try:
+                            data = json.loads(line)
+                        except json.JSONDecodeError:
+                            continue
+                        if "error" in data:
+                            # Reported by a reachable server, unlike connection errors below
+                            data = {**data, "status_code": response.status_code, "done": True}
+                        if ttft is None and data.get("response"):
+                            ttft = time.perf_counter() - started
+                        if data.get("done"):
+                            final = data
+                            break
+                        yield data
+        except (httpx.ReadTimeout, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+            logger.error(f"Text stream timed out: {e!r}")
+            final = {"error": str(e) or e.__class__.__name__, "timeout": True, "done": True}
+        except httpx.HTTPError as e:
+            logger.error(f"Error streaming text: {e}")
+            final = {"error": str(e) or e.__class__.__name__, "done": True}
+
+        if final is None:
+            return
+        # The response is closed and its connection back in the pool before the final
+        # chunk is reported and handed over, a consumer that stops here, or an observer
+        # that fails, cannot leave it open
+        self._notify(True, started, ttft, final)
+        yield final
+    
+    async def code_completion(self, code_prompt: str, language: str = "python", 
+                              max_tokens: int = 512, temperature: float = 0.3) -> Dict[str, Any]:
+        """
+        Generate code completion
+        
+        Args:
+            code_prompt: Partial code or prompt
+            language: Programming language
+            max_tokens: Maximum tokens to generate
+            temperature: Sampling temperature
+            
+        Returns:
+            Dictionary with completed code
+        """
+        return await self.generate_text(
+            prompt=code_prompt,
+            system_prompt=_code_system_prompt(language),
+            max_tokens=max_tokens,
+            temperature=temperature
+        )
+    
+    async def chat_completion(self, messages: List[Dict[str, str]], 
+                              max_tokens: int = 2048, temperature: float = 0.7) -> Dict[str, Any]:
+        """
+        Generate chat completion
+        
+        Args:
+            messages: List of message dictionaries with 'role' and 'content'
+            max_tokens: Maximum tokens to generate
+            temperature: Sampling temperature
+            
+        Returns:
+            Dictionary with chat response
+        """
+        prompt, system_prompt = _messages_to_prompt(messages)
+        
+        return await self.generate_text(
+            prompt=prompt,
+            system_prompt=system_prompt,
+            max_tokens=max_tokens,
+            temperature=temperature
+        )
+    
+    def code_completion_stream(self, code_prompt: str, language: str = "python",
+                               max_tokens: int = 512, temperature: float = 0.3) -> AsyncIterator[Dict[str, Any]]:
+        """Streaming variant of code_completion, see generate_text_stream"""
+        return self.generate_text_stream(
+            prompt=code_prompt,
+            system_prompt=_code_system_prompt(language),
+            max_tokens=max_tokens,
+            temperature=temperature
+        )
+    
+    def chat_completion_stream(self, messages: List[Dict[str, str]],
+                               max_tokens: int = 2048, temperature: float = 0.7) -> AsyncIterator[Dict[str, Any]]:
+        """Streaming variant of chat_completion, see generate_text_stream"""
+        prompt, system_prompt = _messages_to_prompt(messages)
+        
+        return self.generate_text_stream(
+            prompt=prompt,
+            system_prompt=system_prompt,
             max_tokens=max_tokens,
             temperature=temperature
         )